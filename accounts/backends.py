@@ -1,12 +1,20 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
-from django.db.models import Q
+from django.db.models import Case, Q, Value, When
+from django.db.models.functions import Lower
 
 
 class EmailOrUsernameModelBackend(ModelBackend):
     """
     Custom authentication backend that allows users to log in with either
     their username or email address.
+
+    It is the only configured backend, so a failed login costs one indexed
+    lookup and one password hash instead of a second pass through
+    ModelBackend. Permissions still come from ModelBackend. An exact
+    username match wins over case-insensitive username and email matches,
+    so accounts whose usernames differ only in case, or whose username is
+    another user's email, log in as they did with ModelBackend.
     """
 
     def authenticate(self, request, username=None, password=None, **kwargs):
@@ -27,21 +35,29 @@ class EmailOrUsernameModelBackend(ModelBackend):
         if username is None or password is None:
             return None
         
-        try:
-            # Try to fetch the user by searching the username OR email field
-            user = UserModel.objects.get(
-                Q(username__iexact=username) | Q(email__iexact=username)
-            )
-        except UserModel.DoesNotExist:
-            # Run the default password hasher once to reduce the timing
-            # difference between an existing and a nonexistent user
+        # LOWER(column) = LOWER(value) matches the functional indexes on
+        # CustomUser, unlike __iexact which the database cannot index; the
+        # exact username match (unique index) sorts first
+        users = list(
+            UserModel.objects.alias(
+                username_ci=Lower("username"),
+                email_ci=Lower("email"),
+                exact=Case(When(username=username, then=Value(0)), default=Value(1)),
+            ).filter(
+                Q(username=username)
+                | Q(username_ci=Lower(Value(username)))
+                | Q(email_ci=Lower(Value(username)))
+            ).order_by("exact")[:2]
+        )
+        if len(users) == 1 or (users and users[0].username == username):
+            user = users[0]
+        else:
+            # No user, or the value only matches several users ignoring
+            # case. Run the default password hasher once to reduce the
+            # timing difference between an existing and a nonexistent user
             UserModel().set_password(password)
             return None
-        except UserModel.MultipleObjectsReturned:
-            # If multiple users exist with the same email (shouldn't happen
-            # with proper unique constraints), return None
-            return None
-        
+
         # Check if the password is correct
         if user.check_password(password) and self.user_can_authenticate(user):
             return user
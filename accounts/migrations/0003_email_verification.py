@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customuser",
+            name="email_token_created",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When the verification token was created",
+                null=True,
+                verbose_name="token created at",
+            ),
+        ),
+        migrations.AddField(
+            model_name="customuser",
+            name="email_verification_token",
+            field=models.CharField(
+                blank=True,
+                help_text="Token used for email verification",
+                max_length=64,
+                null=True,
+                unique=True,
+                verbose_name="email verification token",
+            ),
+        ),
+        migrations.AddField(
+            model_name="customuser",
+            name="email_verified",
+            field=models.BooleanField(
+                default=True,
+                help_text="Designates whether this user has verified their email address.",
+                verbose_name="email verified",
+            ),
+        ),
+    ]
@@ -1,8 +1,10 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import RegexValidator
 from django.utils import timezone
+from django.utils.crypto import get_random_string
 
 
 class CustomUser(AbstractUser):
@@ -68,6 +70,27 @@ class CustomUser(AbstractUser):
         help_text=_("Upload a profile picture (optional)"),
     )
 
+    # Email verification; self-registered accounts start unverified
+    email_verified = models.BooleanField(
+        _("email verified"),
+        default=True,
+        help_text=_("Designates whether this user has verified their email address."),
+    )
+    email_verification_token = models.CharField(
+        _("email verification token"),
+        max_length=64,
+        blank=True,
+        null=True,
+        unique=True,
+        help_text=_("Token used for email verification"),
+    )
+    email_token_created = models.DateTimeField(
+        _("token created at"),
+        null=True,
+        blank=True,
+        help_text=_("When the verification token was created"),
+    )
+
     # Timestamps
     date_joined = models.DateTimeField(_("date joined"), default=timezone.now)
     last_updated = models.DateTimeField(_("last updated"), auto_now=True)
@@ -76,6 +99,11 @@ class CustomUser(AbstractUser):
         verbose_name = _("user")
         verbose_name_plural = _("users")
         ordering = ["last_name", "first_name"]
+        indexes = [
+            # Case-insensitive login lookups (accounts.backends)
+            models.Index(Lower("username"), name="accounts_user_username_ci"),
+            models.Index(Lower("email"), name="accounts_user_email_ci"),
+        ]
 
     def __str__(self):
         return self.get_full_name() or self.username
@@ -84,3 +112,10 @@ class CustomUser(AbstractUser):
     def full_name(self):
         """Return the full name of the user."""
         return self.get_full_name()
+
+    def generate_verification_token(self):
+        """Store and return a new email verification token."""
+        self.email_verification_token = get_random_string(64)
+        self.email_token_created = timezone.now()
+        self.save(update_fields=["email_verification_token", "email_token_created"])
+        return self.email_verification_token
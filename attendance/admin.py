@@ -1,11 +1,37 @@
 from django.contrib import admin
-from .models import Department, Staff, Attendance, LeaveRequest, TodoItem, DelegatedDuty
+from django.db import transaction
+from . import leave_balances, shifts, todos
+from .models import (
+    Department,
+    ShiftSchedule,
+    Staff,
+    Attendance,
+    DailyAttendanceSummary,
+    LeaveBalance,
+    LeaveRequest,
+    TodoItem,
+    DelegatedDuty,
+    ExportJob,
+    GeocodeCache,
+    Location,
+    OfficeSite,
+    OutboundEmail,
+    ScanReceipt,
+)
+
+
+class ShiftScheduleInline(admin.StackedInline):
+    model = ShiftSchedule
+    can_delete = True
+    extra = 0
+    max_num = 1
 
 
 @admin.register(Department)
 class DepartmentAdmin(admin.ModelAdmin):
     list_display = ("name", "description", "created_at", "updated_at")
     search_fields = ("name",)
+    inlines = (ShiftScheduleInline,)
 
 
 @admin.register(Staff)
@@ -22,9 +48,135 @@ class StaffAdmin(admin.ModelAdmin):
 
 @admin.register(Attendance)
 class AttendanceAdmin(admin.ModelAdmin):
-    list_display = ("user", "date", "sign_in", "sign_out", "location", "notes")
-    search_fields = ("user__username", "user__first_name", "user__last_name", "date", "location")
-    list_filter = ("date", "user")
+    list_display = ("user", "date", "sign_in", "sign_out", "worked_display", "is_late", "location_display", "notes")
+    list_select_related = ("user", "location")
+    search_fields = (
+        "user__username",
+        "user__first_name",
+        "user__last_name",
+        "date",
+        "location__address",
+        "legacy_location",
+    )
+    autocomplete_fields = ("location",)
+    list_filter = ("date", "is_late", "inside_geofence", "site", "user")
+    readonly_fields = (
+        "is_late",
+        "minutes_late",
+        "worked_seconds",
+        "latitude",
+        "longitude",
+        "accuracy_m",
+        "site",
+        "inside_geofence",
+    )
+
+    def save_model(self, request, obj, form, change):
+        if "sign_in" in form.changed_data or "user" in form.changed_data:
+            department_id = obj.user.department_id if obj.user else None
+            obj.is_late, obj.minutes_late = shifts.lateness(
+                obj.sign_in, shifts.for_department(department_id)
+            )
+        obj.measure_worked()
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(DailyAttendanceSummary)
+class DailyAttendanceSummaryAdmin(admin.ModelAdmin):
+    list_display = (
+        "date",
+        "department",
+        "signed_in",
+        "late",
+        "on_time",
+        "signed_out",
+        "total_worked_seconds",
+    )
+    list_filter = ("date", "department")
+    readonly_fields = ("updated_at",)
+
+
+@admin.register(ScanReceipt)
+class ScanReceiptAdmin(admin.ModelAdmin):
+    list_display = ("key", "user", "device", "scanned_at", "created_at", "delay")
+    list_filter = ("device",)
+    search_fields = ("key", "user__username", "device")
+    readonly_fields = ("created_at",)
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "requested_by",
+        "format",
+        "status",
+        "rows_processed",
+        "total_rows",
+        "worker",
+        "created_at",
+        "finished_at",
+    )
+    list_filter = ("status", "format")
+    search_fields = ("requested_by__username", "worker")
+    readonly_fields = ("created_at", "started_at", "finished_at", "lease_expires_at")
+
+
+@admin.register(OfficeSite)
+class OfficeSiteAdmin(admin.ModelAdmin):
+    list_display = ("name", "latitude", "longitude", "radius_m", "is_active", "updated_at")
+    list_filter = ("is_active",)
+    search_fields = ("name",)
+    readonly_fields = ("updated_at",)
+
+
+@admin.register(GeocodeCache)
+class GeocodeCacheAdmin(admin.ModelAdmin):
+    list_display = ("address", "latitude", "longitude", "source", "created_at")
+    list_filter = ("source",)
+    search_fields = ("address",)
+    readonly_fields = ("created_at",)
+
+
+@admin.register(Location)
+class LocationAdmin(admin.ModelAdmin):
+    list_display = ("address", "created_at")
+    search_fields = ("address",)
+    readonly_fields = ("address", "created_at")
+
+    # Locations are created by sign-ins and never change or go away:
+    # processes cache them by address (see attendance.locations)
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = (
+        "subject",
+        "to",
+        "status",
+        "attempts",
+        "next_attempt_at",
+        "sent_at",
+        "created_at",
+    )
+    list_filter = ("status",)
+    search_fields = ("subject", "last_error")
+    readonly_fields = (
+        "attempts",
+        "last_error",
+        "worker",
+        "lease_expires_at",
+        "created_at",
+        "sent_at",
+    )
 
 
 @admin.register(LeaveRequest)
@@ -43,17 +195,49 @@ class LeaveRequestAdmin(admin.ModelAdmin):
     actions = ["approve_selected", "reject_selected"]
 
     def approve_selected(self, request, queryset):
-        updated = queryset.update(status="Approved", reviewed_by=request.user)
+        updated = len(leave_balances.review(queryset, "Approved", request.user))
         self.message_user(request, f"{updated} leave request(s) approved.")
 
     approve_selected.short_description = "Approve selected leave requests"
 
     def reject_selected(self, request, queryset):
-        updated = queryset.update(status="Rejected", reviewed_by=request.user)
+        updated = len(leave_balances.review(queryset, "Rejected", request.user))
         self.message_user(request, f"{updated} leave request(s) rejected.")
 
     reject_selected.short_description = "Reject selected leave requests"
 
+    # Keep the leave balance ledger in step with edits made here
+
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            before = (
+                LeaveRequest.objects.select_for_update().filter(pk=obj.pk).first()
+                if change
+                else None
+            )
+            super().save_model(request, obj, form, change)
+            leave_balances.record_change(before, obj)
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            leave_balances.record_change(obj, None)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            leaves = list(queryset.select_for_update())
+            super().delete_queryset(request, queryset)
+            for leave in leaves:
+                leave_balances.record_change(leave, None)
+
+
+@admin.register(LeaveBalance)
+class LeaveBalanceAdmin(admin.ModelAdmin):
+    list_display = ("user", "year", "allowance", "taken", "pending", "updated_at")
+    search_fields = ("user__username", "user__first_name", "user__last_name")
+    list_filter = ("year",)
+    readonly_fields = ("taken", "pending", "updated_at")
+
 
 @admin.register(TodoItem)
 class TodoItemAdmin(admin.ModelAdmin):
@@ -69,6 +253,13 @@ class TodoItemAdmin(admin.ModelAdmin):
     list_filter = ("status", "created_at", "user")
     readonly_fields = ("created_at", "updated_at")
 
+    # Deletions leave tombstones for the dashboards' delta sync
+    def delete_model(self, request, obj):
+        todos.delete(TodoItem.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        todos.delete(queryset)
+
 
 @admin.register(DelegatedDuty)
 class DelegatedDutyAdmin(admin.ModelAdmin):
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class AttendanceConfig(AppConfig):
@@ -7,3 +8,6 @@ class AttendanceConfig(AppConfig):
 
     def ready(self):
         import attendance.signals  # noqa
+        from staff_attendance.db import configure_sqlite
+
+        connection_created.connect(configure_sqlite, dispatch_uid="configure_sqlite")
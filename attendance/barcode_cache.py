@@ -0,0 +1,138 @@
+"""
+Process-local cache of barcode -> badge holder lookups.
+
+Every scan used to read the ``Staff`` row, then its user, before the
+attendance write could start. Badges change rarely, so each worker process
+keeps the answer in a bounded LRU map whose entries also expire after a TTL.
+``post_save``/``post_delete`` signals on ``Staff``, the user model and
+``ShiftSchedule`` (see ``attendance.signals``) drop entries as soon as this
+process changes them; the TTL bounds how long a change made by another
+process can go unseen.
+"""
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+
+from .models import Staff
+from .shifts import USER_SHIFT_FIELDS, shift_of
+
+Badge = namedtuple("Badge", "user_id is_active display_name department_id shift")
+
+DEFAULT_MAX_SIZE = 5000
+DEFAULT_TTL = 300
+
+_BADGE_FIELDS = (
+    "barcode",
+    "user_id",
+    "is_active",
+    "user__first_name",
+    "user__last_name",
+    "user__username",
+    "user__department_id",
+    *(f"user__{field}" for field in USER_SHIFT_FIELDS),
+)
+
+
+def _badge(row):
+    _, user_id, is_active, first_name, last_name, username, department_id, *shift = row
+    name = f"{first_name or ''} {last_name or ''}".strip() or username
+    return Badge(user_id, is_active, name, department_id, shift_of(*shift))
+
+
+class BarcodeCache:
+    """Thread-safe LRU map of barcode to :class:`Badge` with a TTL."""
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, ttl=DEFAULT_TTL, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._barcodes_by_user = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get(self, barcode, now):
+        entry = self._entries.get(barcode)
+        if entry is None or entry[1] <= now:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(barcode)
+        self.hits += 1
+        return entry[0]
+
+    def _put(self, barcode, badge, now):
+        self._entries[barcode] = (badge, now + self.ttl)
+        self._entries.move_to_end(barcode)
+        self._barcodes_by_user[badge.user_id] = barcode
+        while len(self._entries) > self.max_size:
+            old_barcode, (old_badge, _) = self._entries.popitem(last=False)
+            if self._barcodes_by_user.get(old_badge.user_id) == old_barcode:
+                del self._barcodes_by_user[old_badge.user_id]
+            self.evictions += 1
+
+    def resolve(self, barcode):
+        """Return the :class:`Badge` for ``barcode``, or None if unknown."""
+        return self.resolve_many([barcode]).get(barcode)
+
+    def resolve_many(self, barcodes):
+        """Return ``{barcode: Badge}`` for the known ``barcodes``, one query for misses."""
+        now = self._clock()
+        found, missing = {}, set()
+        with self._lock:
+            for barcode in barcodes:
+                badge = self._get(barcode, now)
+                if badge is None:
+                    missing.add(barcode)
+                else:
+                    found[barcode] = badge
+        if missing:
+            rows = Staff.objects.filter(
+                barcode__in=missing, user__isnull=False
+            ).values_list(*_BADGE_FIELDS)
+            loaded = {row[0]: _badge(row) for row in rows}
+            with self._lock:
+                for barcode, badge in loaded.items():
+                    self._put(barcode, badge, now)
+            found.update(loaded)
+        return found
+
+    def invalidate_barcode(self, barcode):
+        with self._lock:
+            entry = self._entries.pop(barcode, None)
+            if entry and self._barcodes_by_user.get(entry[0].user_id) == barcode:
+                del self._barcodes_by_user[entry[0].user_id]
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            barcode = self._barcodes_by_user.pop(user_id, None)
+            if barcode is not None:
+                self._entries.pop(barcode, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._barcodes_by_user.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+cache = BarcodeCache(
+    max_size=getattr(settings, "BARCODE_CACHE_SIZE", DEFAULT_MAX_SIZE),
+    ttl=getattr(settings, "BARCODE_CACHE_TTL", DEFAULT_TTL),
+)
@@ -1,39 +1,37 @@
-from django.utils import timezone
-from .models import Attendance
+from functools import lru_cache
+
+from django.utils.functional import SimpleLazyObject
+
+from . import status_cache
 
 
 def attendance_status(request):
     """
     Context processor to provide the current user's attendance status
     to all templates.
+
+    The flags are lazy: the status is only looked up (in the cache, then the
+    database) when a template actually reads one of them, and at most once
+    per request.
     """
-    context = {
-        'user_signed_in_today': False,
-        'user_signed_out_today': False,
-        'show_sign_in': True,
-        'show_sign_out': False,
+    if not request.user.is_authenticated:
+        return {
+            'user_signed_in_today': False,
+            'user_signed_out_today': False,
+            'show_sign_in': True,
+            'show_sign_out': False,
+        }
+
+    @lru_cache(maxsize=None)
+    def state():
+        return status_cache.get_status(request.user.pk)
+
+    return {
+        # User is signed in but not signed out
+        'user_signed_in_today': SimpleLazyObject(lambda: state() == status_cache.SIGNED_IN),
+        # User has signed out
+        'user_signed_out_today': SimpleLazyObject(lambda: state() == status_cache.SIGNED_OUT),
+        # No attendance record (or no sign-in) for today, show sign in
+        'show_sign_in': SimpleLazyObject(lambda: state() == status_cache.NOT_STARTED),
+        'show_sign_out': SimpleLazyObject(lambda: state() == status_cache.SIGNED_IN),
     }
-    
-    if request.user.is_authenticated:
-        today = timezone.now().date()
-        try:
-            attendance = Attendance.objects.get(user=request.user, date=today)
-            
-            # User has an attendance record for today
-            if attendance.sign_in and not attendance.sign_out:
-                # User is signed in but not signed out
-                context['user_signed_in_today'] = True
-                context['show_sign_in'] = False
-                context['show_sign_out'] = True
-            elif attendance.sign_out:
-                # User has signed out
-                context['user_signed_out_today'] = True
-                context['show_sign_in'] = False
-                context['show_sign_out'] = False
-            # If neither sign_in nor sign_out, show sign in (default)
-            
-        except Attendance.DoesNotExist:
-            # No attendance record for today, show sign in (default)
-            pass
-    
-    return context
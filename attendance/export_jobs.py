@@ -0,0 +1,196 @@
+"""
+Background attendance exports.
+
+``enqueue`` records an :class:`~attendance.models.ExportJob`; one or more
+``run_export_worker`` processes pick jobs up with :func:`claim_next` and
+build the file into ``MEDIA_ROOT`` with :func:`run_job`.
+
+Claiming is safe with several workers running at once. On databases that
+support it the candidate rows are locked with ``SELECT ... FOR UPDATE SKIP
+LOCKED``; the claim itself is a compare-and-set ``UPDATE`` that only succeeds
+if the job still looks the way the worker read it, which also covers
+backends without row locks (SQLite). A claimed job carries a lease that the
+worker renews every time it reports progress. If a worker dies, the lease
+runs out and another worker takes the job over; a worker that finds it has
+lost its lease stops writing and discards its file.
+"""
+
+import os
+from datetime import timedelta
+
+from django.core.files import File
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import exports
+from .models import Attendance, ExportJob
+
+LEASE_SECONDS = 300
+
+# A job whose lease expires this many times is marked as failed.
+MAX_ATTEMPTS = 3
+
+# Completed and failed jobs (and their files) are removed after this long.
+RETENTION_DAYS = 7
+
+EXTENSIONS = {"csv": ".csv", "excel": ".xlsx", "pdf": ".pdf"}
+
+
+class LeaseLost(Exception):
+    """Raised when a worker no longer owns the job it is writing."""
+
+
+def enqueue(user, format_type, params):
+    """
+    Create a pending export job for ``user``.
+
+    Only the filters understood by ``exports.filter_attendance`` are kept.
+    Raises ``ValueError`` for an unknown format or malformed filters, so
+    problems are reported to the requester rather than to the worker.
+    """
+    if format_type not in EXTENSIONS:
+        raise ValueError("format must be one of: " + ", ".join(EXTENSIONS))
+    filters = {key: params[key] for key in exports.FILTER_KEYS if params.get(key)}
+    exports.filter_attendance(Attendance.objects.none(), filters)
+    return ExportJob.objects.create(
+        requested_by=user, format=format_type, filters=filters
+    )
+
+
+def _fail_abandoned(now):
+    """Give up on jobs whose lease has expired ``MAX_ATTEMPTS`` times."""
+    ExportJob.objects.filter(
+        status="Running", lease_expires_at__lt=now, attempts__gte=MAX_ATTEMPTS
+    ).update(
+        status="Failed",
+        error="Export worker stopped responding",
+        finished_at=now,
+        lease_expires_at=None,
+    )
+
+
+def claim_next(worker_id, lease_seconds=LEASE_SECONDS):
+    """
+    Claim the oldest available job for ``worker_id``.
+
+    Pending jobs and running jobs with an expired lease are available.
+    Returns the claimed job, or None if there is nothing to do.
+    """
+    now = timezone.now()
+    _fail_abandoned(now)
+
+    available = ExportJob.objects.filter(
+        Q(status="Pending") | Q(status="Running", lease_expires_at__lt=now),
+        attempts__lt=MAX_ATTEMPTS,
+    ).order_by("created_at")
+
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            available = available.select_for_update(skip_locked=True)
+        candidates = list(
+            available.values_list("pk", "status", "worker", "lease_expires_at")[:10]
+        )
+        for pk, status, worker, lease_expires_at in candidates:
+            claimed = ExportJob.objects.filter(
+                pk=pk, status=status, worker=worker, lease_expires_at=lease_expires_at
+            ).update(
+                status="Running",
+                worker=worker_id,
+                lease_expires_at=now + timedelta(seconds=lease_seconds),
+                attempts=F("attempts") + 1,
+                started_at=now,
+                rows_processed=0,
+                error="",
+            )
+            if claimed:
+                return ExportJob.objects.get(pk=pk)
+    return None
+
+
+def _owned(job, worker_id):
+    return ExportJob.objects.filter(pk=job.pk, status="Running", worker=worker_id)
+
+
+def _renew(job, worker_id, lease_seconds, **fields):
+    """Update ``fields`` and extend the lease, or raise ``LeaseLost``."""
+    fields["lease_expires_at"] = timezone.now() + timedelta(seconds=lease_seconds)
+    if not _owned(job, worker_id).update(**fields):
+        raise LeaseLost(str(job.pk))
+
+
+def _write(job, queryset, fileobj, progress):
+    if job.format == "csv":
+        return exports.write_csv(queryset, fileobj, progress)
+    if job.format == "excel":
+        return exports.write_excel(queryset, fileobj, progress)
+    report = exports.AttendancePDFReport(
+        queryset, subtitle=exports.describe_filters(job.filters)
+    )
+    return report.write(fileobj, progress)
+
+
+def run_job(job, worker_id, lease_seconds=LEASE_SECONDS):
+    """
+    Build the export file for a job claimed by ``worker_id``.
+
+    Progress is written back every ``exports.PROGRESS_EVERY`` rows, renewing
+    the lease. Raises ``LeaseLost`` if another worker has taken the job
+    over; any other error marks the job as failed.
+    """
+    try:
+        queryset = exports.filter_attendance(Attendance.objects.all(), job.filters)
+        _renew(job, worker_id, lease_seconds, total_rows=queryset.count())
+
+        def progress(count):
+            _renew(job, worker_id, lease_seconds, rows_processed=count)
+
+        with exports.spooled_file() as tmp:
+            count = _write(job, queryset, tmp, progress)
+            tmp.seek(0)
+            name = f"attendance-{job.pk}{EXTENSIONS[job.format]}"
+            job.file.save(name, File(tmp, name=name), save=False)
+    except LeaseLost:
+        raise
+    except Exception as e:
+        _owned(job, worker_id).update(
+            status="Failed",
+            error=str(e)[:1000],
+            finished_at=timezone.now(),
+            lease_expires_at=None,
+        )
+        raise
+
+    completed = _owned(job, worker_id).update(
+        status="Completed",
+        file=job.file.name,
+        rows_processed=count,
+        total_rows=count,
+        finished_at=timezone.now(),
+        lease_expires_at=None,
+    )
+    if not completed:
+        job.file.delete(save=False)
+        raise LeaseLost(str(job.pk))
+    job.refresh_from_db()
+    return job
+
+
+def purge_finished(days=RETENTION_DAYS):
+    """Delete finished jobs older than ``days`` days along with their files."""
+    cutoff = timezone.now() - timedelta(days=days)
+    old_jobs = ExportJob.objects.filter(
+        status__in=["Completed", "Failed"], finished_at__lt=cutoff
+    )
+    purged = 0
+    for job in old_jobs.iterator():
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        purged += 1
+    return purged
+
+
+def default_worker_id():
+    """Identifier used for a worker started without ``--worker-id``."""
+    return f"{os.uname().nodename}:{os.getpid()}"
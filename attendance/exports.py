@@ -0,0 +1,499 @@
+"""
+Attendance export helpers.
+
+Rows are read through a ``values_list()`` projection joined to the user's
+name and iterated in chunks, so exports never materialise model instances
+or issue per-row user queries and memory stays flat regardless of the size
+of the attendance table. Locations are read as ids and turned into text by
+``attendance.locations``, which fetches each distinct address at most once.
+"""
+
+import csv
+import tempfile
+
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import landscape, letter
+from reportlab.pdfgen import canvas
+
+from . import locations
+from .reports import late_q
+
+EXPORT_COLUMNS = ["User", "Date", "Sign In", "Sign Out", "Location", "Notes"]
+
+# Rows fetched per round trip while iterating an export queryset.
+CHUNK_SIZE = 2000
+
+# How often (in rows) file writers report progress to their callback.
+PROGRESS_EVERY = 1000
+
+# Largest PDF report drawn unless PDF_EXPORT_MAX_ROWS says otherwise.
+DEFAULT_PDF_MAX_ROWS = 50000
+
+_EXPORT_FIELDS = (
+    "user__first_name",
+    "user__last_name",
+    "user__username",
+    "date",
+    "sign_in",
+    "sign_out",
+    "notes",
+    *locations.ROW_FIELDS,
+)
+
+
+def date_param(params, name):
+    """Parse the YYYY-MM-DD value of ``params[name]``; raise ``ValueError`` if malformed."""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f"{name} must be a date in YYYY-MM-DD format")
+    return parsed
+
+
+# Parameters understood by filter_attendance().
+FILTER_KEYS = ("start", "end", "department", "user", "late", "open", "site")
+
+
+def filter_attendance(queryset, params):
+    """
+    Apply the export filters found in ``params`` (usually ``request.GET``).
+
+    Supported keys (``FILTER_KEYS``) are ``start``/``end`` (YYYY-MM-DD), ``department`` (id),
+    ``user`` (username), ``late`` (late arrivals only), ``open`` (signed
+    in but not yet signed out) and ``site`` (``onsite``, ``offsite`` or an
+    office site id). Raises ``ValueError`` for malformed values.
+    """
+    start = date_param(params, "start")
+    end = date_param(params, "end")
+    if start and end and start > end:
+        raise ValueError("start must be on or before end")
+    if start:
+        queryset = queryset.filter(date__gte=start)
+    if end:
+        queryset = queryset.filter(date__lte=end)
+
+    department = params.get("department")
+    if department:
+        if not str(department).isdigit():
+            raise ValueError("department must be a department id")
+        queryset = queryset.filter(user__department_id=int(department))
+
+    if params.get("user"):
+        queryset = queryset.filter(user__username=params["user"])
+    if params.get("late"):
+        queryset = queryset.filter(late_q())
+    if params.get("open"):
+        queryset = queryset.filter(sign_in__isnull=False, sign_out__isnull=True)
+
+    site = params.get("site")
+    if site == "onsite":
+        queryset = queryset.filter(inside_geofence=True)
+    elif site == "offsite":
+        queryset = queryset.filter(inside_geofence=False)
+    elif site:
+        if not str(site).isdigit():
+            raise ValueError("site must be onsite, offsite or a site id")
+        queryset = queryset.filter(site_id=int(site))
+    return queryset
+
+
+def describe_filters(params):
+    """One-line description of the export filters in ``params``."""
+    parts = []
+    if params.get("start") or params.get("end"):
+        parts.append(
+            f"Dates: {params.get('start') or 'beginning'} to {params.get('end') or 'today'}"
+        )
+    if params.get("department"):
+        parts.append(f"Department #{params['department']}")
+    if params.get("user"):
+        parts.append(f"User: {params['user']}")
+    if params.get("late"):
+        parts.append("Late arrivals only")
+    if params.get("open"):
+        parts.append("Not signed out")
+    if params.get("site") in ("onsite", "offsite"):
+        parts.append("On site only" if params["site"] == "onsite" else "Off site only")
+    elif params.get("site"):
+        parts.append(f"Site #{params['site']}")
+    return " | ".join(parts) or "All records"
+
+
+def format_timestamp(value, tz, fmt="%Y-%m-%d %H:%M:%S"):
+    """Render an aware datetime in ``tz``, or an empty string."""
+    if not value:
+        return ""
+    return value.astimezone(tz).strftime(fmt)
+
+
+def display_name(first_name, last_name, username):
+    """Mirror ``CustomUser.__str__`` without loading the user instance."""
+    return f"{first_name or ''} {last_name or ''}".strip() or username or ""
+
+
+def export_rows(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Yield one list per attendance record, in ``EXPORT_COLUMNS`` order.
+
+    Uses a server-side cursor where the database supports it.
+    """
+    # Resolve the timezone once; timezone.localtime() looks it up per call
+    tz = timezone.get_current_timezone()
+    rows = locations.describe_rows(
+        queryset.values_list(*_EXPORT_FIELDS).iterator(chunk_size=chunk_size),
+        chunk_size,
+    )
+    for first, last, username, date, sign_in, sign_out, notes, location in rows:
+        yield [
+            display_name(first, last, username),
+            date.isoformat() if date else "",
+            format_timestamp(sign_in, tz),
+            format_timestamp(sign_out, tz),
+            location or "-",
+            notes,
+        ]
+
+
+class Echo:
+    """File-like object whose ``write`` hands the value straight back."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(queryset):
+    """Yield the CSV export of ``queryset`` one encoded line at a time."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in export_rows(queryset):
+        yield writer.writerow(row)
+
+
+def write_csv(queryset, fileobj, progress=None):
+    """
+    Write the CSV export of ``queryset`` to a binary file.
+
+    ``progress`` is called with the number of rows written every
+    ``PROGRESS_EVERY`` rows. Returns the number of records written.
+    """
+    writer = csv.writer(Echo())
+    fileobj.write(writer.writerow(EXPORT_COLUMNS).encode("utf-8"))
+    count = 0
+    for row in export_rows(queryset):
+        fileobj.write(writer.writerow(row).encode("utf-8"))
+        count += 1
+        if progress and count % PROGRESS_EVERY == 0:
+            progress(count)
+    return count
+
+
+def write_excel(queryset, fileobj, progress=None):
+    """
+    Write the Excel export of ``queryset`` to a binary file.
+
+    Uses openpyxl's write-only mode, which streams rows to disk instead of
+    keeping the whole sheet in memory. Returns the number of records written.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Attendance")
+    sheet.append(EXPORT_COLUMNS)
+    count = 0
+    for row in export_rows(queryset):
+        sheet.append(row)
+        count += 1
+        if progress and count % PROGRESS_EVERY == 0:
+            progress(count)
+    workbook.save(fileobj)
+    return count
+
+
+# Files larger than this are spooled from memory to a temporary file on disk.
+SPOOL_MAX_SIZE = 5 * 1024 * 1024
+
+
+def spooled_file():
+    """Temporary file that only touches disk once it outgrows ``SPOOL_MAX_SIZE``."""
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+
+
+def fit_cell(value, width):
+    """Pad or clip ``value`` (with an ellipsis) to exactly ``width`` characters."""
+    text = str(value if value is not None else "")
+    if len(text) >= width:
+        text = text[: width - 4] + "... "
+    return text.ljust(width)
+
+
+class AttendancePDFReport:
+    """
+    Paginated, table-layout attendance report drawn with reportlab.
+
+    Records are grouped per day (with a subtotal line under each day) and
+    followed by a per-staff summary and grand totals. Rows are read in chunks
+    and drawn as they arrive, but a reportlab canvas keeps every finished
+    page (compressed) in memory until it is saved, so memory grows with the
+    report. Reports are therefore capped at ``PDF_EXPORT_MAX_ROWS`` records,
+    which bounds that growth to a few megabytes; larger exports are refused
+    with ``ValueError`` and should use CSV or Excel, which stream.
+
+    The table uses a monospaced font so each row is laid out as one padded
+    line of text, which keeps rendering at a few PDF operators per row.
+    """
+
+    page_size = landscape(letter)
+    margin = 36
+    row_height = 13
+    font = "Courier"
+    bold_font = "Courier-Bold"
+    font_size = 8
+    # Courier glyphs are 0.6em wide: 150 characters fill the printable width
+    char_width = 0.6 * font_size
+    # (heading, width in characters)
+    columns = [
+        ("Staff", 32),
+        ("Sign In", 9),
+        ("Sign Out", 9),
+        ("Hours", 7),
+        ("Status", 9),
+        ("Location", 84),
+    ]
+    summary_columns = [
+        ("Staff", 60),
+        ("Days Present", 15),
+        ("Late Arrivals", 15),
+        ("Hours Worked", 15),
+    ]
+
+    def __init__(self, queryset, title="Attendance Report", subtitle=""):
+        self.queryset = queryset
+        self.title = title
+        self.subtitle = subtitle
+        self.page_number = 0
+
+    # Data -----------------------------------------------------------------
+
+    def rows(self):
+        """Yield attendance tuples ordered by day, then staff name."""
+        return locations.describe_rows(
+            self.queryset.order_by(
+                "date", "user__first_name", "user__last_name", "user__username", "id"
+            )
+            .values_list(
+                "date",
+                "user__first_name",
+                "user__last_name",
+                "user__username",
+                "sign_in",
+                "sign_out",
+                "is_late",
+                "worked_seconds",
+                *locations.ROW_FIELDS,
+            )
+            .iterator(chunk_size=CHUNK_SIZE)
+        )
+
+    def staff_totals(self):
+        """Per-staff totals computed by one grouped query."""
+        return (
+            self.queryset.values(
+                "user__first_name", "user__last_name", "user__username"
+            )
+            .annotate(
+                present=Count("id", filter=Q(sign_in__isnull=False)),
+                late=Count("id", filter=late_q()),
+                worked=Sum("worked_seconds"),
+            )
+            .order_by("user__first_name", "user__last_name", "user__username")
+            .iterator(chunk_size=CHUNK_SIZE)
+        )
+
+    # Drawing --------------------------------------------------------------
+
+    def _new_page(self, columns):
+        c = self.canvas
+        if self.page_number:
+            self._flush_text()
+            c.showPage()
+        self.page_number += 1
+        width, height = self.page_size
+        c.setFont("Helvetica-Bold", 13)
+        c.drawString(self.margin, height - self.margin, self.title)
+        c.setFont("Helvetica", self.font_size)
+        generated = timezone.localtime().strftime("%Y-%m-%d %H:%M")
+        c.drawRightString(
+            width - self.margin, height - self.margin, f"Generated {generated}"
+        )
+        if self.subtitle:
+            c.drawString(self.margin, height - self.margin - 12, self.subtitle)
+        c.drawRightString(
+            width - self.margin, self.margin / 2, f"Page {self.page_number}"
+        )
+        # All table rows on a page go into one text object, which is much
+        # cheaper than a separate drawString() call per row.
+        self.text = c.beginText()
+        self.text_font = None
+        self.y = height - self.margin - 32
+        self._draw_row(
+            [heading for heading, _ in columns],
+            columns,
+            bold=True,
+            fill=colors.lightgrey,
+        )
+
+    def _flush_text(self):
+        self.canvas.drawText(self.text)
+
+    def _ensure_space(self, columns, rows=1):
+        if self.y - rows * self.row_height < self.margin:
+            self._new_page(columns)
+
+    def _draw_row(self, values, columns, bold=False, fill=None):
+        if fill is not None:
+            c = self.canvas
+            total_width = sum(width for _, width in columns) * self.char_width + 6
+            c.setFillColor(fill)
+            c.rect(
+                self.margin, self.y - 3, total_width, self.row_height, stroke=0, fill=1
+            )
+            c.setFillColor(colors.black)
+        font = self.bold_font if bold else self.font
+        if font != self.text_font:
+            self.text.setFont(font, self.font_size)
+            self.text_font = font
+        line = "".join(
+            fit_cell(value, width) for value, (_, width) in zip(values, columns)
+        )
+        self.text.setTextOrigin(self.margin + 3, self.y)
+        self.text.textOut(line.rstrip())
+        self.y -= self.row_height
+
+    def _draw_day_header(self, day):
+        self._ensure_space(self.columns, rows=2)
+        self._draw_row(
+            [day.strftime("%A, %b %d, %Y")],
+            [("", sum(w for _, w in self.columns))],
+            bold=True,
+            fill=colors.Color(0.85, 0.9, 0.97),
+        )
+
+    def _draw_day_total(self, present, late, hours):
+        self._ensure_space(self.columns)
+        self._draw_row(
+            ["Day total", f"{present} present", f"{late} late", f"{hours:.1f}"],
+            self.columns[:4],
+            bold=True,
+        )
+        self.y -= self.row_height / 2
+
+    def write(self, fileobj, progress=None):
+        """
+        Draw the report into ``fileobj``; returns the number of records.
+
+        ``progress`` is called with the number of rows drawn every
+        ``PROGRESS_EVERY`` rows. Raises ``ValueError`` before drawing
+        anything if the report would exceed ``PDF_EXPORT_MAX_ROWS`` records.
+        """
+        max_rows = getattr(settings, "PDF_EXPORT_MAX_ROWS", DEFAULT_PDF_MAX_ROWS)
+        if max_rows and self.queryset.count() > max_rows:
+            raise ValueError(
+                f"PDF reports are limited to {max_rows} records; "
+                "narrow the filters or export CSV or Excel"
+            )
+        self.canvas = canvas.Canvas(fileobj, pagesize=self.page_size, pageCompression=1)
+        self.canvas.setTitle(self.title)
+        self._new_page(self.columns)
+
+        count = 0
+        current_day = None
+        day_present = day_late = 0
+        day_hours = 0.0
+        stripe = colors.Color(0.96, 0.96, 0.96)
+        tz = timezone.get_current_timezone()
+        for row in self.rows():
+            day, first, last, username, sign_in, sign_out, late, worked, location = row
+            if day != current_day:
+                if current_day is not None:
+                    self._draw_day_total(day_present, day_late, day_hours)
+                current_day = day
+                day_present = day_late = 0
+                day_hours = 0.0
+                self._draw_day_header(day)
+
+            local_in = sign_in.astimezone(tz) if sign_in else None
+            hours = (worked or 0) / 3600
+            day_present += int(bool(sign_in))
+            day_late += int(late)
+            day_hours += hours
+            status = "Late" if late else ("On time" if sign_in else "Absent")
+
+            self._ensure_space(self.columns)
+            self._draw_row(
+                [
+                    display_name(first, last, username),
+                    local_in.strftime("%H:%M") if local_in else "-",
+                    format_timestamp(sign_out, tz, "%H:%M") or "-",
+                    f"{hours:.1f}" if hours else "-",
+                    status,
+                    location or "-",
+                ],
+                self.columns,
+                fill=stripe if count % 2 else None,
+            )
+            count += 1
+            if progress and count % PROGRESS_EVERY == 0:
+                progress(count)
+
+        if current_day is not None:
+            self._draw_day_total(day_present, day_late, day_hours)
+        self._write_summary(count)
+        self._flush_text()
+        self.canvas.save()
+        return count
+
+    def _write_summary(self, count):
+        self._new_page(self.summary_columns)
+        total_present = total_late = 0
+        total_hours = 0.0
+        for row in self.staff_totals():
+            hours = (row["worked"] or 0) / 3600
+            total_present += row["present"]
+            total_late += row["late"]
+            total_hours += hours
+            self._ensure_space(self.summary_columns)
+            self._draw_row(
+                [
+                    display_name(
+                        row["user__first_name"],
+                        row["user__last_name"],
+                        row["user__username"],
+                    ),
+                    row["present"],
+                    row["late"],
+                    f"{hours:.1f}",
+                ],
+                self.summary_columns,
+            )
+        self._ensure_space(self.summary_columns, rows=2)
+        self.y -= self.row_height / 2
+        self._draw_row(
+            [
+                f"Total ({count} records)",
+                total_present,
+                total_late,
+                f"{total_hours:.1f}",
+            ],
+            self.summary_columns,
+            bold=True,
+            fill=colors.lightgrey,
+        )
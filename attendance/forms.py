@@ -116,6 +116,10 @@ class SignInOutForm(forms.Form):
     action = forms.ChoiceField(
         choices=[("sign_in", "Sign In"), ("sign_out", "Sign Out")]
     )
+    # Idempotency key generated when the form is rendered
+    request_id = forms.CharField(
+        max_length=32, required=False, widget=forms.HiddenInput
+    )
 
 
 class LeaveRequestForm(forms.ModelForm):
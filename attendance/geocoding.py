@@ -0,0 +1,277 @@
+"""
+Server-side reverse geocoding of sign-in coordinates.
+
+Scanning devices send raw ``lat``/``lon``; the sign-in is written at once
+with its coordinates and :func:`fill_later` sets its location to the
+resolved address after the transaction commits, on a small background
+thread pool, so no scan waits on a geocoder.
+
+Addresses are looked up in ``GeocodeCache`` by the coordinates snapped to a
+grid of ``GEOCODE_GRID_DEGREES``. On a miss the resolvers named in
+``GEOCODE_RESOLVERS`` are tried in order and the first answer is stored.
+The default resolvers name the ``OfficeSite`` a point falls in
+(``attendance.geofences.SiteResolver``) or the nearest place listed in
+``GEOCODE_GAZETTEER`` (:class:`GazetteerResolver`), without any network
+access; :class:`NominatimResolver` queries an OpenStreetMap Nominatim server
+and is opt-in.
+"""
+
+import json
+import logging
+import math
+import re
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from decimal import ROUND_HALF_UP, Decimal
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils.module_loading import import_string
+
+from . import locations
+from .models import Attendance, GeocodeCache
+
+logger = logging.getLogger(__name__)
+
+# A scanner's position; ``accuracy`` is the reported radius in metres, if any.
+Coordinates = namedtuple("Coordinates", "lat lon accuracy", defaults=(None,))
+
+# About 55 m north-south: one building, at most a few cells.
+DEFAULT_GRID_DEGREES = 0.0005
+
+DEFAULT_RESOLVERS = [
+    "attendance.geofences.SiteResolver",
+    "attendance.geocoding.GazetteerResolver",
+]
+
+# Gazetteer sites match within this many metres unless they set radius_m.
+DEFAULT_SITE_RADIUS_M = 150
+
+EARTH_RADIUS_M = 6_371_000
+
+_SIX_PLACES = Decimal("0.000001")
+
+# How sign-ins stored their coordinates as location text before they had
+# columns of their own (see the backfill_locations command).
+_LABEL = re.compile(r"^Lat: (-?\d+(?:\.\d+)?), Lon: (-?\d+(?:\.\d+)?)$")
+
+
+def parse_coordinates(lat, lon, accuracy=None):
+    """
+    Return :class:`Coordinates`, or None if missing or out of range.
+
+    An unusable ``accuracy`` is dropped rather than rejecting the position.
+    """
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        # Also rejects NaN
+        return None
+    try:
+        accuracy = float(accuracy) if accuracy is not None else None
+    except (TypeError, ValueError):
+        accuracy = None
+    if accuracy is not None and not 0 <= accuracy < 1e6:
+        accuracy = None
+    return Coordinates(lat, lon, accuracy)
+
+
+def parse_label(location):
+    """Return the coordinates of a ``"Lat: .., Lon: .."`` location, else None."""
+    match = _LABEL.match(location or "")
+    return match and parse_coordinates(*match.groups())
+
+
+def _grid():
+    return Decimal(str(getattr(settings, "GEOCODE_GRID_DEGREES", DEFAULT_GRID_DEGREES)))
+
+
+def grid_cell(coordinates):
+    """Snap ``coordinates`` to the centre of their grid cell, as Decimals."""
+    grid = _grid()
+    return tuple(
+        ((Decimal(str(value)) / grid).to_integral_value(ROUND_HALF_UP) * grid).quantize(
+            _SIX_PLACES
+        )
+        for value in coordinates[:2]
+    )
+
+
+def distance_m(a, b):
+    """Great-circle distance in metres between two ``(lat, lon)`` points."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(h))
+
+
+class GazetteerResolver:
+    """
+    Name the nearest office site from ``GEOCODE_GAZETTEER``.
+
+    Each site is a dict with ``name``, ``lat``, ``lon`` and optionally
+    ``radius_m``; coordinates outside every site's radius are not resolved.
+    """
+
+    name = "gazetteer"
+
+    def __init__(self, sites=None):
+        if sites is None:
+            sites = getattr(settings, "GEOCODE_GAZETTEER", [])
+        self.sites = [
+            (
+                site["name"],
+                (float(site["lat"]), float(site["lon"])),
+                float(site.get("radius_m", DEFAULT_SITE_RADIUS_M)),
+            )
+            for site in sites
+        ]
+
+    def resolve(self, coordinates):
+        nearest = None
+        for name, point, radius in self.sites:
+            distance = distance_m(coordinates[:2], point)
+            if distance <= radius and (nearest is None or distance < nearest[0]):
+                nearest = (distance, name)
+        return nearest and nearest[1]
+
+
+class NominatimResolver:
+    """Reverse geocode through a Nominatim server (``GEOCODE_NOMINATIM_URL``)."""
+
+    name = "nominatim"
+
+    def __init__(self):
+        self.url = getattr(
+            settings,
+            "GEOCODE_NOMINATIM_URL",
+            "https://nominatim.openstreetmap.org/reverse",
+        )
+        self.timeout = getattr(settings, "GEOCODE_TIMEOUT", 5)
+        self.user_agent = getattr(
+            settings, "GEOCODE_USER_AGENT", "staff-attendance geocoder"
+        )
+
+    def resolve(self, coordinates):
+        lat, lon = coordinates[:2]
+        query = urlencode({"format": "json", "lat": lat, "lon": lon})
+        request = Request(f"{self.url}?{query}", headers={"User-Agent": self.user_agent})
+        with urlopen(request, timeout=self.timeout) as response:
+            return json.load(response).get("display_name") or None
+
+
+_resolvers = None
+_resolvers_lock = threading.Lock()
+
+
+def resolvers():
+    """The configured resolver instances, built once per process."""
+    global _resolvers
+    with _resolvers_lock:
+        if _resolvers is None:
+            _resolvers = [
+                import_string(path)()
+                for path in getattr(settings, "GEOCODE_RESOLVERS", DEFAULT_RESOLVERS)
+            ]
+        return _resolvers
+
+
+def resolve(coordinates):
+    """
+    Return the address of ``coordinates`` (cached per grid cell), or None.
+
+    A resolver that fails is logged and skipped. Coordinates no resolver
+    knows are not cached, so sites added to the gazetteer later apply.
+    """
+    latitude, longitude = grid_cell(coordinates)
+    cached = (
+        GeocodeCache.objects.filter(latitude=latitude, longitude=longitude)
+        .values_list("address", flat=True)
+        .first()
+    )
+    if cached:
+        return cached
+    for resolver in resolvers():
+        try:
+            address = resolver.resolve(coordinates)
+        except Exception:
+            logger.warning("Geocoder %s failed", resolver.name, exc_info=True)
+            continue
+        if address:
+            address = address[:500]
+            try:
+                with transaction.atomic():
+                    GeocodeCache.objects.create(
+                        latitude=latitude,
+                        longitude=longitude,
+                        address=address,
+                        source=resolver.name,
+                    )
+            except IntegrityError:
+                # Resolved concurrently; both answers describe the cell
+                pass
+            return address
+    return None
+
+
+def fill_location(attendance_id, coordinates, location_id=None):
+    """
+    Set the location of one attendance record to the resolved address.
+
+    ``location_id`` is the location the record was written with; records
+    whose location changed since (e.g. edited by an admin) are left alone.
+    Returns True if the record was updated.
+    """
+    address = resolve(coordinates)
+    if not address:
+        return False
+    return bool(
+        Attendance.objects.filter(pk=attendance_id, location_id=location_id).update(
+            location_id=locations.location_id(address)
+        )
+    )
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _fill_logged(attendance_id, coordinates, location_id):
+    try:
+        fill_location(attendance_id, coordinates, location_id)
+    except Exception:
+        logger.exception("Could not geocode attendance %s", attendance_id)
+
+
+def _run(attendance_id, coordinates, location_id):
+    try:
+        _fill_logged(attendance_id, coordinates, location_id)
+    finally:
+        # Each pool thread has its own database connection
+        connection.close()
+
+
+def _submit(attendance_id, coordinates, location_id):
+    global _executor
+    if not getattr(settings, "GEOCODE_ASYNC", True):
+        _fill_logged(attendance_id, coordinates, location_id)
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "GEOCODE_WORKERS", 2),
+                thread_name_prefix="geocode",
+            )
+    _executor.submit(_run, attendance_id, coordinates, location_id)
+
+
+def fill_later(attendance_id, coordinates, location_id=None):
+    """Resolve the address of a sign-in once the current transaction commits."""
+    transaction.on_commit(lambda: _submit(attendance_id, coordinates, location_id))
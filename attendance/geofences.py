@@ -0,0 +1,248 @@
+"""
+Tagging sign-ins with the office site whose geofence they fall in.
+
+Active ``OfficeSite`` rows are loaded into a process-local index: each
+fence's bounding box is registered in the cells of a coarse lat/lon grid, so
+locating a point looks at one cell, discards fences whose box does not
+contain it, and only then runs the exact test (point-in-polygon or distance
+to the circle's centre). The index expires after ``GEOFENCE_CACHE_TTL``
+seconds and is dropped at once when this process saves or deletes a site
+(see ``attendance.signals``).
+
+:func:`tag` returns the coordinate, site and ``inside_geofence`` values that
+``scans.write_sign_in`` stores with a sign-in, so on-site reports are plain
+indexed filters. :func:`retag` recomputes them after sites change.
+"""
+
+import math
+import threading
+import time
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from .geocoding import Coordinates, distance_m
+from .models import Attendance, OfficeSite
+
+# Size of the index's grid cells (about 1.1 km north-south).
+CELL_DEGREES = 0.01
+
+# Fences covering more cells than this are checked for every point instead.
+MAX_FENCE_CELLS = 10_000
+
+DEFAULT_TTL = 300
+
+# Positions reported less accurately than this are never counted as on site.
+DEFAULT_MAX_ACCURACY_M = 200
+
+# Attendance rows read and updated per round trip by :func:`retag`.
+BATCH_SIZE = 2000
+
+METRES_PER_DEGREE = 111_320
+
+Fence = namedtuple("Fence", "site_id name bbox polygon center radius_m")
+
+TAG_FIELDS = ("latitude", "longitude", "accuracy_m", "site_id", "inside_geofence")
+
+
+def point_in_polygon(lat, lon, polygon):
+    """Ray-casting test of a point against a list of ``(lat, lon)`` vertices."""
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        lat_i, lon_i = polygon[i]
+        lat_j, lon_j = polygon[j]
+        if (lat_i > lat) != (lat_j > lat) and lon < (lon_j - lon_i) * (lat - lat_i) / (
+            lat_j - lat_i
+        ) + lon_i:
+            inside = not inside
+        j = i
+    return inside
+
+
+def _fence(site_id, name, latitude, longitude, radius_m, boundary):
+    """Build a :class:`Fence` from site columns, or None if it is incomplete."""
+    if boundary:
+        try:
+            polygon = [(float(lat), float(lon)) for lat, lon in boundary]
+        except (TypeError, ValueError):
+            return None
+        if len(polygon) < 3:
+            return None
+        lats, lons = [p[0] for p in polygon], [p[1] for p in polygon]
+        bbox = (min(lats), min(lons), max(lats), max(lons))
+        return Fence(site_id, name, bbox, polygon, None, None)
+    if latitude is None or longitude is None or not radius_m:
+        return None
+    center = (float(latitude), float(longitude))
+    dlat = radius_m / METRES_PER_DEGREE
+    dlon = radius_m / (METRES_PER_DEGREE * max(math.cos(math.radians(center[0])), 1e-6))
+    bbox = (center[0] - dlat, center[1] - dlon, center[0] + dlat, center[1] + dlon)
+    return Fence(site_id, name, bbox, None, center, radius_m)
+
+
+def _contains(fence, lat, lon):
+    min_lat, min_lon, max_lat, max_lon = fence.bbox
+    if not (min_lat <= lat <= max_lat and min_lon <= lon <= max_lon):
+        return False
+    if fence.polygon:
+        return point_in_polygon(lat, lon, fence.polygon)
+    return distance_m((lat, lon), fence.center) <= fence.radius_m
+
+
+def _cell(lat, lon):
+    return math.floor(lat / CELL_DEGREES), math.floor(lon / CELL_DEGREES)
+
+
+class GeofenceIndex:
+    """Thread-safe grid index of the active sites' geofences, with a TTL."""
+
+    def __init__(self, ttl=DEFAULT_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._expires = None
+        self._generation = 0
+        self._cells = {}
+        self._large = []
+
+    def _load(self):
+        cells, large = defaultdict(list), []
+        rows = OfficeSite.objects.filter(is_active=True).values_list(
+            "id", "name", "latitude", "longitude", "radius_m", "boundary"
+        )
+        for row in rows:
+            fence = _fence(*row)
+            if fence is None:
+                continue
+            min_i, min_j = _cell(*fence.bbox[:2])
+            max_i, max_j = _cell(*fence.bbox[2:])
+            if (max_i - min_i + 1) * (max_j - min_j + 1) > MAX_FENCE_CELLS:
+                large.append(fence)
+                continue
+            for i in range(min_i, max_i + 1):
+                for j in range(min_j, max_j + 1):
+                    cells[(i, j)].append(fence)
+        return dict(cells), large
+
+    def _current(self):
+        now = self._clock()
+        with self._lock:
+            if self._expires is not None and now < self._expires:
+                return self._cells, self._large
+            generation = self._generation
+        cells, large = self._load()
+        with self._lock:
+            # A clear() during the load may have missed a change; keep the
+            # index stale so the next lookup loads again
+            if generation == self._generation:
+                self._cells, self._large = cells, large
+                self._expires = now + self.ttl
+        return cells, large
+
+    def locate(self, lat, lon):
+        """Return the :class:`Fence` containing the point, or None."""
+        cells, large = self._current()
+        matches = [
+            fence
+            for fence in cells.get(_cell(lat, lon), []) + large
+            if _contains(fence, lat, lon)
+        ]
+        if not matches:
+            return None
+
+        # Nested sites: the smallest fence is the most specific answer
+        def area(fence):
+            min_lat, min_lon, max_lat, max_lon = fence.bbox
+            return (max_lat - min_lat) * (max_lon - min_lon)
+
+        return min(matches, key=area)
+
+    def clear(self):
+        with self._lock:
+            self._expires = None
+            self._generation += 1
+            self._cells, self._large = {}, []
+
+
+index = GeofenceIndex(ttl=getattr(settings, "GEOFENCE_CACHE_TTL", DEFAULT_TTL))
+
+
+def _max_accuracy():
+    return getattr(settings, "GEOFENCE_MAX_ACCURACY_M", DEFAULT_MAX_ACCURACY_M)
+
+
+def tag(coordinates):
+    """
+    Return the ``Attendance`` field values for a sign-in at ``coordinates``.
+
+    Positions less accurate than ``GEOFENCE_MAX_ACCURACY_M`` are stored but
+    not placed on a site: like sign-ins without coordinates, whether they
+    were inside a geofence is unknown (None).
+    """
+    if coordinates is None:
+        return dict.fromkeys(TAG_FIELDS)
+    latitude, longitude = (
+        Decimal(str(value)).quantize(Decimal("0.000001")) for value in coordinates[:2]
+    )
+    accuracy = coordinates[2] if len(coordinates) > 2 else None
+    tags = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "accuracy_m": round(accuracy) if accuracy is not None else None,
+        "site_id": None,
+        "inside_geofence": None,
+    }
+    if accuracy is None or accuracy <= _max_accuracy():
+        fence = index.locate(*coordinates[:2])
+        tags["site_id"] = fence and fence.site_id
+        tags["inside_geofence"] = fence is not None
+    return tags
+
+
+class SiteResolver:
+    """Geocoding resolver that names the office site containing a point."""
+
+    name = "office-site"
+
+    def resolve(self, coordinates):
+        fence = index.locate(*coordinates[:2])
+        return fence and fence.name
+
+
+def retag(start=None, end=None):
+    """
+    Recompute the site tags of signed-in attendance records with coordinates.
+
+    Records are read in primary-key batches and only changed rows are
+    written. Returns the number updated.
+    """
+    index.clear()
+    records = Attendance.objects.filter(latitude__isnull=False, sign_in__isnull=False)
+    if start:
+        records = records.filter(date__gte=start)
+    if end:
+        records = records.filter(date__lte=end)
+    fields = ("pk",) + TAG_FIELDS
+
+    updated = 0
+    last_pk = 0
+    while True:
+        batch = list(
+            records.filter(pk__gt=last_pk).order_by("pk").values_list(*fields)[:BATCH_SIZE]
+        )
+        if not batch:
+            return updated
+        last_pk = batch[-1][0]
+        changed = []
+        for pk, *stored in batch:
+            latitude, longitude, accuracy = stored[:3]
+            values = tag(Coordinates(float(latitude), float(longitude), accuracy))
+            if tuple(values[field] for field in TAG_FIELDS) != tuple(stored):
+                changed.append(Attendance(pk=pk, **values))
+        if changed:
+            with transaction.atomic():
+                Attendance.objects.bulk_update(changed, TAG_FIELDS)
+            updated += len(changed)
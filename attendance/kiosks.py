@@ -0,0 +1,30 @@
+"""
+Authenticating the kiosks that submit queued scans.
+
+A kiosk flushing its offline queue tells the server when each scan was
+captured, so the batch endpoint only honours those times from a known
+device: a browser with a staff session, or one sending a token listed in
+``KIOSK_TOKENS`` (``{"front-desk": "<token>", ...}``) in the
+``X-Kiosk-Token`` header. :func:`device` names the kiosk; the name is kept
+on every ``ScanReceipt`` it submits, next to the claimed and received
+times, so backdated scans can be audited.
+"""
+
+import hmac
+
+from django.conf import settings
+
+HEADER = "X-Kiosk-Token"
+
+
+def device(request):
+    """Name of the kiosk making ``request``, or None if it is not one."""
+    token = request.headers.get(HEADER, "")
+    if token:
+        for name, expected in getattr(settings, "KIOSK_TOKENS", {}).items():
+            if expected and hmac.compare_digest(token.encode(), str(expected).encode()):
+                return name
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated and user.is_staff:
+        return f"staff:{user.get_username()}"
+    return None
@@ -0,0 +1,206 @@
+"""
+Maintenance of the ``LeaveBalance`` ledger.
+
+Every change to a leave request goes through :func:`submit`, :func:`review`
+or :func:`record_change`, which adjust the affected users' yearly balances
+in the same transaction, so reading a balance is a single indexed lookup
+(:func:`get_balance`) instead of summing the user's requests.
+:func:`rebuild_balances` recomputes the ledger from the requests.
+"""
+
+import copy
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import ExtractYear, Greatest
+from django.utils import timezone
+
+from .models import LeaveBalance, LeaveRequest
+
+DEFAULT_ALLOWANCE = 10
+
+# Only requests of this type use up the allowance.
+COUNTED_TYPE = "Leave"
+
+# Ledger column each request status is counted in.
+STATUS_COLUMNS = {"Approved": "taken", "Pending": "pending"}
+
+
+def allowance():
+    """Yearly allowance for balances that do not exist yet."""
+    return getattr(settings, "LEAVE_ALLOWANCE_DAYS", DEFAULT_ALLOWANCE)
+
+
+def get_balance(user_id, year=None):
+    """Return the user's balance for ``year`` (default this year), unsaved if new."""
+    year = year or timezone.localdate().year
+    balance = LeaveBalance.objects.filter(user_id=user_id, year=year).first()
+    return balance or LeaveBalance(user_id=user_id, year=year, allowance=allowance())
+
+
+def _contribution(leave):
+    """Return ``((user_id, year), column, days)`` for a counted request, else None."""
+    column = STATUS_COLUMNS.get(leave.status)
+    if (
+        column is None
+        or leave.type != COUNTED_TYPE
+        or not leave.user_id
+        or not leave.start_date
+        or not leave.end_date
+        or leave.end_date < leave.start_date
+    ):
+        return None
+    days = (leave.end_date - leave.start_date).days + 1
+    return (leave.user_id, leave.start_date.year), column, days
+
+
+def _adjust(user_id, year, deltas):
+    """
+    Atomically add ``deltas`` (column -> days) to one balance row.
+
+    Counters never go below zero, so requests that predate the ledger
+    cannot break it; ``rebuild_leave_balances`` corrects any drift.
+    """
+    updates = {
+        column: Greatest(F(column) + days, Value(0)) for column, days in deltas.items()
+    }
+    updates["updated_at"] = timezone.now()
+    rows = LeaveBalance.objects.filter(user_id=user_id, year=year)
+    if rows.update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            LeaveBalance.objects.create(
+                user_id=user_id,
+                year=year,
+                allowance=allowance(),
+                **{column: max(days, 0) for column, days in deltas.items()},
+            )
+    except IntegrityError:
+        # Another request created the row in the meantime
+        rows.update(**updates)
+
+
+def _apply(changes):
+    """Apply ``(before, after)`` request pairs to the ledger."""
+    deltas = defaultdict(lambda: defaultdict(int))
+    for before, after in changes:
+        for leave, sign in ((before, -1), (after, 1)):
+            counted = leave and _contribution(leave)
+            if counted:
+                key, column, days = counted
+                deltas[key][column] += sign * days
+    with transaction.atomic():
+        for (user_id, year), columns in sorted(deltas.items()):
+            columns = {column: days for column, days in columns.items() if days}
+            if columns:
+                _adjust(user_id, year, columns)
+
+
+def record_change(before, after):
+    """
+    Account for a request changing from ``before`` to ``after``.
+
+    Either may be None (created or deleted). Call inside the transaction
+    that saves the change; ``before`` must be the request as it was stored.
+    """
+    _apply([(before, after)])
+
+
+def submit(leave):
+    """Save a new leave request and count it as pending."""
+    with transaction.atomic():
+        leave.save()
+        record_change(None, leave)
+    return leave
+
+
+def review(leaves, status, reviewer, from_status=None):
+    """
+    Set ``status`` on every request in the ``leaves`` queryset not already in it.
+
+    With ``from_status``, only requests currently in that status change. The
+    rows are locked, updated with one statement and the ledger adjusted in
+    the same transaction. Returns the list of requests that changed.
+    """
+    if from_status:
+        leaves = leaves.filter(status=from_status)
+    with transaction.atomic():
+        changed = list(
+            leaves.select_for_update()
+            .exclude(status=status)
+            .only("id", "user_id", "type", "start_date", "end_date", "status")
+        )
+        if not changed:
+            return changed
+        updated = LeaveRequest.objects.filter(pk__in=[leave.pk for leave in changed])
+        if from_status:
+            updated = updated.filter(status=from_status)
+        updated.update(status=status, reviewed_by=reviewer, updated_at=timezone.now())
+        pairs = []
+        for leave in changed:
+            before = copy.copy(leave)
+            leave.status, leave.reviewed_by = status, reviewer
+            pairs.append((before, leave))
+        _apply(pairs)
+    return changed
+
+
+def rebuild_balances(year=None):
+    """
+    Recompute ``taken`` and ``pending`` from the leave requests.
+
+    Allowances of existing balances are kept. Only ``year`` is rebuilt if
+    given. Returns the number of balance rows written.
+    """
+    span = ExpressionWrapper(
+        F("end_date") - F("start_date"), output_field=DurationField()
+    )
+    requests = LeaveRequest.objects.filter(
+        type=COUNTED_TYPE,
+        user__isnull=False,
+        start_date__isnull=False,
+        end_date__gte=F("start_date"),
+        status__in=STATUS_COLUMNS,
+    )
+    balances = LeaveBalance.objects.all()
+    if year:
+        requests = requests.filter(start_date__year=year)
+        balances = balances.filter(year=year)
+
+    totals = defaultdict(lambda: dict.fromkeys(STATUS_COLUMNS.values(), 0))
+    rows = (
+        requests.annotate(year=ExtractYear("start_date"))
+        .values("user", "year", "status")
+        .annotate(count=Count("id"), span=Sum(span))
+        .order_by()
+    )
+    for row in rows:
+        # A request lasts (end - start) + 1 days
+        span_days = row["span"].days if row["span"] else 0
+        totals[(row["user"], row["year"])][STATUS_COLUMNS[row["status"]]] += (
+            span_days + row["count"]
+        )
+
+    with transaction.atomic():
+        existing = {(b.user_id, b.year): b for b in balances.select_for_update()}
+        to_update, to_create = [], []
+        for key, balance in existing.items():
+            columns = totals.get(key, {})
+            balance.taken = columns.get("taken", 0)
+            balance.pending = columns.get("pending", 0)
+            to_update.append(balance)
+        for (user_id, row_year), columns in totals.items():
+            if (user_id, row_year) not in existing:
+                to_create.append(
+                    LeaveBalance(
+                        user_id=user_id, year=row_year, allowance=allowance(), **columns
+                    )
+                )
+        LeaveBalance.objects.bulk_update(
+            to_update, ["taken", "pending"], batch_size=500
+        )
+        LeaveBalance.objects.bulk_create(to_create, batch_size=500)
+    return len(to_update) + len(to_create)
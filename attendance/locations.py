@@ -0,0 +1,146 @@
+"""
+Deduplicated sign-in locations.
+
+Attendance records reference a ``Location`` row instead of repeating the
+address text; most sign-ins share a handful of office addresses. A location
+is found by the SHA-256 of its address through a unique index, and since
+rows never change once written, each process keeps ``hash -> id`` and
+``id -> address`` in bounded LRU maps that never need invalidating.
+:func:`location_id` is the get-or-create path used when writing sign-ins;
+:func:`describe_rows` turns exported rows' location columns back into text
+with one query per chunk of rows at most.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.db import IntegrityError, transaction
+
+from .models import Location
+
+MAX_CACHED = 5000
+
+# Rows buffered by describe_rows() before fetching their unknown addresses.
+CHUNK_SIZE = 2000
+
+# Columns that describe_rows() expects at the end of each row.
+ROW_FIELDS = ("location_id", "legacy_location", "latitude", "longitude")
+
+
+class _LRU:
+    def __init__(self, max_size=MAX_CACHED):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+_ids = _LRU()
+_addresses = _LRU()
+
+
+def normalize(address):
+    """The stored form of ``address``: whitespace trimmed, at most 500 characters."""
+    return " ".join(str(address or "").split())[:500]
+
+
+def address_hash(address):
+    return hashlib.sha256(address.encode()).hexdigest()
+
+
+def location_id(address):
+    """Return the id of the ``Location`` for ``address``, creating it if needed."""
+    address = normalize(address)
+    if not address:
+        return None
+    key = address_hash(address)
+    found = _ids.get(key)
+    if found is not None:
+        return found
+    found = Location.objects.filter(address_hash=key).values_list("id", flat=True).first()
+    if found is None:
+        try:
+            with transaction.atomic():
+                found = Location.objects.create(address=address, address_hash=key).pk
+        except IntegrityError:
+            # Created concurrently
+            found = Location.objects.values_list("id", flat=True).get(address_hash=key)
+    # The row may have been created by the caller's transaction, which can
+    # still roll back; only remember it once committed
+    transaction.on_commit(lambda: _remember(key, found, address))
+    return found
+
+
+def _remember(key, pk, address):
+    _ids.put(key, pk)
+    _addresses.put(pk, address)
+
+
+def addresses(ids):
+    """Return ``{id: address}`` for ``ids``, one query for those not cached."""
+    found, missing = {}, set()
+    for pk in ids:
+        if pk is None:
+            continue
+        address = _addresses.get(pk)
+        if address is None:
+            missing.add(pk)
+        else:
+            found[pk] = address
+    if missing:
+        for pk, address in Location.objects.filter(pk__in=missing).values_list(
+            "id", "address"
+        ):
+            _addresses.put(pk, address)
+            found[pk] = address
+    return found
+
+
+def describe(address, legacy_location, latitude, longitude):
+    """Location text of a record from its resolved address and fallbacks."""
+    if address:
+        return address
+    if legacy_location:
+        return legacy_location
+    if latitude is not None and longitude is not None:
+        return f"Lat: {latitude}, Lon: {longitude}"
+    return ""
+
+
+def describe_rows(rows, chunk_size=CHUNK_SIZE):
+    """
+    Replace the trailing ``ROW_FIELDS`` of each row with the location text.
+
+    ``rows`` is an iterable of tuples (e.g. ``values_list(..., *ROW_FIELDS)``);
+    tuples are yielded in the same order.
+    """
+    width = len(ROW_FIELDS)
+    chunk = []
+
+    def flush():
+        known = addresses({row[-width] for row in chunk})
+        for row in chunk:
+            pk, legacy, latitude, longitude = row[-width:]
+            yield (*row[:-width], describe(known.get(pk), legacy, latitude, longitude))
+        chunk.clear()
+
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield from flush()
+    if chunk:
+        yield from flush()
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from attendance import geocoding, geofences, locations
+from attendance.models import Attendance
+
+
+class Command(BaseCommand):
+    help = ('Move location text stored on attendance records before locations were normalized '
+            'into the Location table; "Lat: .., Lon: .." text becomes the record\'s coordinates')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Records read per batch')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        records = Attendance.objects.exclude(legacy_location='').order_by('pk')
+        fields = ('pk', 'legacy_location', 'location_id', 'latitude')
+        moved = placed = 0
+        last_pk = 0
+        while True:
+            batch = list(records.filter(pk__gt=last_pk).values_list(*fields)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            changed, tagged = [], []
+            for pk, text, location_id, latitude in batch:
+                coordinates = geocoding.parse_label(text)
+                if coordinates is not None:
+                    # Coordinates go to their own columns; geocode_locations
+                    # can then resolve the address
+                    if latitude is None:
+                        tagged.append(
+                            Attendance(pk=pk, legacy_location='', **geofences.tag(coordinates))
+                        )
+                        placed += 1
+                        continue
+                elif location_id is None:
+                    location_id = locations.location_id(text)
+                changed.append(Attendance(pk=pk, legacy_location='', location_id=location_id))
+            with transaction.atomic():
+                if changed:
+                    Attendance.objects.bulk_update(changed, ['legacy_location', 'location_id'])
+                if tagged:
+                    Attendance.objects.bulk_update(
+                        tagged, ['legacy_location', *geofences.TAG_FIELDS]
+                    )
+            moved += len(changed) + len(tagged)
+            self.stdout.write(f'Processed records up to id {last_pk} ({moved} moved)')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved the location text of {moved} attendance records ({placed} were coordinates)'
+        ))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from attendance.models import Attendance
+
+
+class Command(BaseCommand):
+    help = 'Store worked_seconds on signed-out attendance records that do not have it yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Records read and updated per batch')
+        parser.add_argument('--all', action='store_true', help='Recompute every signed-out record, not only missing values')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        records = Attendance.objects.filter(sign_in__isnull=False, sign_out__isnull=False)
+        if not options['all']:
+            records = records.filter(worked_seconds__isnull=True)
+        records = records.only('id', 'sign_in', 'sign_out', 'worked_seconds').order_by('pk')
+
+        updated = 0
+        last_pk = 0
+        while True:
+            # Keyset batches: each one is a short query and a short transaction
+            batch = list(records.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            changed = []
+            for record in batch:
+                stored = record.worked_seconds
+                if record.measure_worked() != stored:
+                    changed.append(record)
+            if changed:
+                with transaction.atomic():
+                    Attendance.objects.bulk_update(changed, ['worked_seconds'])
+                updated += len(changed)
+            self.stdout.write(f'Processed records up to id {last_pk} ({updated} updated)')
+
+        self.stdout.write(self.style.SUCCESS(f'Stored worked time on {updated} attendance records'))
+        if updated:
+            self.stdout.write('Run rebuild_attendance_summaries to refresh the daily worked totals')
@@ -0,0 +1,113 @@
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from staff_attendance.db import DEFAULT_SQLITE_PRAGMAS
+
+# Connection setups compared: SQLite's defaults as Django used them before
+# (rollback journal, deferred transactions) and the tuned profile.
+PROFILES = {
+    'default': {'pragmas': {}, 'begin': 'BEGIN'},
+    'tuned': {'pragmas': DEFAULT_SQLITE_PRAGMAS, 'begin': 'BEGIN IMMEDIATE'},
+}
+
+SCHEMA = '''
+CREATE TABLE attendance (
+    id INTEGER PRIMARY KEY, user_id INTEGER, date TEXT, sign_in TEXT,
+    UNIQUE (user_id, date)
+);
+CREATE TABLE summary (date TEXT PRIMARY KEY, present INTEGER NOT NULL);
+'''
+
+
+class Command(BaseCommand):
+    help = ('Compare concurrent sign-in write throughput on SQLite with default and tuned '
+            'connection settings, using scratch databases')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent writers (threads, one connection each)')
+        parser.add_argument('--writes', type=int, default=200, help='Sign-ins written by each worker')
+        parser.add_argument('--timeout', type=float, default=5.0,
+                            help='Seconds a writer waits for the lock before giving up')
+        parser.add_argument('--profile', choices=sorted(PROFILES), action='append',
+                            help='Profile to run (repeatable; default: all)')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['writes'] < 1:
+            raise CommandError('--workers and --writes must be at least 1')
+
+        results = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for name in options['profile'] or sorted(PROFILES):
+                path = Path(directory) / f'{name}.sqlite3'
+                results[name] = self.run_profile(path, PROFILES[name], options)
+                written, errors, elapsed = results[name]
+                self.stdout.write(
+                    f'{name:>8}: {written} sign-ins in {elapsed:.2f}s '
+                    f'({written / elapsed:.0f}/s), {errors} failed with "database is locked"'
+                )
+        if {'default', 'tuned'} <= results.keys():
+            before = results['default'][0] / results['default'][2]
+            after = results['tuned'][0] / results['tuned'][2]
+            self.stdout.write(self.style.SUCCESS(f'Tuned profile: {after / before:.1f}x the write throughput'))
+
+    def connect(self, path, profile, timeout):
+        connection = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        for name, value in profile['pragmas'].items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def run_profile(self, path, profile, options):
+        setup = self.connect(path, profile, options['timeout'])
+        setup.executescript(SCHEMA)
+        setup.close()
+
+        written, errors = [0], [0]
+        counter_lock = threading.Lock()
+        start = threading.Barrier(options['workers'] + 1)
+
+        def worker(number):
+            connection = self.connect(path, profile, options['timeout'])
+            start.wait()
+            for i in range(options['writes']):
+                # Mirrors a kiosk sign-in: look for today's record, write it
+                # and bump the daily summary in one transaction
+                user_id, day = number * options['writes'] + i, f'2024-01-{i % 28 + 1:02d}'
+                try:
+                    connection.execute(profile['begin'])
+                    connection.execute(
+                        'SELECT id FROM attendance WHERE user_id = ? AND date = ?', (user_id, day)
+                    ).fetchone()
+                    connection.execute(
+                        'INSERT INTO attendance (user_id, date, sign_in) VALUES (?, ?, ?)',
+                        (user_id, day, time.time()),
+                    )
+                    connection.execute(
+                        'INSERT INTO summary (date, present) VALUES (?, 1) '
+                        'ON CONFLICT (date) DO UPDATE SET present = present + 1',
+                        (day,),
+                    )
+                    connection.execute('COMMIT')
+                except sqlite3.OperationalError as e:
+                    if connection.in_transaction:
+                        connection.execute('ROLLBACK')
+                    if 'locked' not in str(e):
+                        raise
+                    with counter_lock:
+                        errors[0] += 1
+                else:
+                    with counter_lock:
+                        written[0] += 1
+            connection.close()
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(options['workers'])]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        began = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        return written[0], errors[0], time.perf_counter() - began
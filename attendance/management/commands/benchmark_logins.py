@@ -0,0 +1,85 @@
+import time
+
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext, override_settings
+
+# Backend lists compared: the previous setup, where ModelBackend ran after
+# the custom backend on every failed login, and the current one.
+PROFILES = {
+    'with-fallback': [
+        'accounts.backends.EmailOrUsernameModelBackend',
+        'django.contrib.auth.backends.ModelBackend',
+    ],
+    'single': ['accounts.backends.EmailOrUsernameModelBackend'],
+}
+
+PASSWORD = 'benchmark-password'
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Measure login throughput and queries per attempt for successful, wrong-password and '
+            'unknown-user logins, against scratch users that are rolled back afterwards')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5000, help='Scratch users created for the run')
+        parser.add_argument('--attempts', type=int, default=20, help='Logins per scenario and profile')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['attempts'] < 1:
+            raise CommandError('--users and --attempts must be at least 1')
+        try:
+            with transaction.atomic():
+                self.run(options['users'], options['attempts'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, user_count, attempts):
+        User = get_user_model()
+        hashed = make_password(PASSWORD)
+        User.objects.bulk_create(
+            [
+                User(username=f'Bench{i}', email=f'Bench{i}@example.com', password=hashed)
+                for i in range(user_count)
+            ],
+            batch_size=1000,
+        )
+        self.stdout.write(f'Created {user_count} scratch users')
+
+        lookup = User.objects.filter(Q(username__iexact='bench1') | Q(email__iexact='bench1'))
+        plan = lookup.explain().replace('\n', '\n  ')
+        self.stdout.write(f'Previous __iexact lookup plan:\n  {plan}')
+        with CaptureQueriesContext(connection) as queries:
+            authenticate(username='nobody@example.com', password=PASSWORD)
+        sql = queries.captured_queries[0]['sql']
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {"QUERY PLAN " if connection.vendor == "sqlite" else ""}{sql}')
+            plan = '\n  '.join(' '.join(str(part) for part in row) for row in cursor.fetchall())
+        self.stdout.write(f'Current lookup plan:\n  {plan}')
+
+        middle = user_count // 2
+        scenarios = {
+            'success (email, mixed case)': (f'bench{middle}@EXAMPLE.com', PASSWORD),
+            'wrong password': (f'Bench{middle}', 'wrong-password'),
+            'unknown user': ('nobody@example.com', PASSWORD),
+        }
+        for profile, backends in PROFILES.items():
+            with override_settings(AUTHENTICATION_BACKENDS=backends):
+                for scenario, (username, password) in scenarios.items():
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.perf_counter()
+                        for _ in range(attempts):
+                            authenticate(username=username, password=password)
+                        elapsed = time.perf_counter() - start
+                    self.stdout.write(
+                        f'{profile:>13} | {scenario:<28}: {attempts / elapsed:7.1f} logins/s, '
+                        f'{len(queries) / attempts:.1f} queries/login'
+                    )
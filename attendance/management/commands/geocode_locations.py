@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from attendance import geocoding, locations
+from attendance.models import Attendance
+
+
+class Command(BaseCommand):
+    help = ('Set the location of attendance records that have coordinates but no location yet '
+            'from the geocode cache and resolvers')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Records read per batch')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        records = Attendance.objects.filter(
+            latitude__isnull=False, location__isnull=True
+        ).order_by('pk')
+        updated = unresolved = 0
+        last_pk = 0
+        while True:
+            batch = list(
+                records.filter(pk__gt=last_pk).values_list('pk', 'latitude', 'longitude')[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            ids_by_cell = {}
+            for pk, latitude, longitude in batch:
+                cell = geocoding.grid_cell((latitude, longitude))
+                ids_by_cell.setdefault(cell, []).append(pk)
+            # One resolution (and one UPDATE) per geocode cell
+            for cell, ids in ids_by_cell.items():
+                address = geocoding.resolve(geocoding.Coordinates(*map(float, cell)))
+                if not address:
+                    unresolved += len(ids)
+                    continue
+                updated += Attendance.objects.filter(pk__in=ids, location__isnull=True).update(
+                    location_id=locations.location_id(address)
+                )
+            self.stdout.write(f'Processed records up to id {last_pk} ({updated} updated)')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Geocoded {updated} attendance records; {unresolved} could not be resolved'
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from attendance.rollups import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily attendance summary rollup from attendance records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First date to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last date to rebuild (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        start = self._parse(options['start'], '--start')
+        end = self._parse(options['end'], '--end')
+        if start and end and start > end:
+            raise CommandError('--start must be on or before --end')
+
+        written = rebuild_summaries(start=start, end=end)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} daily summary rows'))
+
+    def _parse(self, value, name):
+        if not value:
+            return None
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise CommandError(f'{name} must be a date in YYYY-MM-DD format')
+        return parsed
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from attendance.leave_balances import rebuild_balances
+
+
+class Command(BaseCommand):
+    help = 'Recompute taken and pending days of the leave balance ledger from leave requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, help='Only rebuild balances of this year')
+
+    def handle(self, *args, **options):
+        written = rebuild_balances(year=options['year'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} leave balances'))
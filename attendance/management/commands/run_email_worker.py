@@ -0,0 +1,63 @@
+import logging
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand, CommandError
+from attendance import export_jobs, outbox
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued outbound email over one reused mail connection (several workers may run at once)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--worker-id', help='Identifier stored on claimed messages (default: host:pid)')
+        parser.add_argument('--once', action='store_true', help='Exit when no message is due')
+        parser.add_argument('--batch-size', type=int, default=outbox.BATCH_SIZE,
+                            help='Messages claimed and sent per batch')
+        parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help='Seconds to wait between polls when nothing is due')
+        parser.add_argument('--lease-seconds', type=int, default=outbox.LEASE_SECONDS,
+                            help='How long a claim lasts before another worker may take the messages over')
+
+    def handle(self, *args, **options):
+        worker_id = options['worker_id'] or export_jobs.default_worker_id()
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        if options['lease_seconds'] <= 0:
+            raise CommandError('--lease-seconds must be positive')
+
+        purged = outbox.purge_finished()
+        if purged:
+            self.stdout.write(f'Purged {purged} old outbound emails')
+
+        self.stdout.write(f'Email worker {worker_id} started')
+        # Opened for the first batch and kept open while messages keep
+        # coming; closed whenever the queue runs dry
+        connection = get_connection()
+        is_open = False
+        try:
+            while True:
+                emails = outbox.claim_batch(worker_id, options['batch_size'], options['lease_seconds'])
+                if not emails:
+                    if is_open:
+                        connection.close()
+                        is_open = False
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                if not is_open:
+                    try:
+                        connection.open()
+                        is_open = True
+                    except Exception:
+                        # Each message's send reports the failure and is retried
+                        logger.exception('Could not connect to the mail server')
+                sent, failed = outbox.deliver(emails, worker_id, connection)
+                self.stdout.write(f'Sent {sent} emails' + (f', {failed} failed' if failed else ''))
+        except KeyboardInterrupt:
+            self.stdout.write('Email worker stopped')
+        finally:
+            connection.close()
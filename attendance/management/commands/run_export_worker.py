@@ -0,0 +1,55 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from attendance import export_jobs
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Process queued attendance export jobs (several workers may run at once)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--worker-id', help='Identifier stored on claimed jobs (default: host:pid)')
+        parser.add_argument('--once', action='store_true', help='Exit when no job is waiting')
+        parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help='Seconds to wait between polls when the queue is empty')
+        parser.add_argument('--lease-seconds', type=int, default=export_jobs.LEASE_SECONDS,
+                            help='How long a claim lasts without progress before another worker may take over')
+
+    def handle(self, *args, **options):
+        worker_id = options['worker_id'] or export_jobs.default_worker_id()
+        lease_seconds = options['lease_seconds']
+        if lease_seconds <= 0:
+            raise CommandError('--lease-seconds must be positive')
+
+        purged = export_jobs.purge_finished()
+        if purged:
+            self.stdout.write(f'Purged {purged} old export jobs')
+
+        self.stdout.write(f'Export worker {worker_id} started')
+        try:
+            while True:
+                job = export_jobs.claim_next(worker_id, lease_seconds)
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                self._run(job, worker_id, lease_seconds)
+        except KeyboardInterrupt:
+            self.stdout.write('Export worker stopped')
+
+    def _run(self, job, worker_id, lease_seconds):
+        try:
+            job = export_jobs.run_job(job, worker_id, lease_seconds)
+        except export_jobs.LeaseLost:
+            self.stderr.write(f'Lost lease on export {job.pk}; another worker took it over')
+        except Exception:
+            logger.exception('Export job %s failed', job.pk)
+            self.stderr.write(self.style.ERROR(f'Export {job.pk} failed'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Export {job.pk} completed ({job.rows_processed} rows)'
+            ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from attendance.geofences import retag
+
+
+class Command(BaseCommand):
+    help = ('Re-tag sign-ins with the office site whose geofence they fall in (run after a site '
+            'changes; older "Lat: .., Lon: .." locations are moved by backfill_locations)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First date to re-tag (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last date to re-tag (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        start = self._parse(options['start'], '--start')
+        end = self._parse(options['end'], '--end')
+        if start and end and start > end:
+            raise CommandError('--start must be on or before --end')
+
+        updated = retag(start=start, end=end)
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} attendance records'))
+
+    def _parse(self, value, name):
+        if not value:
+            return None
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise CommandError(f'{name} must be a date in YYYY-MM-DD format')
+        return parsed
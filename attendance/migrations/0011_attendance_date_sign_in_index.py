@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("attendance", "0010_attendance_location"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="attendance",
+            index=models.Index(
+                fields=["date", "sign_in"], name="attendance__date_7c66b5_idx"
+            ),
+        ),
+    ]
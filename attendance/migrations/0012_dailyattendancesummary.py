@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("attendance", "0011_attendance_date_sign_in_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyAttendanceSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="date")),
+                (
+                    "signed_in",
+                    models.PositiveIntegerField(default=0, verbose_name="signed in"),
+                ),
+                ("late", models.PositiveIntegerField(default=0, verbose_name="late")),
+                (
+                    "on_time",
+                    models.PositiveIntegerField(default=0, verbose_name="on time"),
+                ),
+                (
+                    "signed_out",
+                    models.PositiveIntegerField(default=0, verbose_name="signed out"),
+                ),
+                (
+                    "total_worked_seconds",
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name="total worked seconds"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="updated at"),
+                ),
+                (
+                    "department",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="Leave empty for the organisation-wide totals",
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="attendance_summaries",
+                        to="attendance.department",
+                        verbose_name="department",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "daily attendance summary",
+                "verbose_name_plural": "daily attendance summaries",
+                "ordering": ["-date"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("department__isnull", False)),
+                        fields=("date", "department"),
+                        name="unique_daily_summary_per_department",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("department__isnull", True)),
+                        fields=("date",),
+                        name="unique_daily_summary_total",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("attendance", "0013_exportjob"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="attendance",
+            name="attendance__date_7c66b5_idx",
+        ),
+        migrations.AddIndex(
+            model_name="attendance",
+            index=models.Index(
+                fields=["date", "sign_in", "id"], name="attendance__date_5bcdb8_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:09
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("attendance", "0015_leaverequest_keyset_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="attendance",
+            name="date",
+            field=models.DateField(
+                default=django.utils.timezone.localdate,
+                help_text="The date of the attendance record",
+                verbose_name="date",
+            ),
+        ),
+        migrations.CreateModel(
+            name="ScanReceipt",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "key",
+                    models.CharField(max_length=64, unique=True, verbose_name="key"),
+                ),
+                (
+                    "scanned_at",
+                    models.DateTimeField(
+                        help_text="When the kiosk captured the scan",
+                        verbose_name="scanned at",
+                    ),
+                ),
+                ("result", models.JSONField(default=dict, verbose_name="result")),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="created at"),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="scan_receipts",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="user",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "scan receipt",
+                "verbose_name_plural": "scan receipts",
+                "indexes": [
+                    models.Index(
+                        fields=["created_at"], name="attendance__created_e429b3_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,126 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:18
+
+import datetime
+import math
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def mark_late_arrivals(apps, schema_editor):
+    """Store lateness of existing records under the old rule: after 09:00."""
+    Attendance = apps.get_model("attendance", "Attendance")
+    tz = timezone.get_current_timezone()
+    late = []
+    for pk, sign_in in (
+        Attendance.objects.filter(sign_in__isnull=False)
+        .values_list("pk", "sign_in")
+        .iterator(chunk_size=2000)
+    ):
+        local = sign_in.astimezone(tz)
+        start = datetime.datetime.combine(
+            local.date(), datetime.time(9, 0), tzinfo=local.tzinfo
+        )
+        late_by = (local - start).total_seconds()
+        if late_by > 0:
+            late.append(
+                Attendance(pk=pk, is_late=True, minutes_late=math.ceil(late_by / 60))
+            )
+    Attendance.objects.bulk_update(late, ["is_late", "minutes_late"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("attendance", "0016_kiosk_scans"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ShiftSchedule",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "start_time",
+                    models.TimeField(
+                        default=datetime.time(9, 0), verbose_name="start time"
+                    ),
+                ),
+                (
+                    "grace_minutes",
+                    models.PositiveSmallIntegerField(
+                        default=0,
+                        help_text="Minutes after the start time before a sign-in counts as late",
+                        verbose_name="grace minutes",
+                    ),
+                ),
+                (
+                    "working_days",
+                    models.CharField(
+                        default="12345",
+                        help_text="ISO weekday numbers (1 = Monday ... 7 = Sunday), e.g. 12345",
+                        max_length=7,
+                        validators=[
+                            django.core.validators.RegexValidator(
+                                message="Use ISO weekday numbers, e.g. 12345 for Monday to Friday.",
+                                regex="^[1-7]{1,7}$",
+                            )
+                        ],
+                        verbose_name="working days",
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="updated at"),
+                ),
+            ],
+            options={
+                "verbose_name": "shift schedule",
+                "verbose_name_plural": "shift schedules",
+                "ordering": ["department__name"],
+            },
+        ),
+        migrations.AddField(
+            model_name="attendance",
+            name="is_late",
+            field=models.BooleanField(
+                default=False,
+                help_text="Signed in after the start of the department's shift",
+                verbose_name="late",
+            ),
+        ),
+        migrations.AddField(
+            model_name="attendance",
+            name="minutes_late",
+            field=models.PositiveIntegerField(default=0, verbose_name="minutes late"),
+        ),
+        migrations.AddIndex(
+            model_name="attendance",
+            index=models.Index(
+                fields=["is_late", "date"], name="attendance__is_late_b8aaaa_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="shiftschedule",
+            name="department",
+            field=models.OneToOneField(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="shift_schedule",
+                to="attendance.department",
+                verbose_name="department",
+            ),
+        ),
+        migrations.RunPython(mark_late_arrivals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("attendance", "0017_shift_schedules"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="attendance",
+            name="worked_seconds",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="Time between sign in and sign out, stored when signing out",
+                null=True,
+                verbose_name="worked seconds",
+            ),
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:23
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_leave_balances(apps, schema_editor):
+    """Count existing pending and approved leave into the new ledger."""
+    LeaveBalance = apps.get_model("attendance", "LeaveBalance")
+    LeaveRequest = apps.get_model("attendance", "LeaveRequest")
+    columns = {"Approved": "taken", "Pending": "pending"}
+    totals = defaultdict(lambda: {"taken": 0, "pending": 0})
+    for user_id, start, end, status in LeaveRequest.objects.filter(
+        type="Leave",
+        user__isnull=False,
+        start_date__isnull=False,
+        end_date__gte=models.F("start_date"),
+        status__in=columns,
+    ).values_list("user_id", "start_date", "end_date", "status"):
+        totals[(user_id, start.year)][columns[status]] += (end - start).days + 1
+    LeaveBalance.objects.bulk_create(
+        [
+            LeaveBalance(
+                user_id=user_id,
+                year=year,
+                allowance=getattr(settings, "LEAVE_ALLOWANCE_DAYS", 10),
+                **counters,
+            )
+            for (user_id, year), counters in totals.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("attendance", "0018_attendance_worked_seconds"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LeaveBalance",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("year", models.PositiveSmallIntegerField(verbose_name="year")),
+                (
+                    "allowance",
+                    models.PositiveSmallIntegerField(
+                        help_text="Days of leave available in the year",
+                        verbose_name="allowance",
+                    ),
+                ),
+                ("taken", models.PositiveIntegerField(default=0, verbose_name="taken")),
+                (
+                    "pending",
+                    models.PositiveIntegerField(default=0, verbose_name="pending"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="updated at"),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="leave_balances",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="user",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "leave balance",
+                "verbose_name_plural": "leave balances",
+                "ordering": ["-year", "user"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "year"), name="unique_leave_balance_per_year"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(fill_leave_balances, migrations.RunPython.noop),
+    ]
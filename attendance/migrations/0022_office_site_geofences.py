@@ -0,0 +1,144 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("attendance", "0021_geocode_cache"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OfficeSite",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(max_length=100, unique=True, verbose_name="name"),
+                ),
+                (
+                    "latitude",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=6,
+                        max_digits=9,
+                        null=True,
+                        verbose_name="latitude",
+                    ),
+                ),
+                (
+                    "longitude",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=6,
+                        max_digits=9,
+                        null=True,
+                        verbose_name="longitude",
+                    ),
+                ),
+                (
+                    "radius_m",
+                    models.PositiveIntegerField(
+                        blank=True,
+                        help_text="Circular geofence around the latitude/longitude",
+                        null=True,
+                        verbose_name="radius (m)",
+                    ),
+                ),
+                (
+                    "boundary",
+                    models.JSONField(
+                        blank=True,
+                        help_text="Polygon geofence: a list of [latitude, longitude] points",
+                        null=True,
+                        verbose_name="boundary",
+                    ),
+                ),
+                ("is_active", models.BooleanField(default=True, verbose_name="active")),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="updated at"),
+                ),
+            ],
+            options={
+                "verbose_name": "office site",
+                "verbose_name_plural": "office sites",
+                "ordering": ["name"],
+            },
+        ),
+        migrations.AddField(
+            model_name="attendance",
+            name="accuracy_m",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="Accuracy the device reported for the coordinates",
+                null=True,
+                verbose_name="accuracy (m)",
+            ),
+        ),
+        migrations.AddField(
+            model_name="attendance",
+            name="inside_geofence",
+            field=models.BooleanField(
+                blank=True,
+                help_text="Signed in inside an office geofence; empty without coordinates",
+                null=True,
+                verbose_name="on site",
+            ),
+        ),
+        migrations.AddField(
+            model_name="attendance",
+            name="latitude",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=6,
+                max_digits=9,
+                null=True,
+                verbose_name="latitude",
+            ),
+        ),
+        migrations.AddField(
+            model_name="attendance",
+            name="longitude",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=6,
+                max_digits=9,
+                null=True,
+                verbose_name="longitude",
+            ),
+        ),
+        migrations.AddField(
+            model_name="attendance",
+            name="site",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Office site whose geofence the sign-in fell in",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="attendances",
+                to="attendance.officesite",
+                verbose_name="site",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="attendance",
+            index=models.Index(
+                fields=["inside_geofence", "date"],
+                name="attendance__inside__7d2f83_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("attendance", "0022_office_site_geofences"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Location",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("address", models.CharField(max_length=500, verbose_name="address")),
+                (
+                    "address_hash",
+                    models.CharField(
+                        editable=False,
+                        max_length=64,
+                        unique=True,
+                        verbose_name="address hash",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="created at"),
+                ),
+            ],
+            options={
+                "verbose_name": "location",
+                "verbose_name_plural": "locations",
+                "ordering": ["address"],
+            },
+        ),
+        # Keep the existing column under a new field name; no table rewrite
+        migrations.AlterField(
+            model_name="attendance",
+            name="location",
+            field=models.CharField(
+                blank=True,
+                db_column="location",
+                help_text="Location from where the user signed in (address or coordinates)",
+                max_length=500,
+                verbose_name="location",
+            ),
+        ),
+        migrations.RenameField(
+            model_name="attendance",
+            old_name="location",
+            new_name="legacy_location",
+        ),
+        migrations.AlterField(
+            model_name="attendance",
+            name="legacy_location",
+            field=models.CharField(
+                blank=True,
+                db_column="location",
+                help_text="Location text stored before locations were normalized; moved to location by the backfill_locations command",
+                max_length=500,
+                verbose_name="legacy location",
+            ),
+        ),
+        migrations.AddField(
+            model_name="attendance",
+            name="location",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Location from where the user signed in",
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="attendances",
+                to="attendance.location",
+                verbose_name="location",
+            ),
+        ),
+    ]
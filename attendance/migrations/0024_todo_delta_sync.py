@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("attendance", "0023_location_dimension"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TodoTombstone",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("todo_id", models.PositiveBigIntegerField(verbose_name="todo id")),
+                (
+                    "deleted_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="deleted at"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "todo tombstone",
+                "verbose_name_plural": "todo tombstones",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="todoitem",
+            index=models.Index(
+                fields=["user", "updated_at"], name="attendance__user_id_315cb9_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="todoitem",
+            index=models.Index(
+                fields=["user", "status", "completed_at"],
+                name="attendance__user_id_2fd97d_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="todotombstone",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="todo_tombstones",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="user",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="todotombstone",
+            index=models.Index(
+                fields=["user", "deleted_at"], name="attendance__user_id_9bf9f4_idx"
+            ),
+        ),
+    ]
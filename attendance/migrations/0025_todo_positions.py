@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Same spacing as attendance.todos.POSITION_GAP
+POSITION_GAP = 1024
+
+
+def number_todo_items(apps, schema_editor):
+    """Space each column out in its current order, newest first."""
+    TodoItem = apps.get_model("attendance", "TodoItem")
+    items = TodoItem.objects.order_by("user_id", "status", "-created_at", "-id").only(
+        "id", "user_id", "status"
+    )
+    column, index, changed = None, 0, []
+    for item in items.iterator(chunk_size=2000):
+        if (item.user_id, item.status) != column:
+            column, index = (item.user_id, item.status), 0
+        index += 1
+        item.position = index * POSITION_GAP
+        changed.append(item)
+        if len(changed) >= 2000:
+            TodoItem.objects.bulk_update(changed, ["position"])
+            changed = []
+    TodoItem.objects.bulk_update(changed, ["position"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("attendance", "0024_todo_delta_sync"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="todoitem",
+            name="position",
+            field=models.BigIntegerField(
+                default=0,
+                help_text="Order within the status column, lowest first; spaced apart so that moving an item only rewrites that item",
+                verbose_name="position",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="todoitem",
+            index=models.Index(
+                fields=["user", "status", "position"],
+                name="attendance__user_id_b0d9e6_idx",
+            ),
+        ),
+        migrations.RunPython(number_todo_items, migrations.RunPython.noop),
+    ]
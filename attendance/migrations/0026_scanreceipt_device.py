@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("attendance", "0025_todo_positions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="scanreceipt",
+            name="device",
+            field=models.CharField(
+                blank=True,
+                help_text="Kiosk that submitted a queued scan",
+                max_length=150,
+                verbose_name="device",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="scanreceipt",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True,
+                help_text="When the server received the scan",
+                verbose_name="received at",
+            ),
+        ),
+    ]
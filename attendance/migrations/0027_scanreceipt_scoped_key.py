@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:01
+
+from django.db import migrations, models
+
+
+def scope_kiosk_keys(apps, schema_editor):
+    """Prefix existing kiosk receipt keys the way scans.receipt_key() does."""
+    ScanReceipt = apps.get_model("attendance", "ScanReceipt")
+    receipts = ScanReceipt.objects.exclude(key__startswith="web:").exclude(
+        key__startswith="kiosk:"
+    )
+    changed = []
+    for receipt in receipts.only("id", "key", "user_id").iterator(chunk_size=2000):
+        owner = receipt.user_id if receipt.user_id is not None else "unknown"
+        receipt.key = f"kiosk:{owner}:{receipt.key}"
+        changed.append(receipt)
+        if len(changed) >= 2000:
+            ScanReceipt.objects.bulk_update(changed, ["key"])
+            changed = []
+    ScanReceipt.objects.bulk_update(changed, ["key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("attendance", "0026_scanreceipt_device"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="scanreceipt",
+            name="key",
+            field=models.CharField(max_length=100, unique=True, verbose_name="key"),
+        ),
+        migrations.RunPython(scope_kiosk_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("attendance", "0027_scanreceipt_scoped_key"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="attendance",
+            name="inside_geofence",
+            field=models.BooleanField(
+                blank=True,
+                help_text="Signed in inside an office geofence; empty without coordinates or when the position was too inaccurate to tell",
+                null=True,
+                verbose_name="on site",
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:40
+
+from django.db import migrations
+
+
+def fill_attendance_summaries(apps, schema_editor):
+    """Count existing attendance into the rollup read by the dashboard and charts."""
+    from attendance.rollups import rebuild_summaries
+
+    rebuild_summaries(
+        attendance_model=apps.get_model("attendance", "Attendance"),
+        summary_model=apps.get_model("attendance", "DailyAttendanceSummary"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("attendance", "0028_inside_geofence_unknown"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_attendance_summaries, migrations.RunPython.noop),
+    ]
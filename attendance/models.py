@@ -1,8 +1,11 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from django.utils.text import slugify
 from django.utils.translation import gettext_lazy as _
+from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
+import datetime
 import uuid
 
 
@@ -29,6 +32,132 @@ class Department(models.Model):
         return self.name
 
 
+class ShiftSchedule(models.Model):
+    """
+    Working hours a department's sign-ins are judged against.
+
+    A sign-in later than ``start_time`` plus ``grace_minutes`` on one of the
+    ``working_days`` is late. Departments without a schedule use
+    ``attendance.shifts.DEFAULT_SHIFT``. After changing a schedule, run the
+    ``reevaluate_lateness`` management command to update existing records.
+    """
+
+    department = models.OneToOneField(
+        Department,
+        on_delete=models.CASCADE,
+        related_name="shift_schedule",
+        verbose_name=_("department"),
+    )
+    start_time = models.TimeField(_("start time"), default=datetime.time(9, 0))
+    grace_minutes = models.PositiveSmallIntegerField(
+        _("grace minutes"),
+        default=0,
+        help_text=_("Minutes after the start time before a sign-in counts as late"),
+    )
+    working_days = models.CharField(
+        _("working days"),
+        max_length=7,
+        default="12345",
+        validators=[
+            RegexValidator(
+                regex=r"^[1-7]{1,7}$",
+                message=_("Use ISO weekday numbers, e.g. 12345 for Monday to Friday."),
+            )
+        ],
+        help_text=_("ISO weekday numbers (1 = Monday ... 7 = Sunday), e.g. 12345"),
+    )
+    updated_at = models.DateTimeField(_("updated at"), auto_now=True)
+
+    class Meta:
+        verbose_name = _("shift schedule")
+        verbose_name_plural = _("shift schedules")
+        ordering = ["department__name"]
+
+    def __str__(self):
+        return f"{self.department} from {self.start_time:%H:%M}"
+
+
+class OfficeSite(models.Model):
+    """
+    Place where sign-ins count as on site.
+
+    The geofence is either a circle (``latitude``/``longitude`` and
+    ``radius_m``) or a polygon (``boundary``, a list of ``[lat, lon]``
+    vertices). Sign-ins with coordinates are tagged with the site they fall
+    in when written (see ``attendance.geofences``); after changing a site,
+    run the ``tag_geofences`` management command to update existing records.
+    """
+
+    name = models.CharField(_("name"), max_length=100, unique=True)
+    latitude = models.DecimalField(
+        _("latitude"), max_digits=9, decimal_places=6, null=True, blank=True
+    )
+    longitude = models.DecimalField(
+        _("longitude"), max_digits=9, decimal_places=6, null=True, blank=True
+    )
+    radius_m = models.PositiveIntegerField(
+        _("radius (m)"),
+        null=True,
+        blank=True,
+        help_text=_("Circular geofence around the latitude/longitude"),
+    )
+    boundary = models.JSONField(
+        _("boundary"),
+        null=True,
+        blank=True,
+        help_text=_("Polygon geofence: a list of [latitude, longitude] points"),
+    )
+    is_active = models.BooleanField(_("active"), default=True)
+    updated_at = models.DateTimeField(_("updated at"), auto_now=True)
+
+    class Meta:
+        verbose_name = _("office site")
+        verbose_name_plural = _("office sites")
+        ordering = ["name"]
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        if self.boundary is not None:
+            try:
+                points = [(float(lat), float(lon)) for lat, lon in self.boundary]
+            except (TypeError, ValueError):
+                points = None
+            if not points or len(points) < 3:
+                raise ValidationError(
+                    {"boundary": _("Give at least three [latitude, longitude] points.")}
+                )
+        elif self.radius_m is None or self.latitude is None or self.longitude is None:
+            raise ValidationError(
+                _("Give either a boundary or a latitude, longitude and radius.")
+            )
+
+
+class Location(models.Model):
+    """
+    One distinct sign-in location (usually a reverse-geocoded address).
+
+    Attendance records point here instead of repeating the address text.
+    Rows are never changed once written and are found by the SHA-256 of
+    their address (see ``attendance.locations``).
+    """
+
+    address = models.CharField(_("address"), max_length=500)
+    address_hash = models.CharField(
+        _("address hash"), max_length=64, unique=True, editable=False
+    )
+    created_at = models.DateTimeField(_("created at"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("location")
+        verbose_name_plural = _("locations")
+        ordering = ["address"]
+
+    def __str__(self):
+        return self.address
+
+
 class Staff(models.Model):
     """Staff model extending the default User model"""
 
@@ -106,18 +235,33 @@ class Attendance(models.Model):
         help_text=_("When the user signed out"),
     )
     date = models.DateField(
-        _("date"), auto_now_add=True, help_text=_("The date of the attendance record")
+        _("date"),
+        default=timezone.localdate,
+        help_text=_("The date of the attendance record"),
     )
     notes = models.TextField(
         _("notes"),
         blank=True,
         help_text=_("Any additional notes about this attendance record"),
     )
-    location = models.CharField(
-        _("location"),
+    location = models.ForeignKey(
+        Location,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="attendances",
+        verbose_name=_("location"),
+        help_text=_("Location from where the user signed in"),
+    )
+    legacy_location = models.CharField(
+        _("legacy location"),
         max_length=500,
         blank=True,
-        help_text=_("Location from where the user signed in (address or coordinates)"),
+        db_column="location",
+        help_text=_(
+            "Location text stored before locations were normalized; moved to "
+            "location by the backfill_locations command"
+        ),
     )
     created_at = models.DateTimeField(
         _("created at"),
@@ -129,6 +273,48 @@ class Attendance(models.Model):
     updated_at = models.DateTimeField(
         _("updated at"), auto_now=True, help_text=_("When this record was last updated")
     )
+    is_late = models.BooleanField(
+        _("late"),
+        default=False,
+        help_text=_("Signed in after the start of the department's shift"),
+    )
+    minutes_late = models.PositiveIntegerField(_("minutes late"), default=0)
+    worked_seconds = models.PositiveIntegerField(
+        _("worked seconds"),
+        null=True,
+        blank=True,
+        help_text=_("Time between sign in and sign out, stored when signing out"),
+    )
+    latitude = models.DecimalField(
+        _("latitude"), max_digits=9, decimal_places=6, null=True, blank=True
+    )
+    longitude = models.DecimalField(
+        _("longitude"), max_digits=9, decimal_places=6, null=True, blank=True
+    )
+    accuracy_m = models.PositiveIntegerField(
+        _("accuracy (m)"),
+        null=True,
+        blank=True,
+        help_text=_("Accuracy the device reported for the coordinates"),
+    )
+    site = models.ForeignKey(
+        OfficeSite,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="attendances",
+        verbose_name=_("site"),
+        help_text=_("Office site whose geofence the sign-in fell in"),
+    )
+    inside_geofence = models.BooleanField(
+        _("on site"),
+        null=True,
+        blank=True,
+        help_text=_(
+            "Signed in inside an office geofence; empty without coordinates "
+            "or when the position was too inaccurate to tell"
+        ),
+    )
 
     class Meta:
         verbose_name = _("attendance record")
@@ -140,6 +326,13 @@ class Attendance(models.Model):
             models.Index(fields=["date"]),
             models.Index(fields=["sign_in"]),
             models.Index(fields=["sign_out"]),
+            # Keyset pagination order of the attendance list; its prefix also
+            # covers per-day aggregates on sign-in time
+            models.Index(fields=["date", "sign_in", "id"]),
+            # Late-arrival counts and filters over a date range
+            models.Index(fields=["is_late", "date"]),
+            # On-site / off-site filters over a date range
+            models.Index(fields=["inside_geofence", "date"]),
         ]
 
     def __str__(self):
@@ -155,11 +348,141 @@ class Attendance(models.Model):
             return self.sign_out - self.sign_in
         return None
 
+    def measure_worked(self):
+        """Set ``worked_seconds`` from the sign in/out times and return it."""
+        self.worked_seconds = None
+        if self.sign_in and self.sign_out:
+            self.worked_seconds = max(
+                int((self.sign_out - self.sign_in).total_seconds()), 0
+            )
+        return self.worked_seconds
+
+    @property
+    def worked_display(self):
+        """Worked time as ``H:MM``, or None until the user signs out."""
+        if self.worked_seconds is None:
+            return None
+        return f"{self.worked_seconds // 3600}:{self.worked_seconds % 3600 // 60:02d}"
+
+    @property
+    def location_display(self):
+        """Where the user signed in, as text ("" if unknown)."""
+        if self.location_id:
+            return self.location.address
+        if self.legacy_location:
+            return self.legacy_location
+        if self.latitude is not None and self.longitude is not None:
+            return f"Lat: {self.latitude}, Lon: {self.longitude}"
+        return ""
+
     def is_signed_in(self):
         """Check if the user is currently signed in (signed in but not out)."""
         return bool(self.sign_in and not self.sign_out)
 
 
+class DailyAttendanceSummary(models.Model):
+    """
+    Per-day attendance counters, optionally broken down by department.
+
+    The row without a department holds the totals for everyone. Counters are
+    incremented on every sign-in/sign-out so dashboards can read a handful of
+    rows instead of scanning the attendance table; they can be recomputed with
+    the ``rebuild_attendance_summaries`` management command.
+    """
+
+    date = models.DateField(_("date"))
+    department = models.ForeignKey(
+        Department,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="attendance_summaries",
+        verbose_name=_("department"),
+        help_text=_("Leave empty for the organisation-wide totals"),
+    )
+    signed_in = models.PositiveIntegerField(_("signed in"), default=0)
+    late = models.PositiveIntegerField(_("late"), default=0)
+    on_time = models.PositiveIntegerField(_("on time"), default=0)
+    signed_out = models.PositiveIntegerField(_("signed out"), default=0)
+    total_worked_seconds = models.PositiveBigIntegerField(
+        _("total worked seconds"), default=0
+    )
+    updated_at = models.DateTimeField(_("updated at"), auto_now=True)
+
+    class Meta:
+        verbose_name = _("daily attendance summary")
+        verbose_name_plural = _("daily attendance summaries")
+        ordering = ["-date"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "department"],
+                condition=models.Q(department__isnull=False),
+                name="unique_daily_summary_per_department",
+            ),
+            models.UniqueConstraint(
+                fields=["date"],
+                condition=models.Q(department__isnull=True),
+                name="unique_daily_summary_total",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.department or 'All departments'} - {self.date}"
+
+
+class ScanReceipt(models.Model):
+    """
+    Outcome of a kiosk scan, keyed by the identifier the kiosk gave it
+    scoped to the badge holder (see ``scans.receipt_key``).
+
+    A kiosk that resends a scan (after a timeout or while flushing its
+    offline queue) gets the stored outcome back instead of the scan being
+    applied twice. ``scanned_at`` is the capture time the kiosk claimed and
+    ``created_at`` when the server received it; ``device`` names the kiosk
+    (see ``attendance.kiosks``).
+    """
+
+    key = models.CharField(_("key"), max_length=100, unique=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="scan_receipts",
+        verbose_name=_("user"),
+    )
+    scanned_at = models.DateTimeField(
+        _("scanned at"), help_text=_("When the kiosk captured the scan")
+    )
+    device = models.CharField(
+        _("device"),
+        max_length=150,
+        blank=True,
+        help_text=_("Kiosk that submitted a queued scan"),
+    )
+    result = models.JSONField(_("result"), default=dict)
+    created_at = models.DateTimeField(
+        _("received at"),
+        auto_now_add=True,
+        help_text=_("When the server received the scan"),
+    )
+
+    class Meta:
+        verbose_name = _("scan receipt")
+        verbose_name_plural = _("scan receipts")
+        indexes = [models.Index(fields=["created_at"])]
+
+    def __str__(self):
+        return f"{self.key} ({self.result.get('action') or 'rejected'})"
+
+    @property
+    def delay(self):
+        """How long after its claimed capture time the scan reached the server."""
+        if self.created_at is None or self.scanned_at is None:
+            return None
+        return self.created_at - self.scanned_at
+
+
 class LeaveRequest(models.Model):
     """
     Model to track staff leave requests.
@@ -234,6 +557,9 @@ class LeaveRequest(models.Model):
             models.Index(fields=["user", "start_date"]),
             models.Index(fields=["status"]),
             models.Index(fields=["start_date", "end_date"]),
+            # Keyset pagination order of the time off list, overall and per status
+            models.Index(fields=["created_at", "id"]),
+            models.Index(fields=["status", "created_at", "id"]),
         ]
 
     def __str__(self):
@@ -255,6 +581,49 @@ class LeaveRequest(models.Model):
         return self.status == "Pending"
 
 
+class LeaveBalance(models.Model):
+    """
+    A user's leave allowance and usage for one calendar year, in days.
+
+    ``taken`` counts approved and ``pending`` unreviewed leave requests of
+    type "Leave", attributed to the year they start in. The ledger is
+    adjusted in the same transaction as every submission and review (see
+    ``attendance.leave_balances``) and can be recomputed with the
+    ``rebuild_leave_balances`` management command.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="leave_balances",
+        verbose_name=_("user"),
+    )
+    year = models.PositiveSmallIntegerField(_("year"))
+    allowance = models.PositiveSmallIntegerField(
+        _("allowance"), help_text=_("Days of leave available in the year")
+    )
+    taken = models.PositiveIntegerField(_("taken"), default=0)
+    pending = models.PositiveIntegerField(_("pending"), default=0)
+    updated_at = models.DateTimeField(_("updated at"), auto_now=True)
+
+    class Meta:
+        verbose_name = _("leave balance")
+        verbose_name_plural = _("leave balances")
+        ordering = ["-year", "user"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "year"], name="unique_leave_balance_per_year"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.year}: {self.remaining} of {self.allowance} days left"
+
+    @property
+    def remaining(self):
+        return max(self.allowance - self.taken, 0)
+
+
 class TodoItem(models.Model):
     """
     Model to track todo items for users with status tracking and dates.
@@ -290,6 +659,14 @@ class TodoItem(models.Model):
         default="TODO",
         help_text=_("Current status of the todo item"),
     )
+    position = models.BigIntegerField(
+        _("position"),
+        default=0,
+        help_text=_(
+            "Order within the status column, lowest first; spaced apart so "
+            "that moving an item only rewrites that item"
+        ),
+    )
     created_at = models.DateTimeField(
         _("created at"),
         auto_now_add=True,
@@ -321,6 +698,10 @@ class TodoItem(models.Model):
             models.Index(fields=["user", "status"]),
             models.Index(fields=["status"]),
             models.Index(fields=["created_at"]),
+            # Delta sync (attendance.todos) and the DONE archive
+            models.Index(fields=["user", "updated_at"]),
+            models.Index(fields=["user", "status", "completed_at"]),
+            models.Index(fields=["user", "status", "position"]),
         ]
     
     def __str__(self):
@@ -345,6 +726,33 @@ class TodoItem(models.Model):
             self.save()
 
 
+class TodoTombstone(models.Model):
+    """
+    Record of a deleted todo item, so delta syncs can tell clients to drop it.
+
+    Written by ``attendance.todos.delete`` and kept for
+    ``TODO_TOMBSTONE_DAYS``; clients syncing from further back get a full
+    list instead.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="todo_tombstones",
+        verbose_name=_("user"),
+    )
+    todo_id = models.PositiveBigIntegerField(_("todo id"))
+    deleted_at = models.DateTimeField(_("deleted at"), default=timezone.now)
+
+    class Meta:
+        verbose_name = _("todo tombstone")
+        verbose_name_plural = _("todo tombstones")
+        indexes = [models.Index(fields=["user", "deleted_at"])]
+
+    def __str__(self):
+        return f"todo {self.todo_id} deleted at {self.deleted_at}"
+
+
 # Create your models here.
 
 
@@ -398,3 +806,160 @@ class DelegatedDuty(models.Model):
 
     def __str__(self):
         return f"{self.title} → {self.assigned_to.get_full_name() or self.assigned_to.username}"
+
+
+class ExportJob(models.Model):
+    """
+    Attendance export generated in the background by ``run_export_worker``.
+
+    Workers claim pending jobs with a lease that they renew while writing;
+    a job whose lease runs out (crashed worker) becomes claimable again.
+    """
+
+    FORMAT_CHOICES = [
+        ("csv", _("CSV")),
+        ("excel", _("Excel")),
+        ("pdf", _("PDF")),
+    ]
+    STATUS_CHOICES = [
+        ("Pending", _("Pending")),
+        ("Running", _("Running")),
+        ("Completed", _("Completed")),
+        ("Failed", _("Failed")),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="export_jobs",
+        verbose_name=_("requested by"),
+    )
+    format = models.CharField(_("format"), max_length=10, choices=FORMAT_CHOICES)
+    filters = models.JSONField(
+        _("filters"),
+        default=dict,
+        blank=True,
+        help_text=_("Export filters: start, end, department and user"),
+    )
+    status = models.CharField(
+        _("status"), max_length=20, choices=STATUS_CHOICES, default="Pending"
+    )
+    rows_processed = models.PositiveIntegerField(_("rows processed"), default=0)
+    total_rows = models.PositiveIntegerField(_("total rows"), null=True, blank=True)
+    file = models.FileField(_("file"), upload_to="exports/", blank=True)
+    error = models.TextField(_("error"), blank=True)
+    worker = models.CharField(
+        _("worker"),
+        max_length=100,
+        blank=True,
+        help_text=_("Identifier of the worker holding the lease"),
+    )
+    lease_expires_at = models.DateTimeField(_("lease expires at"), null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(_("attempts"), default=0)
+    created_at = models.DateTimeField(_("created at"), auto_now_add=True)
+    started_at = models.DateTimeField(_("started at"), null=True, blank=True)
+    finished_at = models.DateTimeField(_("finished at"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("export job")
+        verbose_name_plural = _("export jobs")
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+            models.Index(fields=["status", "lease_expires_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.get_format_display()} export ({self.status})"
+
+    @property
+    def percent_complete(self):
+        """Progress as a whole percentage, or None while the total is unknown."""
+        if self.status == "Completed":
+            return 100
+        if not self.total_rows:
+            return None
+        return min(int(self.rows_processed * 100 / self.total_rows), 99)
+
+
+class OutboundEmail(models.Model):
+    """
+    Email queued for delivery by ``run_email_worker``.
+
+    Requests write the message in the same transaction as the change that
+    triggers it (e.g. a registration) instead of talking to the mail server;
+    the worker delivers queued messages in batches over one SMTP connection
+    and retries failures with exponential backoff.
+    """
+
+    STATUS_CHOICES = [
+        ("Pending", _("Pending")),
+        ("Sending", _("Sending")),
+        ("Sent", _("Sent")),
+        ("Failed", _("Failed")),
+    ]
+
+    to = models.JSONField(_("to"), help_text=_("List of recipient addresses"))
+    from_email = models.CharField(_("from"), max_length=254, blank=True)
+    subject = models.CharField(_("subject"), max_length=255)
+    body = models.TextField(_("body"))
+    html_body = models.TextField(_("HTML body"), blank=True)
+    status = models.CharField(
+        _("status"), max_length=20, choices=STATUS_CHOICES, default="Pending"
+    )
+    attempts = models.PositiveSmallIntegerField(_("attempts"), default=0)
+    next_attempt_at = models.DateTimeField(
+        _("next attempt at"),
+        default=timezone.now,
+        help_text=_("Pending messages are not sent before this time"),
+    )
+    last_error = models.TextField(_("last error"), blank=True)
+    worker = models.CharField(_("worker"), max_length=100, blank=True)
+    lease_expires_at = models.DateTimeField(_("lease expires at"), null=True, blank=True)
+    created_at = models.DateTimeField(_("created at"), auto_now_add=True)
+    sent_at = models.DateTimeField(_("sent at"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("outbound email")
+        verbose_name_plural = _("outbound emails")
+        ordering = ["-created_at"]
+        indexes = [
+            # Claiming due messages, and purging old sent ones
+            models.Index(fields=["status", "next_attempt_at"]),
+            models.Index(fields=["status", "sent_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)} ({self.status})"
+
+
+class GeocodeCache(models.Model):
+    """
+    Address resolved for a cell of the geocoding grid.
+
+    ``latitude``/``longitude`` are the coordinates snapped to the grid (see
+    ``attendance.geocoding``), so every scan from the same building shares
+    one entry and is never sent to a resolver again.
+    """
+
+    latitude = models.DecimalField(_("latitude"), max_digits=9, decimal_places=6)
+    longitude = models.DecimalField(_("longitude"), max_digits=9, decimal_places=6)
+    address = models.CharField(_("address"), max_length=500)
+    source = models.CharField(
+        _("source"), max_length=100, help_text=_("Resolver that produced the address")
+    )
+    created_at = models.DateTimeField(_("created at"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("geocode cache entry")
+        verbose_name_plural = _("geocode cache entries")
+        ordering = ["-created_at"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["latitude", "longitude"], name="unique_geocode_cell"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.latitude}, {self.longitude}: {self.address}"
@@ -0,0 +1,182 @@
+"""
+Outgoing email queue.
+
+Views call :func:`enqueue` inside the transaction that triggers the message,
+so an email exists exactly when the change that caused it was committed and
+no request waits on the mail server. Each ``run_email_worker`` process
+claims due messages in batches with :func:`claim_batch` and sends them with
+:func:`deliver` over a single backend connection that stays open across
+batches. Delivery is at least once: a worker that dies mid-batch leaves its
+messages to be sent again after the lease runs out.
+
+Claiming follows ``attendance.export_jobs``: candidate rows are locked with
+``SELECT ... FOR UPDATE SKIP LOCKED`` where the database supports it, and the
+claim is a conditional ``UPDATE`` stamped with the worker and lease, so
+several workers never send the same message. A message whose worker dies
+becomes claimable again when its lease runs out. Failed sends are retried
+with exponential backoff until ``MAX_ATTEMPTS`` is reached.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db import connection as db_connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+BATCH_SIZE = 50
+
+LEASE_SECONDS = 300
+
+MAX_ATTEMPTS = 5
+
+# Delay before the first retry; doubled after every further failure.
+BACKOFF_SECONDS = 60
+MAX_BACKOFF_SECONDS = 60 * 60
+
+# Sent and failed messages are removed after this long.
+RETENTION_DAYS = 30
+
+
+def enqueue(subject, body, to, html_body="", from_email=""):
+    """Queue a message to the ``to`` address (or list of addresses)."""
+    if isinstance(to, str):
+        to = [to]
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        html_body=html_body,
+        to=list(to),
+        from_email=from_email,
+    )
+
+
+def backoff(attempts):
+    """Delay before retrying a message that has failed ``attempts`` times."""
+    return timedelta(
+        seconds=min(BACKOFF_SECONDS * 2 ** max(attempts - 1, 0), MAX_BACKOFF_SECONDS)
+    )
+
+
+def _fail_abandoned(now):
+    """Give up on messages whose lease has expired ``MAX_ATTEMPTS`` times."""
+    OutboundEmail.objects.filter(
+        status="Sending", lease_expires_at__lt=now, attempts__gte=MAX_ATTEMPTS
+    ).update(
+        status="Failed",
+        last_error="Email worker stopped responding",
+        lease_expires_at=None,
+    )
+
+
+def claim_batch(worker_id, size=BATCH_SIZE, lease_seconds=LEASE_SECONDS):
+    """
+    Claim up to ``size`` due messages for ``worker_id``, oldest due first.
+
+    Pending messages whose retry time has come and sending messages with an
+    expired lease are due. Returns the claimed messages.
+    """
+    now = timezone.now()
+    _fail_abandoned(now)
+    lease_until = now + timedelta(seconds=lease_seconds)
+
+    due = OutboundEmail.objects.filter(
+        Q(status="Pending", next_attempt_at__lte=now)
+        | Q(status="Sending", lease_expires_at__lt=now, attempts__lt=MAX_ATTEMPTS)
+    )
+    with transaction.atomic():
+        if db_connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        candidates = list(
+            due.order_by("next_attempt_at").values_list("pk", flat=True)[:size]
+        )
+        if not candidates:
+            return []
+        # Re-check the conditions so rows claimed meanwhile are left alone
+        OutboundEmail.objects.filter(
+            Q(status="Pending") | Q(status="Sending", lease_expires_at__lt=now),
+            pk__in=candidates,
+        ).update(
+            status="Sending",
+            worker=worker_id,
+            lease_expires_at=lease_until,
+            attempts=F("attempts") + 1,
+        )
+    return list(
+        OutboundEmail.objects.filter(
+            pk__in=candidates, worker=worker_id, lease_expires_at=lease_until
+        ).order_by("next_attempt_at")
+    )
+
+
+def _message(email, connection):
+    message = EmailMultiAlternatives(
+        email.subject,
+        email.body,
+        email.from_email or settings.DEFAULT_FROM_EMAIL,
+        email.to,
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, "text/html")
+    return message
+
+
+def _owned(email, worker_id):
+    return OutboundEmail.objects.filter(pk=email.pk, status="Sending", worker=worker_id)
+
+
+def deliver(emails, worker_id, connection):
+    """
+    Send claimed ``emails`` over the already-opened backend ``connection``.
+
+    Each message gets its own status: sent messages are marked in one
+    update, failed ones are rescheduled with backoff or marked as failed
+    after ``MAX_ATTEMPTS``. Returns ``(sent, failed)`` counts.
+    """
+    sent, failed = [], 0
+    for email in emails:
+        try:
+            connection.send_messages([_message(email, connection)])
+        except Exception as e:
+            failed += 1
+            # The server may have dropped the connection; reopen it for the
+            # next message (send_messages() retries if this fails too)
+            connection.close()
+            try:
+                connection.open()
+            except Exception:
+                pass
+            retry = email.attempts < MAX_ATTEMPTS
+            _owned(email, worker_id).update(
+                status="Pending" if retry else "Failed",
+                next_attempt_at=timezone.now() + backoff(email.attempts),
+                last_error=f"{type(e).__name__}: {e}"[:1000],
+                worker="",
+                lease_expires_at=None,
+            )
+        else:
+            sent.append(email.pk)
+    if sent:
+        OutboundEmail.objects.filter(
+            pk__in=sent, status="Sending", worker=worker_id
+        ).update(
+            status="Sent",
+            sent_at=timezone.now(),
+            last_error="",
+            worker="",
+            lease_expires_at=None,
+        )
+    return len(sent), failed
+
+
+def purge_finished(days=RETENTION_DAYS):
+    """Delete sent and failed messages older than ``days`` days."""
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = OutboundEmail.objects.filter(
+        Q(status="Sent", sent_at__lt=cutoff) | Q(status="Failed", created_at__lt=cutoff)
+    ).delete()
+    return deleted
@@ -0,0 +1,154 @@
+"""
+Keyset (cursor) pagination.
+
+Offset pagination makes the database walk past every skipped row, so deep
+pages get slower the further back an admin browses. Keyset pagination
+instead remembers the sort key of the last row shown and asks for rows that
+sort after it, which an index on the ordering columns answers directly
+whatever the depth.
+
+The ordering must end with a unique column (normally ``id``) so that the
+position between two rows is never ambiguous. Nullable columns sort their
+NULLs last in both directions.
+"""
+
+import base64
+import json
+
+from django.db.models import F, Q
+
+DEFAULT_PER_PAGE = 50
+
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor that cannot be decoded for this ordering."""
+
+
+class KeysetPage:
+    """One page of results plus the cursor of the page that follows it."""
+
+    def __init__(self, object_list, next_cursor, is_first):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.is_first = is_first
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _columns(model, ordering):
+    """Return ``(name, descending, field)`` for each entry of ``ordering``."""
+    columns = []
+    for entry in ordering:
+        name = entry.lstrip("-")
+        columns.append((name, entry.startswith("-"), model._meta.get_field(name)))
+    return columns
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, columns):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError):
+        raise InvalidCursor("malformed cursor")
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise InvalidCursor("cursor does not match the ordering")
+    try:
+        return [
+            None if value is None else field.to_python(value)
+            for value, (_, _, field) in zip(values, columns)
+        ]
+    except Exception:
+        raise InvalidCursor("cursor does not match the ordering")
+
+
+def _after(name, descending, nullable, value):
+    """Rows whose ``name`` column sorts strictly after ``value``."""
+    if value is None:
+        # NULLs sort last, so nothing comes after them on this column
+        return None
+    q = Q(**{f"{name}__{'lt' if descending else 'gt'}": value})
+    if nullable:
+        q |= Q(**{f"{name}__isnull": True})
+    return q
+
+
+def _equal(name, value):
+    if value is None:
+        return Q(**{f"{name}__isnull": True})
+    return Q(**{name: value})
+
+
+def keyset_filter(columns, values):
+    """
+    Build the filter for rows after the row whose sort key is ``values``.
+
+    For ordering ``(a, b, c)`` this is
+    ``a >= va AND (a > va OR (a = va AND b > vb) OR (a = va AND b = vb AND c > vc))``.
+    The leading ``a >= va`` repeats what the OR-chain implies, but unlike
+    the chain it is a range the database can seek to on an index on ``a``.
+    """
+    condition = None
+    prefix = Q()
+    for (name, descending, field), value in zip(columns, values):
+        after = _after(name, descending, field.null, value)
+        if after is not None:
+            condition = prefix & after if condition is None else condition | (prefix & after)
+        prefix &= _equal(name, value)
+    if condition is None:
+        return Q(pk__in=[])
+    name, descending, field = columns[0]
+    if values[0] is not None:
+        bound = Q(**{f"{name}__{'lte' if descending else 'gte'}": values[0]})
+        if field.null:
+            bound |= Q(**{f"{name}__isnull": True})
+        condition = bound & condition
+    return condition
+
+
+def _order_expressions(columns):
+    expressions = []
+    for name, descending, field in columns:
+        expression = F(name)
+        nulls = {"nulls_last": True} if field.null else {}
+        expressions.append(expression.desc(**nulls) if descending else expression.asc(**nulls))
+    return expressions
+
+
+def paginate(queryset, ordering, cursor=None, per_page=DEFAULT_PER_PAGE):
+    """
+    Return the :class:`KeysetPage` of ``queryset`` starting after ``cursor``.
+
+    ``ordering`` is a sequence of field names, prefixed with ``-`` for
+    descending order, ending with a unique field. Raises ``InvalidCursor``
+    if ``cursor`` was not produced for the same ordering.
+    """
+    columns = _columns(queryset.model, ordering)
+    queryset = queryset.order_by(*_order_expressions(columns))
+    if cursor:
+        queryset = queryset.filter(keyset_filter(columns, decode_cursor(cursor, columns)))
+
+    rows = list(queryset[: per_page + 1])
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor(
+            [
+                field.value_to_string(last) if getattr(last, field.attname) is not None else None
+                for _, _, field in columns
+            ]
+        )
+    return KeysetPage(rows, next_cursor, is_first=not cursor)
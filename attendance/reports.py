@@ -0,0 +1,220 @@
+"""
+Aggregation helpers for attendance reports and dashboard charts.
+
+Every helper here answers its question with a single grouped query instead of
+issuing one ``count()`` per day, so the cost stays flat as the range grows.
+Chart series are read from the ``DailyAttendanceSummary`` rollup maintained by
+:mod:`attendance.rollups`.
+"""
+
+import calendar
+from datetime import date, timedelta
+
+from django.db.models import Avg, Count, F, IntegerField, Q, Subquery, Sum
+from django.db.models.functions import TruncMonth, TruncWeek, TruncYear
+
+from .models import DailyAttendanceSummary
+
+# Longest range (in days) the chart endpoint will aggregate.
+MAX_CHART_DAYS = 366 * 5
+
+BUCKET_DAY = "day"
+BUCKET_WEEK = "week"
+BUCKET_MONTH = "month"
+BUCKET_YEAR = "year"
+BUCKETS = (BUCKET_DAY, BUCKET_WEEK, BUCKET_MONTH)
+
+_TRUNCATE = {BUCKET_WEEK: TruncWeek, BUCKET_MONTH: TruncMonth, BUCKET_YEAR: TruncYear}
+
+# Groupings accepted by :func:`worked_totals`, by their request parameter.
+GROUP_USER = "user"
+GROUP_DEPARTMENT = "user__department"
+GROUPS = {"user": GROUP_USER, "department": GROUP_DEPARTMENT}
+
+# Periods accepted by :func:`worked_totals`.
+PERIODS = (BUCKET_WEEK, BUCKET_MONTH, BUCKET_YEAR)
+
+
+class SubqueryCount(Subquery):
+    """
+    Scalar subquery counting the rows of ``queryset``.
+
+    Lets counts from other tables ride along as annotations on a single
+    query. Use ``.values(column).distinct()`` to count distinct values.
+    """
+
+    template = "(SELECT COUNT(*) FROM (%(subquery)s) _count)"
+    output_field = IntegerField()
+
+    def __init__(self, queryset, **extra):
+        # Default ordering columns would otherwise leak into DISTINCT
+        super().__init__(queryset.order_by(), **extra)
+
+
+def late_q():
+    """
+    Filter matching late arrivals.
+
+    Lateness is judged against the department's shift when the sign-in is
+    written (see :mod:`attendance.shifts`), so this is an indexed equality.
+    """
+    return Q(is_late=True)
+
+
+def on_time_q():
+    """Filter matching attendance records signed in on time."""
+    return Q(sign_in__isnull=False, is_late=False)
+
+
+def worked_totals(attendances, group=None, period=None):
+    """
+    Total and average worked time of ``attendances`` in one grouped query.
+
+    ``group`` is None (one row overall), ``GROUP_USER`` or
+    ``GROUP_DEPARTMENT``; ``period`` is None or one of ``BUCKET_WEEK``,
+    ``BUCKET_MONTH`` and ``BUCKET_YEAR``. Returns a values queryset whose
+    rows hold the grouping columns (``period`` is the first day of the
+    period) plus ``days``, ``total_seconds`` and ``average_seconds``; with
+    neither, a single dict of those totals. Only records that have been
+    signed out are counted.
+    """
+    attendances = attendances.filter(worked_seconds__isnull=False)
+    totals = {
+        "days": Count("id"),
+        "total_seconds": Sum("worked_seconds"),
+        "average_seconds": Avg("worked_seconds"),
+    }
+    columns = [group] if group else []
+    if period:
+        attendances = attendances.annotate(period=_TRUNCATE[period]("date"))
+        columns.append("period")
+    if not columns:
+        return attendances.aggregate(**totals)
+    return attendances.values(*columns).annotate(**totals).order_by(*columns)
+
+
+def add_months(day, months):
+    """Return ``day`` shifted by ``months`` months, clamped to the month's end."""
+    month_index = day.month - 1 + months
+    year = day.year + month_index // 12
+    month = month_index % 12 + 1
+    last_day = calendar.monthrange(year, month)[1]
+    return date(year, month, min(day.day, last_day))
+
+
+def preset_range(name, today):
+    """
+    Return the ``(start, end)`` dates for a named chart range.
+
+    Unknown names fall back to the last seven days.
+    """
+    if name == "last_week":
+        end = today - timedelta(days=7)
+        return end - timedelta(days=6), end
+    if name == "this_month":
+        return today.replace(day=1), today
+    if name == "last_month":
+        end = today.replace(day=1) - timedelta(days=1)
+        return end.replace(day=1), end
+    if name == "this_quarter":
+        first_month = 3 * ((today.month - 1) // 3) + 1
+        return date(today.year, first_month, 1), today
+    if name == "last_quarter":
+        first_month = 3 * ((today.month - 1) // 3) + 1
+        end = date(today.year, first_month, 1) - timedelta(days=1)
+        return add_months(end.replace(day=1), -2), end
+    if name == "this_year":
+        return date(today.year, 1, 1), today
+    if name == "last_year":
+        return date(today.year - 1, 1, 1), date(today.year - 1, 12, 31)
+    # Default: this_week (last 7 days)
+    return today - timedelta(days=6), today
+
+
+def choose_bucket(start, end):
+    """Pick a bucket size that keeps the chart at a readable number of points."""
+    days = (end - start).days + 1
+    if days <= 31:
+        return BUCKET_DAY
+    if days <= 183:
+        return BUCKET_WEEK
+    return BUCKET_MONTH
+
+
+def bucket_start(day, bucket):
+    """Return the first day of the bucket containing ``day``."""
+    if bucket == BUCKET_WEEK:
+        return day - timedelta(days=day.weekday())
+    if bucket == BUCKET_MONTH:
+        return day.replace(day=1)
+    return day
+
+
+def iter_buckets(start, end, bucket):
+    """Yield the start date of every bucket overlapping ``start``..``end``."""
+    current = bucket_start(start, bucket)
+    while current <= end:
+        yield current
+        if bucket == BUCKET_WEEK:
+            current += timedelta(days=7)
+        elif bucket == BUCKET_MONTH:
+            current = add_months(current, 1)
+        else:
+            current += timedelta(days=1)
+
+
+def bucket_label(day, bucket, span_days):
+    """Human readable label for a bucket starting on ``day``."""
+    if bucket == BUCKET_MONTH:
+        return day.strftime("%b %Y")
+    if bucket == BUCKET_WEEK:
+        return day.strftime("Week of %b %d, %Y")
+    if span_days <= 7:
+        return day.strftime("%a, %b %d")
+    return day.strftime("%b %d")
+
+
+def attendance_chart_series(start, end, bucket=None, department=None):
+    """
+    Count late, on-time and total sign-ins per bucket between two dates.
+
+    Counts are read from the daily summary rollup (one row per day), summed
+    per bucket by a single grouped query; buckets without any records are
+    filled with zeros. ``department`` restricts the series to one department.
+
+    Returns a dict with ``labels``, ``late_data``, ``on_time_data``,
+    ``total_data`` and the ``bucket`` that was used.
+    """
+    bucket = bucket or choose_bucket(start, end)
+
+    qs = DailyAttendanceSummary.objects.filter(
+        date__gte=start, date__lte=end, department=department
+    )
+    if bucket in _TRUNCATE:
+        qs = qs.annotate(bucket=_TRUNCATE[bucket]("date"))
+    else:
+        qs = qs.annotate(bucket=F("date"))
+
+    rows = (
+        qs.values("bucket")
+        .annotate(total=Sum("signed_in"), late=Sum("late"), on_time=Sum("on_time"))
+        .order_by()
+    )
+    counts = {row["bucket"]: row for row in rows}
+
+    span_days = (end - start).days + 1
+    labels, late_data, on_time_data, total_data = [], [], [], []
+    for day in iter_buckets(start, end, bucket):
+        row = counts.get(day, {})
+        labels.append(bucket_label(day, bucket, span_days))
+        late_data.append(row.get("late") or 0)
+        on_time_data.append(row.get("on_time") or 0)
+        total_data.append(row.get("total") or 0)
+
+    return {
+        "labels": labels,
+        "late_data": late_data,
+        "on_time_data": on_time_data,
+        "total_data": total_data,
+        "bucket": bucket,
+    }
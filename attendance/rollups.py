@@ -0,0 +1,128 @@
+"""
+Maintenance of the ``DailyAttendanceSummary`` rollup table.
+
+Sign-in and sign-out views call :func:`record_sign_in` / :func:`record_sign_out`
+inside the same transaction as the attendance write, so the counters never
+drift from the underlying records. :func:`rebuild_summaries` recomputes the
+table from scratch for a date range.
+"""
+
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import Attendance, DailyAttendanceSummary
+from .reports import late_q, on_time_q
+
+COUNTER_FIELDS = ("signed_in", "late", "on_time", "signed_out", "total_worked_seconds")
+
+
+def _bump(date, department_id, deltas):
+    """Atomically add ``deltas`` to the summary row for ``date``/``department_id``."""
+    updates = {field: F(field) + value for field, value in deltas.items()}
+    updates["updated_at"] = timezone.now()
+    rows = DailyAttendanceSummary.objects.filter(date=date, department_id=department_id)
+    if rows.update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            DailyAttendanceSummary.objects.create(
+                date=date, department_id=department_id, **deltas
+            )
+    except IntegrityError:
+        # Another request created the row in the meantime
+        rows.update(**updates)
+
+
+def _apply(date, department_id, deltas):
+    """Apply ``deltas`` to the organisation-wide row and the department row."""
+    with transaction.atomic():
+        _bump(date, None, deltas)
+        if department_id:
+            _bump(date, department_id, deltas)
+
+
+def record_sign_in(attendance, department_id):
+    """
+    Count a sign-in that was just written to ``attendance``.
+
+    ``department_id`` is the department of the attendance's user; callers
+    pass it so that no user lookup is needed here.
+    """
+    late = attendance.is_late
+    _apply(
+        attendance.date,
+        department_id,
+        {"signed_in": 1, "late": int(late), "on_time": int(not late)},
+    )
+
+
+def record_sign_out(attendance, department_id):
+    """Count a sign-out that was just written to ``attendance``."""
+    _apply(
+        attendance.date,
+        department_id,
+        {"signed_out": 1, "total_worked_seconds": attendance.worked_seconds or 0},
+    )
+
+
+def rebuild_summaries(
+    start=None,
+    end=None,
+    attendance_model=Attendance,
+    summary_model=DailyAttendanceSummary,
+):
+    """
+    Recompute summary rows from the attendance table.
+
+    Existing rows in the range are replaced. Returns the number of summary
+    rows written. Migrations pass their historical ``attendance_model`` and
+    ``summary_model``.
+    """
+    attendances = attendance_model.objects.all()
+    summaries = summary_model.objects.all()
+    if start:
+        attendances = attendances.filter(date__gte=start)
+        summaries = summaries.filter(date__gte=start)
+    if end:
+        attendances = attendances.filter(date__lte=end)
+        summaries = summaries.filter(date__lte=end)
+
+    rows = (
+        attendances.values("date", "user__department")
+        .annotate(
+            signed_in=Count("id", filter=Q(sign_in__isnull=False)),
+            late=Count("id", filter=late_q()),
+            on_time=Count("id", filter=on_time_q()),
+            signed_out=Count("id", filter=Q(sign_out__isnull=False)),
+            worked=Sum("worked_seconds"),
+        )
+        .order_by()
+    )
+
+    totals = defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS, 0))
+    for row in rows:
+        counters = {
+            "signed_in": row["signed_in"],
+            "late": row["late"],
+            "on_time": row["on_time"],
+            "signed_out": row["signed_out"],
+            "total_worked_seconds": row["worked"] or 0,
+        }
+        keys = [(row["date"], None)]
+        if row["user__department"]:
+            keys.append((row["date"], row["user__department"]))
+        for key in keys:
+            for field, value in counters.items():
+                totals[key][field] += value
+
+    objs = [
+        summary_model(date=date, department_id=department_id, **counters)
+        for (date, department_id), counters in totals.items()
+    ]
+    with transaction.atomic():
+        summaries.delete()
+        summary_model.objects.bulk_create(objs, batch_size=500)
+    return len(objs)
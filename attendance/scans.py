@@ -0,0 +1,382 @@
+"""
+Applying barcode scans to attendance records.
+
+A scan signs its owner in if they have not signed in on the scan's day, and
+out if they have signed in but not out. :func:`apply_scan` handles one scan
+timed by the server (``barcode_authenticate``). :func:`apply_batch` handles
+a batch of scans queued by an offline-capable kiosk. Each of those scans
+carries the time the kiosk captured it and an identifier that makes
+resubmitting it harmless.
+
+All writes go through :func:`write_sign_in` / :func:`write_sign_out`, which
+the ``sign_in_out`` view uses as well. Each is a single conditional
+statement, so retried or concurrent requests cannot sign someone in twice
+or overwrite each other's columns. :func:`run_once` makes a request
+idempotent by storing its result under a client-supplied key, scoped to the
+badge holder by :func:`receipt_key` so that one badge can never be answered
+with another's result.
+"""
+
+from datetime import datetime, timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import geocoding, geofences, locations, rollups, shifts, status_cache
+from .barcode_cache import cache as barcode_cache
+from .models import Attendance, ScanReceipt
+
+# Longest scan id a kiosk may send; receipt keys add the holder's scope.
+MAX_KEY_LENGTH = 64
+
+# Most scans accepted in one batch request.
+MAX_BATCH_SIZE = 500
+
+# A second scan of the same badge this soon after the last one is ignored,
+# so a double tap does not sign someone straight back out.
+MIN_SCAN_INTERVAL = timedelta(seconds=60)
+
+# Queued scans older than this are rejected rather than rewriting history;
+# a kiosk that was offline longer has its late scans entered by an admin.
+MAX_SCAN_AGE = timedelta(hours=12)
+
+# Kiosk clocks running up to this far ahead of the server are tolerated.
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+
+def _rejected(message, status="rejected"):
+    return {"success": False, "status": status, "message": message}
+
+
+def check_badge(badge):
+    """Return a rejection result if ``badge`` may not scan, else None."""
+    if badge is None:
+        return _rejected("Invalid barcode")
+    if not badge.is_active:
+        return _rejected("Staff account is inactive")
+    return None
+
+
+# Marker for "the day's attendance row has not been loaded yet".
+_UNLOADED = object()
+
+
+def load_day(user_id, day):
+    """Return the attendance row of ``user_id`` for ``day``, or None."""
+    return (
+        Attendance.objects.filter(user_id=user_id, date=day)
+        .only("id", "user_id", "date", "sign_in", "sign_out")
+        .first()
+    )
+
+
+def write_sign_in(
+    user_id, day, when, shift, location="", attendance=_UNLOADED, coordinates=None
+):
+    """
+    Record a sign-in at ``when`` unless the user already signed in on ``day``.
+
+    The daily row is inserted if it does not exist (a concurrent insert is
+    caught by the unique constraint inside a savepoint); an existing row is
+    updated only where ``sign_in`` is still NULL, so two racing requests
+    cannot both sign in and neither overwrites the other's columns.
+    ``attendance`` is the row if the caller has already loaded it (None
+    when known to be missing). Lateness against ``shift`` (an
+    ``attendance.shifts.Shift``) is stored with the sign-in. The
+    ``location`` text is stored as a reference to its deduplicated
+    ``Location`` row (see ``attendance.locations``). With ``coordinates``
+    (``geocoding.Coordinates``), they are stored with the office site they
+    fall in (see ``attendance.geofences``), and the location is replaced by
+    the address once resolved (see ``attendance.geocoding``). Returns the
+    updated row, or None if the user had already signed in.
+    """
+    is_late, minutes_late = shifts.lateness(when, shift)
+    location_id = locations.location_id(location)
+    position = {}
+    if coordinates:
+        position = geofences.tag(coordinates)
+    if attendance is _UNLOADED or attendance is None:
+        try:
+            with transaction.atomic():
+                attendance = Attendance.objects.create(
+                    user_id=user_id,
+                    date=day,
+                    sign_in=when,
+                    location_id=location_id,
+                    is_late=is_late,
+                    minutes_late=minutes_late,
+                    **position,
+                )
+            if coordinates:
+                geocoding.fill_later(attendance.pk, coordinates, location_id)
+            return attendance
+        except IntegrityError:
+            attendance = load_day(user_id, day)
+    if attendance.sign_in:
+        return None
+
+    now = timezone.now()
+    changes = {
+        "sign_in": when,
+        "is_late": is_late,
+        "minutes_late": minutes_late,
+        "updated_at": now,
+        **position,
+    }
+    if location_id:
+        changes["location_id"] = location_id
+    if not Attendance.objects.filter(pk=attendance.pk, sign_in__isnull=True).update(
+        **changes
+    ):
+        return None
+    for field, value in changes.items():
+        setattr(attendance, field, value)
+    status_cache.remember(attendance)
+    if coordinates:
+        geocoding.fill_later(attendance.pk, coordinates, location_id)
+    return attendance
+
+
+def write_sign_out(attendance, when):
+    """
+    Record a sign-out at ``when`` on ``attendance`` if it is still open.
+
+    Only ``sign_out`` and the resulting ``worked_seconds`` are written, and
+    only where ``sign_out`` is NULL. Returns True if this call signed the
+    user out.
+    """
+    now = timezone.now()
+    worked = max(int((when - attendance.sign_in).total_seconds()), 0)
+    if not Attendance.objects.filter(
+        pk=attendance.pk, sign_in__isnull=False, sign_out__isnull=True
+    ).update(sign_out=when, worked_seconds=worked, updated_at=now):
+        return False
+    attendance.sign_out, attendance.worked_seconds = when, worked
+    attendance.updated_at = now
+    status_cache.remember(attendance)
+    return True
+
+
+def _applied(action, message, when, name):
+    return {
+        "success": True,
+        "status": "applied",
+        "action": action,
+        "message": message,
+        "time": timezone.localtime(when).strftime("%H:%M:%S"),
+        "user": name,
+    }
+
+
+def _apply(badge, scanned_at, location, attendance, coordinates=None):
+    """Apply one scan; returns ``(result, attendance row after the scan)``."""
+    day = timezone.localdate(scanned_at)
+    name = badge.display_name
+    if attendance is _UNLOADED:
+        attendance = load_day(badge.user_id, day)
+
+    last = attendance and (attendance.sign_out or attendance.sign_in)
+    if last and timedelta(0) <= scanned_at - last < MIN_SCAN_INTERVAL:
+        return _rejected(f"{name} was already scanned just now.", "duplicate"), attendance
+
+    if attendance is None or not attendance.sign_in:
+        signed_in = write_sign_in(
+            badge.user_id,
+            day,
+            scanned_at,
+            badge.shift,
+            location,
+            attendance,
+            coordinates,
+        )
+        if signed_in is None:
+            # Signed in by a concurrent request since the row was read
+            return (
+                _rejected(f"{name} was already scanned just now.", "duplicate"),
+                load_day(badge.user_id, day),
+            )
+        rollups.record_sign_in(signed_in, badge.department_id)
+        message = f"Welcome {name}! You signed in successfully."
+        return _applied("sign_in", message, scanned_at, name), signed_in
+
+    if attendance.sign_out:
+        return _rejected("You have already completed sign in/out for today."), attendance
+    if scanned_at < attendance.sign_in:
+        return _rejected(f"{name}'s scan is earlier than their sign in."), attendance
+    if not write_sign_out(attendance, scanned_at):
+        return _rejected(f"{name} was already scanned just now.", "duplicate"), attendance
+    rollups.record_sign_out(attendance, badge.department_id)
+    message = f"Goodbye {name}! You signed out successfully."
+    return _applied("sign_out", message, scanned_at, name), attendance
+
+
+def apply_scan(
+    badge, scanned_at, location="", attendance=_UNLOADED, coordinates=None
+):
+    """
+    Sign the holder of ``badge`` (a ``barcode_cache.Badge``) in or out as
+    of ``scanned_at``.
+
+    ``attendance`` may be passed when the row for the scan's day has already
+    been loaded (None if there is none). ``coordinates`` are the scanner's
+    ``(lat, lon)``, if known. Returns a JSON-serialisable result dict with
+    ``success``, ``action`` and ``message``.
+    """
+    # Joins the caller's transaction when there is one (a batch is applied
+    # or rolled back as a whole)
+    with transaction.atomic(savepoint=False):
+        return _apply(badge, scanned_at, location, attendance, coordinates)[0]
+
+
+def receipt_key(user_id, client_id):
+    """Idempotency key of kiosk scan ``client_id`` by the holder ``user_id``."""
+    return f"kiosk:{user_id if user_id is not None else 'unknown'}:{client_id}"
+
+
+def run_once(key, user_id, scanned_at, apply):
+    """
+    Run ``apply()`` at most once per idempotency ``key``.
+
+    The result is stored in a ``ScanReceipt`` in the same transaction as the
+    write, so a retried request gets the original result back (with
+    ``duplicate`` set) instead of being applied again. Without a key,
+    ``apply()`` simply runs.
+    """
+    if not key:
+        return apply()
+    receipt = ScanReceipt.objects.filter(key=key).only("result").first()
+    if receipt is not None:
+        return {**receipt.result, "duplicate": True}
+    try:
+        with transaction.atomic():
+            result = apply()
+            ScanReceipt.objects.create(
+                key=key, user_id=user_id, scanned_at=scanned_at, result=result
+            )
+    except IntegrityError:
+        # A concurrent retry with the same key committed first; its write
+        # stands and ours was rolled back
+        receipt = ScanReceipt.objects.filter(key=key).only("result").first()
+        if receipt is None:
+            raise
+        return {**receipt.result, "duplicate": True}
+    return result
+
+
+def parse_scan_time(value, now):
+    """
+    Parse a kiosk capture time (ISO 8601 string or epoch milliseconds).
+
+    Raises ``ValueError`` if the value is malformed, too old, or further in
+    the future than the tolerated clock skew.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        scanned_at = datetime.fromtimestamp(
+            value / 1000, tz=timezone.get_current_timezone()
+        )
+    elif isinstance(value, str) and value:
+        scanned_at = parse_datetime(value)
+        if scanned_at is None:
+            raise ValueError("scanned_at is not a valid timestamp")
+        if timezone.is_naive(scanned_at):
+            scanned_at = timezone.make_aware(scanned_at)
+    else:
+        raise ValueError("scanned_at is required")
+
+    if scanned_at > now + MAX_CLOCK_SKEW:
+        raise ValueError("scanned_at is in the future")
+    if scanned_at < now - MAX_SCAN_AGE:
+        raise ValueError("scanned_at is too old")
+    return min(scanned_at, now)
+
+
+def apply_batch(scans, device=""):
+    """
+    Apply a batch of kiosk scans in one transaction, oldest first.
+
+    Each scan is a dict with ``id`` (client-generated, unique per scan),
+    ``barcode``, ``scanned_at`` and optionally ``lat``/``lon``/``accuracy``
+    or a ``location`` text. Scans whose ``id`` was seen before for the same
+    badge return their original result with ``duplicate`` set. ``device`` names the authenticated kiosk (``kiosks.device``) and is
+    stored on each receipt. Returns one result per scan, in the order
+    submitted.
+    """
+    now = timezone.now()
+    results = [None] * len(scans)
+    pending = []
+    for index, scan in enumerate(scans):
+        key = str(scan.get("id") or "").strip() if isinstance(scan, dict) else ""
+        if not key or len(key) > MAX_KEY_LENGTH:
+            results[index] = _rejected("Scan id is missing or invalid", "invalid")
+            continue
+        try:
+            scanned_at = parse_scan_time(scan.get("scanned_at"), now)
+        except ValueError as e:
+            results[index] = {"id": key, **_rejected(str(e), "invalid")}
+            continue
+        barcode = str(scan.get("barcode") or "").strip()
+        location = str(scan.get("location") or "").strip()[:500]
+        coordinates = geocoding.parse_coordinates(
+            scan.get("lat"), scan.get("lon"), scan.get("accuracy")
+        )
+        pending.append((scanned_at, index, key, barcode, location, coordinates))
+
+    with transaction.atomic():
+        badges = barcode_cache.resolve_many(
+            {barcode for _, _, _, barcode, *_ in pending if barcode}
+        )
+
+        def scoped(key, barcode):
+            badge = badges.get(barcode)
+            return receipt_key(badge.user_id if badge else None, key)
+
+        receipts = ScanReceipt.objects.in_bulk(
+            [scoped(key, barcode) for _, _, key, barcode, *_ in pending],
+            field_name="key",
+        )
+        # Load every existing row the batch touches in one query; missing
+        # rows are inserted by the scans themselves
+        wanted = {
+            (badge.user_id, timezone.localdate(scanned_at))
+            for scanned_at, _, _, barcode, *_ in pending
+            if (badge := badges.get(barcode)) and badge.is_active
+        }
+        attendances = dict.fromkeys(wanted)
+        attendances.update(
+            ((att.user_id, att.date), att)
+            for att in Attendance.objects.filter(
+                user_id__in={user_id for user_id, _ in wanted},
+                date__in={day for _, day in wanted},
+            ).only("id", "user_id", "date", "sign_in", "sign_out")
+        )
+
+        new_receipts = {}
+        for scanned_at, index, key, barcode, location, coordinates in sorted(
+            pending, key=lambda scan: scan[:2]
+        ):
+            scoped_key = scoped(key, barcode)
+            receipt = receipts.get(scoped_key) or new_receipts.get(scoped_key)
+            if receipt is not None:
+                results[index] = {"id": key, **receipt.result, "duplicate": True}
+                continue
+
+            badge = badges.get(barcode)
+            result = check_badge(badge)
+            if result is None:
+                day_key = (badge.user_id, timezone.localdate(scanned_at))
+                result, attendances[day_key] = _apply(
+                    badge, scanned_at, location, attendances[day_key], coordinates
+                )
+
+            new_receipts[scoped_key] = ScanReceipt(
+                key=scoped_key,
+                user_id=badge.user_id if badge else None,
+                scanned_at=scanned_at,
+                device=device,
+                result=result,
+            )
+            results[index] = {"id": key, **result}
+
+        ScanReceipt.objects.bulk_create(new_receipts.values())
+    return results
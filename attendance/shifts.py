@@ -0,0 +1,115 @@
+"""
+Judging sign-ins against department shift schedules.
+
+Whether a sign-in was late is decided once, when it is written, and stored
+on the attendance record (``is_late`` / ``minutes_late``), so late-arrival
+queries are plain indexed filters instead of a per-row conversion of
+``sign_in`` to local time. :func:`reevaluate` recomputes the stored values
+after a schedule changes.
+"""
+
+import math
+from collections import namedtuple
+from datetime import datetime, time
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Attendance, ShiftSchedule
+
+Shift = namedtuple("Shift", "start_time grace_minutes working_days")
+
+# Applies to users whose department has no schedule: late after 09:00 on any day.
+DEFAULT_SHIFT = Shift(time(9, 0), 0, "1234567")
+
+# Attendance rows read and updated per round trip by :func:`reevaluate`.
+BATCH_SIZE = 2000
+
+# Lookups of a user's schedule fields, relative to the user.
+USER_SHIFT_FIELDS = (
+    "department__shift_schedule__start_time",
+    "department__shift_schedule__grace_minutes",
+    "department__shift_schedule__working_days",
+)
+
+
+def shift_of(start_time, grace_minutes, working_days):
+    """Build a :class:`Shift` from schedule columns, which are None without a schedule."""
+    if start_time is None:
+        return DEFAULT_SHIFT
+    return Shift(start_time, grace_minutes, working_days)
+
+
+def for_department(department_id):
+    """Return the :class:`Shift` of ``department_id`` (may be None)."""
+    schedule = (
+        ShiftSchedule.objects.filter(department_id=department_id)
+        .values_list("start_time", "grace_minutes", "working_days")
+        .first()
+        if department_id
+        else None
+    )
+    return shift_of(*schedule) if schedule else DEFAULT_SHIFT
+
+
+def lateness(sign_in, shift, tz=None):
+    """
+    Return ``(is_late, minutes_late)`` for a sign-in at ``sign_in``.
+
+    Minutes are counted from the start of the shift, rounded up; sign-ins on
+    days outside the shift's working days are never late.
+    """
+    if not sign_in:
+        return False, 0
+    local = sign_in.astimezone(tz or timezone.get_current_timezone())
+    if str(local.isoweekday()) not in shift.working_days:
+        return False, 0
+    start = datetime.combine(local.date(), shift.start_time, tzinfo=local.tzinfo)
+    late_by = (local - start).total_seconds()
+    if late_by <= shift.grace_minutes * 60:
+        return False, 0
+    return True, math.ceil(late_by / 60)
+
+
+def reevaluate(start=None, end=None, department_id=None):
+    """
+    Recompute ``is_late``/``minutes_late`` for signed-in attendance records.
+
+    Records are read in primary-key batches with their user's schedule joined
+    in, and only rows whose values change are written. Returns the number of
+    records updated; callers should rebuild the daily summaries afterwards.
+    """
+    records = Attendance.objects.filter(sign_in__isnull=False)
+    if start:
+        records = records.filter(date__gte=start)
+    if end:
+        records = records.filter(date__lte=end)
+    if department_id:
+        records = records.filter(user__department_id=department_id)
+    fields = ("pk", "sign_in", "is_late", "minutes_late") + tuple(
+        f"user__{field}" for field in USER_SHIFT_FIELDS
+    )
+
+    tz = timezone.get_current_timezone()
+    updated = 0
+    last_pk = 0
+    while True:
+        batch = list(
+            records.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list(*fields)[:BATCH_SIZE]
+        )
+        if not batch:
+            return updated
+        last_pk = batch[-1][0]
+        changed = []
+        for pk, sign_in, is_late, minutes_late, *schedule in batch:
+            values = lateness(sign_in, shift_of(*schedule), tz)
+            if values != (is_late, minutes_late):
+                changed.append(
+                    Attendance(pk=pk, is_late=values[0], minutes_late=values[1])
+                )
+        if changed:
+            with transaction.atomic():
+                Attendance.objects.bulk_update(changed, ["is_late", "minutes_late"])
+            updated += len(changed)
@@ -1,7 +1,9 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from .models import Staff
+from .models import Attendance, Department, OfficeSite, ShiftSchedule, Staff
+from . import barcode_cache, geofences, status_cache, user_directory
 
 User = get_user_model()
 
@@ -29,3 +31,65 @@ def create_staff_profile(sender, instance, created, **kwargs):
             import logging
             logger = logging.getLogger(__name__)
             logger.error(f"Error creating Staff profile for {instance.username}: {str(e)}")
+
+
+@receiver(post_save, sender=Attendance)
+def cache_attendance_status(sender, instance, **kwargs):
+    """Keep the cached sign-in status in step with the saved record."""
+    status_cache.remember(instance)
+
+
+@receiver(post_delete, sender=Attendance)
+def forget_attendance_status(sender, instance, **kwargs):
+    if instance.user_id and instance.date:
+        status_cache.forget(instance.user_id, instance.date)
+
+
+@receiver(post_save, sender=Staff)
+@receiver(post_delete, sender=Staff)
+def forget_staff_badge(sender, instance, **kwargs):
+    """Drop the cached badge (old and new barcode) once the change commits."""
+    barcode, user_id = instance.barcode, instance.user_id
+
+    def forget():
+        barcode_cache.cache.invalidate_barcode(barcode)
+        barcode_cache.cache.invalidate_user(user_id)
+
+    transaction.on_commit(forget)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user_badge(sender, instance, **kwargs):
+    """Names, department and status shown at the kiosk come from the user."""
+    user_id = instance.pk
+    transaction.on_commit(lambda: barcode_cache.cache.invalidate_user(user_id))
+
+
+@receiver(post_save, sender=ShiftSchedule)
+@receiver(post_delete, sender=ShiftSchedule)
+def forget_shift_badges(sender, instance, **kwargs):
+    """Cached badges carry their department's shift; schedules change rarely."""
+    transaction.on_commit(barcode_cache.cache.clear)
+
+
+@receiver(post_save, sender=OfficeSite)
+@receiver(post_delete, sender=OfficeSite)
+def forget_geofences(sender, instance, **kwargs):
+    """Reload this process's geofence index once the change commits."""
+    transaction.on_commit(geofences.index.clear)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Staff)
+@receiver(post_delete, sender=Staff)
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+def bump_user_directory(sender, instance, update_fields=None, **kwargs):
+    """The picker lists show users, their staff status and department names."""
+    if sender is User and update_fields and not (
+        set(update_fields) & user_directory.USER_FIELDS
+    ):
+        return
+    transaction.on_commit(user_directory.bump)
@@ -0,0 +1,77 @@
+"""
+Per-user, per-day attendance status cache.
+
+The ``attendance_status`` context processor needs to know on every page
+whether the user has signed in or out today. The answer is kept in Django's
+cache under a key that includes the date, so yesterday's entries simply stop
+being read. Writes to ``Attendance`` refresh the entry once their
+transaction commits (see ``attendance.signals``); code that changes records
+with ``QuerySet.update()`` must call :func:`remember` or :func:`forget`
+itself.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Attendance
+
+NOT_STARTED = "none"
+SIGNED_IN = "in"
+SIGNED_OUT = "out"
+
+
+def _key(user_id, day):
+    return f"attendance-status:{user_id}:{day.isoformat()}"
+
+
+def _timeout():
+    return getattr(settings, "ATTENDANCE_STATUS_CACHE_TIMEOUT", 60)
+
+
+def state_of(attendance):
+    """Return the status constant describing ``attendance`` (or no record)."""
+    if attendance is None:
+        return NOT_STARTED
+    if attendance.sign_out:
+        return SIGNED_OUT
+    if attendance.sign_in:
+        return SIGNED_IN
+    return NOT_STARTED
+
+
+def get_status(user_id, day=None):
+    """Return the user's status for ``day`` (default today), querying on a miss."""
+    day = day or timezone.localdate()
+    key = _key(user_id, day)
+    state = cache.get(key)
+    if state is None:
+        attendance = (
+            Attendance.objects.filter(user_id=user_id, date=day)
+            .only("sign_in", "sign_out")
+            .first()
+        )
+        state = state_of(attendance)
+        cache.set(key, state, _timeout())
+    return state
+
+
+def prime(user_id, day, sign_in, sign_out):
+    """Cache a status read as part of another query, if none is cached."""
+    state = SIGNED_OUT if sign_out else SIGNED_IN if sign_in else NOT_STARTED
+    cache.add(_key(user_id, day), state, _timeout())
+
+
+def remember(attendance):
+    """Store the status of ``attendance`` once the current transaction commits."""
+    if not attendance.user_id or not attendance.date:
+        return
+    key, state = _key(attendance.user_id, attendance.date), state_of(attendance)
+    transaction.on_commit(lambda: cache.set(key, state, _timeout()))
+
+
+def forget(user_id, day):
+    """Drop the cached status so the next read queries the database."""
+    key = _key(user_id, day)
+    transaction.on_commit(lambda: cache.delete(key))
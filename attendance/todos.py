@@ -0,0 +1,468 @@
+"""
+Delta sync of users' todo lists.
+
+The dashboard used to fetch and re-render a user's whole todo history on
+every load and after every change. Now the first request returns a
+*snapshot*: all open items, the newest ``TODO_DONE_LIMIT`` done ones (older
+ones are paged in on demand) and a cursor. Later requests send
+``since=<cursor>`` and get a *delta*: only the items whose ``updated_at`` is
+after it, plus the ids of items deleted since (``TodoTombstone`` rows).
+
+The cursor is the time of the user's latest change, which also forms the
+response's ETag, so a refresh when nothing changed is a 304 that costs two
+indexed ``MAX()`` queries. Deletions must go through :func:`delete` so that
+they leave tombstones; ``QuerySet.update()`` must set ``updated_at``.
+
+Open items are ordered by ``position`` within their column. Positions are
+spaced ``POSITION_GAP`` apart, so an item moved between two others takes a
+position between theirs and is the only row written; a column is respaced
+only when two neighbours have run out of room. :func:`apply_batch` applies
+a list of create/move/delete operations (a drag across columns, clearing
+the done column) in one transaction with bulk statements.
+"""
+
+import hashlib
+from datetime import timedelta
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import pagination
+from .models import TodoItem, TodoTombstone
+
+STATUSES = ("TODO", "ONGOING", "DONE")
+
+DEFAULT_DONE_LIMIT = 50
+
+DEFAULT_TOMBSTONE_DAYS = 30
+
+# Largest page of archived DONE items a client may ask for.
+MAX_DONE_LIMIT = 500
+
+POSITION_GAP = 1024
+
+# Most operations accepted in one apply_batch() call.
+MAX_BATCH_OPERATIONS = 200
+
+DONE_ORDERING = ("-completed_at", "-id")
+
+_TIMESTAMP = "%Y-%m-%d %H:%M:%S"
+
+
+def done_limit():
+    return getattr(settings, "TODO_DONE_LIMIT", DEFAULT_DONE_LIMIT)
+
+
+def tombstone_days():
+    return getattr(settings, "TODO_TOMBSTONE_DAYS", DEFAULT_TOMBSTONE_DAYS)
+
+
+def serialize(todo):
+    return {
+        "id": todo.id,
+        "title": todo.title,
+        "description": todo.description,
+        "status": todo.status,
+        "position": todo.position,
+        "created_at": todo.created_at.strftime(_TIMESTAMP),
+        "started_at": todo.started_at.strftime(_TIMESTAMP) if todo.started_at else None,
+        "completed_at": (
+            todo.completed_at.strftime(_TIMESTAMP) if todo.completed_at else None
+        ),
+    }
+
+
+def encode_cursor(value):
+    return value.astimezone(dt_timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def parse_cursor(value):
+    """Return the datetime of a ``since`` cursor; raise ``ValueError`` if malformed."""
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None or timezone.is_naive(parsed):
+        raise ValueError("since must be a cursor returned by this API")
+    return parsed
+
+
+def changed_at(user_id):
+    """Time of the user's latest todo change or deletion, or None."""
+    latest = TodoItem.objects.filter(user_id=user_id).aggregate(at=Max("updated_at"))["at"]
+    deleted = TodoTombstone.objects.filter(user_id=user_id).aggregate(
+        at=Max("deleted_at")
+    )["at"]
+    return max(filter(None, (latest, deleted)), default=None)
+
+
+def etag(request):
+    """ETag of a ``get_todos`` response: the latest change plus the query."""
+    if not request.user.is_authenticated:
+        return None
+    latest = changed_at(request.user.pk)
+    query = hashlib.sha1(request.GET.urlencode().encode()).hexdigest()[:12]
+    return f'"todos-{encode_cursor(latest) if latest else "empty"}-{query}"'
+
+
+def _done_total(user_id):
+    return TodoItem.objects.filter(user_id=user_id, status="DONE").count()
+
+
+def snapshot(user_id, limit=None):
+    """
+    The user's open items and newest done items, grouped by status.
+
+    ``done_cursor`` pages older done items through :func:`done_page`.
+    """
+    latest = changed_at(user_id)
+    items = TodoItem.objects.filter(user_id=user_id)
+    todos = {status: [] for status in STATUSES}
+    for todo in items.exclude(status="DONE").order_by("position", "-id"):
+        todos[todo.status].append(serialize(todo))
+    page = done_page(user_id, limit=limit)
+    todos["DONE"] = page["items"]
+    return {
+        "todos": todos,
+        "done_total": _done_total(user_id),
+        "done_cursor": page["cursor"],
+        "cursor": encode_cursor(latest) if latest else None,
+    }
+
+
+def done_page(user_id, cursor=None, limit=None):
+    """One page of done items, most recently completed first."""
+    limit = min(limit or done_limit(), MAX_DONE_LIMIT)
+    page = pagination.paginate(
+        TodoItem.objects.filter(user_id=user_id, status="DONE"),
+        DONE_ORDERING,
+        cursor=cursor,
+        per_page=limit,
+    )
+    return {"items": [serialize(todo) for todo in page], "cursor": page.next_cursor}
+
+
+def delta(user_id, since):
+    """
+    Items changed and ids deleted after ``since``, or None if it is too old.
+
+    Tombstones are only kept for ``TODO_TOMBSTONE_DAYS``, so a client that
+    last synced before then must take a new :func:`snapshot`.
+    """
+    if since < timezone.now() - timedelta(days=tombstone_days()):
+        return None
+    latest = changed_at(user_id)
+    changed = TodoItem.objects.filter(user_id=user_id, updated_at__gt=since).order_by(
+        "updated_at", "id"
+    )
+    deleted = TodoTombstone.objects.filter(
+        user_id=user_id, deleted_at__gt=since
+    ).values_list("todo_id", flat=True)
+    return {
+        "changed": [serialize(todo) for todo in changed],
+        "deleted": sorted(set(deleted)),
+        "done_total": _done_total(user_id),
+        "cursor": encode_cursor(max(latest, since) if latest else since),
+    }
+
+
+def delete(queryset):
+    """
+    Delete the todo items of ``queryset``, leaving a tombstone for each.
+
+    Also prunes the owners' tombstones older than ``TODO_TOMBSTONE_DAYS``.
+    Returns the number of items deleted.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(queryset.values_list("id", "user_id"))
+        if not rows:
+            return 0
+        TodoTombstone.objects.bulk_create(
+            [TodoTombstone(user_id=user_id, todo_id=pk, deleted_at=now) for pk, user_id in rows]
+        )
+        TodoItem.objects.filter(pk__in=[pk for pk, _ in rows]).delete()
+        TodoTombstone.objects.filter(
+            user_id__in={user_id for _, user_id in rows},
+            deleted_at__lt=now - timedelta(days=tombstone_days()),
+        ).delete()
+    return len(rows)
+
+
+def set_status(todo, status, now):
+    """Move ``todo`` to ``status``, stamping when it was started and completed."""
+    if status == "ONGOING" and todo.status == "TODO":
+        todo.started_at = now
+    elif status == "DONE":
+        todo.completed_at = now
+        if not todo.started_at:
+            todo.started_at = now
+    todo.status = status
+
+
+def top_position(user_id, status):
+    """Position that puts an item at the top of one of the user's columns."""
+    lowest = TodoItem.objects.filter(user_id=user_id, status=status).aggregate(
+        position=Min("position")
+    )["position"]
+    return POSITION_GAP if lowest is None else lowest - POSITION_GAP
+
+
+class InvalidOperation(ValueError):
+    """Raised for a batch operation that cannot be applied; nothing is written."""
+
+    def __init__(self, index, message):
+        super().__init__(f"Operation {index}: {message}")
+        self.index = index
+
+
+class _Column:
+    """The order of one status column while a batch is applied."""
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda row: (row[1], -row[0]))
+        self.keys = [key for key, _ in rows]
+        self.positions = dict(rows)
+
+    def index(self, key):
+        return self.keys.index(key) if key in self.positions else None
+
+    def remove(self, key):
+        if key in self.positions:
+            self.keys.remove(key)
+            del self.positions[key]
+
+    def insert(self, index, key):
+        """Insert ``key`` at ``index``; return the keys whose position changed."""
+        above = self.positions[self.keys[index - 1]] if index > 0 else None
+        below = self.positions[self.keys[index]] if index < len(self.keys) else None
+        self.keys.insert(index, key)
+        if above is None and below is None:
+            self.positions[key] = POSITION_GAP
+        elif above is None:
+            self.positions[key] = below - POSITION_GAP
+        elif below is None:
+            self.positions[key] = above + POSITION_GAP
+        elif below - above >= 2:
+            self.positions[key] = (above + below) // 2
+        else:
+            # No room between the neighbours: space the whole column out again
+            for number, other in enumerate(self.keys, 1):
+                self.positions[other] = number * POSITION_GAP
+            return set(self.keys)
+        return {key}
+
+
+def _item_id(index, value, refs):
+    """Key of an existing item id or of a ``ref`` created earlier in the batch."""
+    if isinstance(value, str) and value in refs:
+        return refs[value]
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    raise InvalidOperation(index, f"unknown item {value!r}")
+
+
+def _check(index, operation):
+    """Reject an operation whose fields have the wrong types."""
+    if not isinstance(operation, dict) or operation.get("op") not in (
+        "create",
+        "move",
+        "delete",
+        "clear",
+    ):
+        raise InvalidOperation(index, "op must be create, move, delete or clear")
+    status = operation.get("status")
+    if status is not None and (not isinstance(status, str) or status not in STATUSES):
+        raise InvalidOperation(index, "status must be TODO, ONGOING or DONE")
+    if operation["op"] == "clear" and status is None:
+        raise InvalidOperation(index, "status must be TODO, ONGOING or DONE")
+    for name in ("id", "after", "before"):
+        value = operation.get(name)
+        if value is not None and (
+            isinstance(value, bool) or not isinstance(value, (int, str))
+        ):
+            raise InvalidOperation(index, f"{name} must be an item id or ref")
+    if operation.get("ref") is not None and not isinstance(operation["ref"], str):
+        raise InvalidOperation(index, "ref must be a string")
+
+
+def _status(index, operation, default):
+    status = operation.get("status") or default
+    if status not in STATUSES:
+        raise InvalidOperation(index, "status must be TODO, ONGOING or DONE")
+    return status
+
+
+def apply_batch(user_id, operations):
+    """
+    Apply ``operations`` to the user's todo items in one transaction.
+
+    Each operation is a dict with an ``op`` of:
+
+    - ``create``: ``title``, optional ``description``, ``status`` (default
+      TODO) and ``ref``, a name later operations can use as its id;
+    - ``move``: ``id`` and optionally a new ``status``;
+    - ``delete``: ``id``;
+    - ``clear``: deletes every item with ``status``.
+
+    Created and moved items go to the top of their column, or right below
+    the item ``after`` / above the item ``before`` (ids or refs of items in
+    that column). Operations see the effects of the ones before them. The
+    whole batch is validated before anything is written; an invalid one
+    raises :class:`InvalidOperation`. Returns one result per operation.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise ValueError("operations must be a non-empty list")
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise ValueError(f"At most {MAX_BATCH_OPERATIONS} operations per batch")
+    for index, operation in enumerate(operations):
+        _check(index, operation)
+
+    now = timezone.now()
+    with transaction.atomic():
+        # Items named by id, then the order of every column they or the
+        # batch's creates and moves touch: two queries
+        named = {
+            value
+            for operation in operations
+            for value in (operation.get(name) for name in ("id", "after", "before"))
+            if isinstance(value, int) and not isinstance(value, bool)
+        }
+        items = (
+            TodoItem.objects.select_for_update()
+            .filter(user_id=user_id, pk__in=named)
+            .in_bulk()
+        )
+        touched = {item.status for item in items.values()}
+        touched.update(
+            operation.get("status") or "TODO"
+            for operation in operations
+            if operation["op"] in ("create", "move")
+        )
+        touched &= set(STATUSES)
+        columns = {status: [] for status in touched}
+        for pk, status, position in TodoItem.objects.filter(
+            user_id=user_id, status__in=touched
+        ).values_list("pk", "status", "position"):
+            columns[status].append((pk, position))
+        columns = {status: _Column(rows) for status, rows in columns.items()}
+
+        refs, created, moved, deleted, cleared = {}, {}, set(), set(), set()
+        positioned = set()
+        steps = []
+
+        def lookup(index, value):
+            key = _item_id(index, value, refs)
+            item = created.get(key) or items.get(key)
+            if item is None or key in deleted:
+                raise InvalidOperation(index, f"todo item {value!r} not found")
+            return key, item
+
+        def place(index, operation, key, status):
+            column = columns[status]
+            at = 0
+            for name, offset in (("after", 1), ("before", 0)):
+                if operation.get(name) is not None:
+                    anchor = column.index(_item_id(index, operation[name], refs))
+                    if anchor is None:
+                        raise InvalidOperation(
+                            index, f"{name} must be an item in the {status} column"
+                        )
+                    at = anchor + offset
+                    break
+            positioned.update(column.insert(at, key))
+
+        for index, operation in enumerate(operations):
+            op = operation["op"]
+            if op == "create":
+                title = str(operation.get("title") or "").strip()
+                if not title or len(title) > 255:
+                    raise InvalidOperation(index, "title is required (255 characters at most)")
+                status = _status(index, operation, "TODO")
+                key = ("new", index)
+                item = TodoItem(
+                    user_id=user_id,
+                    title=title,
+                    description=str(operation.get("description") or "").strip(),
+                )
+                set_status(item, status, now)
+                created[key] = item
+                if operation.get("ref") is not None:
+                    refs[operation["ref"]] = key
+                place(index, operation, key, status)
+            elif op == "move":
+                key, item = lookup(index, operation.get("id"))
+                status = _status(index, operation, item.status)
+                columns[item.status].remove(key)
+                set_status(item, status, now)
+                place(index, operation, key, status)
+                moved.add(key)
+            elif op == "delete":
+                key, item = lookup(index, operation.get("id"))
+                if item.status in columns:
+                    columns[item.status].remove(key)
+                if created.pop(key, None) is None:
+                    deleted.add(key)
+            else:
+                status = _status(index, operation, None)
+                cleared.add(status)
+                # Items named elsewhere in the batch are deleted by id, so
+                # ones moved into the column later survive the clear
+                for key, item in list(created.items()) + list(items.items()):
+                    if item.status == status and key not in deleted:
+                        if created.pop(key, None) is None:
+                            deleted.add(key)
+                if status in columns:
+                    columns[status] = _Column([])
+            steps.append((op, operation, key if op != "clear" else None))
+
+        # Write: respaced rows, moved rows, new rows, then deletions
+        positions = {}
+        for column in columns.values():
+            positions.update(column.positions)
+        respaced = []
+        for key in positioned & positions.keys():
+            item = created.get(key) or items.get(key)
+            if item is not None:
+                item.position = positions[key]
+            if item is None or (key in items and key not in moved):
+                respaced.append(TodoItem(pk=key, position=positions[key], updated_at=now))
+        if respaced:
+            TodoItem.objects.bulk_update(respaced, ["position", "updated_at"])
+        changed = [items[key] for key in moved if key in items and key not in deleted]
+        for item in changed:
+            item.updated_at = now
+        if changed:
+            TodoItem.objects.bulk_update(
+                changed,
+                ["status", "position", "started_at", "completed_at", "updated_at"],
+            )
+        if created:
+            TodoItem.objects.bulk_create(created.values())
+        if deleted:
+            delete(TodoItem.objects.filter(user_id=user_id, pk__in=deleted))
+        if cleared:
+            delete(
+                TodoItem.objects.filter(user_id=user_id, status__in=cleared).exclude(
+                    pk__in=[item.pk for item in changed]
+                )
+            )
+
+    results = []
+    for op, operation, key in steps:
+        if op == "clear":
+            results.append({"op": op, "status": operation["status"]})
+        elif op == "delete":
+            results.append({"op": op, "id": operation["id"]})
+        else:
+            item = created.get(key) or items.get(key)
+            gone = item is None or key in deleted
+            result = {"op": op, "todo": None if gone else serialize(item)}
+            if op == "create" and operation.get("ref") is not None:
+                result["ref"] = operation["ref"]
+            results.append(result)
+    return results
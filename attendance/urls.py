@@ -7,6 +7,15 @@ urlpatterns = [
     path("register/", views.register, name="register"),
     path("sign-in-out/", views.sign_in_out, name="sign_in_out"),
     path("attendance/", views.attendance_list, name="attendance_list"),
+    path("export/jobs/", views.create_export_job, name="create_export_job"),
+    path(
+        "export/jobs/<uuid:job_id>/", views.export_job_status, name="export_job_status"
+    ),
+    path(
+        "export/jobs/<uuid:job_id>/download/",
+        views.download_export_job,
+        name="download_export_job",
+    ),
     path(
         "export/<str:format_type>/", views.export_attendance, name="export_attendance"
     ),
@@ -20,7 +29,17 @@ urlpatterns = [
         views.attendance_chart_data,
         name="attendance_chart_data",
     ),
+    path(
+        "reports/worked-hours/",
+        views.worked_hours_data,
+        name="worked_hours_data",
+    ),
     path("all-time-off/", views.all_time_off, name="all_time_off"),
+    path(
+        "leave-request/review/",
+        views.review_leave_requests,
+        name="review_leave_requests",
+    ),
     path(
         "leave-request/<int:leave_id>/approve/",
         views.approve_leave_request,
@@ -37,9 +56,16 @@ urlpatterns = [
     path("my-barcode/", views.my_barcode, name="my_barcode"),
     path("barcode-scan/", views.barcode_scan_page, name="barcode_scan_page"),
     path("barcode-authenticate/", views.barcode_authenticate, name="barcode_authenticate"),
+    path(
+        "barcode-authenticate/batch/",
+        views.barcode_authenticate_batch,
+        name="barcode_authenticate_batch",
+    ),
+    path("barcode-cache/stats/", views.barcode_cache_stats, name="barcode_cache_stats"),
     # Todo List URLs
     path("todos/", views.get_todos, name="get_todos"),
     path("todos/create/", views.create_todo, name="create_todo"),
+    path("todos/batch/", views.batch_todos, name="batch_todos"),
     path("todos/<int:todo_id>/update-status/", views.update_todo_status, name="update_todo_status"),
     path("todos/<int:todo_id>/delete/", views.delete_todo, name="delete_todo"),
     # Staff API
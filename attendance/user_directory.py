@@ -0,0 +1,132 @@
+"""
+Versioned cache of the user lists behind the dashboard's picker modals.
+
+``get_staff_members`` and ``get_non_admin_users`` return lists that change
+far less often than the modals are opened. Each list is serialized once per
+directory *version* and kept in Django's cache; the version also forms the
+ETag, so a browser that already holds the current list gets a 304 without
+the list being read at all. ``post_save``/``post_delete`` signals on the
+user model, ``Staff`` and ``Department`` (see ``attendance.signals``) call
+:func:`bump` once their transaction commits; code that changes those rows
+with ``QuerySet.update()`` must call it itself.
+
+The version never expires, so it only changes on a bump. A bump must reach
+every worker, so ETags are only offered with a shared cache (Redis); with
+a process-local cache each worker rebuilds its lists every
+``USER_DIRECTORY_CACHE_TIMEOUT`` seconds and responses are not conditional.
+"""
+
+import json
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from .models import Staff
+
+STAFF_MEMBERS = "staff-members"
+NON_ADMIN_USERS = "non-admin-users"
+
+_VERSION_KEY = "user-directory:version"
+
+# Backends whose entries are private to one process, so a bump made by one
+# worker is never seen by the others.
+_LOCAL_BACKENDS = frozenset(
+    {
+        "django.core.cache.backends.locmem.LocMemCache",
+        "django.core.cache.backends.dummy.DummyCache",
+    }
+)
+
+# User fields that appear in the lists; saves limited to other fields (such
+# as last_login on every login) leave the version alone.
+USER_FIELDS = frozenset(
+    {"username", "first_name", "last_name", "email", "is_staff", "is_active", "department"}
+)
+
+
+def _timeout():
+    return getattr(settings, "USER_DIRECTORY_CACHE_TIMEOUT", 60)
+
+
+def shared():
+    """Whether the default cache is shared by every worker process."""
+    return settings.CACHES["default"]["BACKEND"] not in _LOCAL_BACKENDS
+
+
+def version():
+    """Return the current directory version, starting a new one if none is cached."""
+    current = cache.get(_VERSION_KEY)
+    if current is None:
+        cache.add(_VERSION_KEY, time.time_ns(), None)
+        current = cache.get(_VERSION_KEY, 0)
+    return current
+
+
+def bump():
+    """Start a new version so every list is rebuilt on its next request."""
+    try:
+        cache.incr(_VERSION_KEY)
+    except ValueError:
+        # Not cached (evicted): any new value is a new version
+        cache.set(_VERSION_KEY, time.time_ns(), None)
+
+
+def etag(name):
+    """ETag of list ``name``, or None if the cache is not shared."""
+    if not shared():
+        return None
+    return f'"{name}-{version()}"'
+
+
+def _staff_members():
+    staff = (
+        Staff.objects.select_related("user")
+        .filter(is_active=True)
+        .only("user__id", "user__username", "user__first_name", "user__last_name")
+        .order_by("user__first_name", "user__last_name")
+    )
+    return {
+        "success": True,
+        "members": [
+            {"id": s.user.id, "name": s.user.get_full_name() or s.user.username}
+            for s in staff
+        ],
+    }
+
+
+def _non_admin_users():
+    users = (
+        get_user_model()
+        .objects.select_related("department")
+        .filter(is_staff=False, is_active=True)
+        .only("id", "username", "first_name", "last_name", "email", "department__name")
+        .order_by("first_name", "last_name", "username")
+    )
+    return {
+        "success": True,
+        "users": [
+            {
+                "id": user.id,
+                "username": user.username,
+                "full_name": user.get_full_name() or user.username,
+                "email": user.email,
+                "department": user.department.name if user.department else None,
+            }
+            for user in users
+        ],
+    }
+
+
+_BUILDERS = {STAFF_MEMBERS: _staff_members, NON_ADMIN_USERS: _non_admin_users}
+
+
+def get(name):
+    """Return the serialized JSON body of list ``name`` for the current version."""
+    key = f"user-directory:{name}:{version()}"
+    body = cache.get(key)
+    if body is None:
+        body = json.dumps(_BUILDERS[name]()).encode()
+        cache.set(key, body, _timeout())
+    return body
@@ -1,56 +1,173 @@
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import condition, require_POST
 from django.http import JsonResponse
 
 
+TIME_OFF_ORDERING = ("-created_at", "-id")
+
+
+def filter_time_off(queryset, params):
+    """
+    Apply the ``all_time_off`` filters found in ``params``.
+
+    ``status`` and ``type`` match the choice values; ``start``/``end``
+    (YYYY-MM-DD) keep requests whose dates overlap that range. Raises
+    ``ValueError`` for malformed values.
+    """
+    status = params.get("status")
+    if status:
+        if status not in dict(LeaveRequest.STATUS_CHOICES):
+            raise ValueError("unknown status")
+        queryset = queryset.filter(status=status)
+    request_type = params.get("type")
+    if request_type:
+        if request_type not in dict(LeaveRequest.REQUEST_TYPE_CHOICES):
+            raise ValueError("unknown type")
+        queryset = queryset.filter(type=request_type)
+
+    start = exports.date_param(params, "start")
+    end = exports.date_param(params, "end")
+    if start and end and start > end:
+        raise ValueError("start must be on or before end")
+    if end:
+        queryset = queryset.filter(start_date__lte=end)
+    if start:
+        queryset = queryset.filter(end_date__gte=start)
+    return queryset
+
+
 # List all time off requests for the current user (or all for admin)
 @login_required
 def all_time_off(request):
+    """
+    Time off requests, newest first, keyset-paginated on ``(created_at, id)``.
+
+    Admins see everyone's requests; other users only their own.
+    """
     if request.user.is_staff:
-        all_time_off = LeaveRequest.objects.all().order_by("-created_at")
+        all_time_off = LeaveRequest.objects.select_related("user", "reviewed_by")
     else:
-        all_time_off = LeaveRequest.objects.filter(user=request.user).order_by(
-            "-created_at"
+        all_time_off = LeaveRequest.objects.filter(user=request.user)
+    try:
+        all_time_off = filter_time_off(all_time_off, request.GET)
+        page = pagination.paginate(
+            all_time_off, TIME_OFF_ORDERING, cursor=request.GET.get("after")
         )
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    filter_params = request.GET.copy()
+    filter_params.pop("after", None)
     context = {
-        "all_time_off": all_time_off,
+        "all_time_off": page.object_list,
+        "page": page,
+        "filters": request.GET,
+        "filter_query": filter_params.urlencode(),
+        "status_choices": LeaveRequest.STATUS_CHOICES,
+        "type_choices": LeaveRequest.REQUEST_TYPE_CHOICES,
         "is_staff": request.user.is_staff,
     }
     return render(request, "all_time_off.html", context)
 
 
-from django.shortcuts import render, redirect
+from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    StreamingHttpResponse,
+)
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.html import strip_tags
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth import login, authenticate
-from .models import Department, Attendance, LeaveRequest
+from django.urls import reverse
+from django.template.loader import render_to_string
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    BooleanField,
+    Count,
+    ExpressionWrapper,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+)
+from .models import (
+    Department,
+    Attendance,
+    LeaveBalance,
+    LeaveRequest,
+    DailyAttendanceSummary,
+    ExportJob,
+    OfficeSite,
+)
+from . import (
+    barcode_cache,
+    export_jobs,
+    exports,
+    geocoding,
+    kiosks,
+    leave_balances,
+    outbox,
+    pagination,
+    reports,
+    rollups,
+    scans,
+    shifts,
+    status_cache,
+    todos,
+    user_directory,
+)
 from .forms import StaffRegistrationForm, SignInOutForm, LeaveRequestForm
 
 # removed import of CustomUser
-import pandas as pd
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-import io
 from datetime import timedelta
 import logging
 import json
+import uuid
 
 logger = logging.getLogger(__name__)
 
 
+def _parse_date_param(value):
+    """Parse a YYYY-MM-DD query parameter, returning None if it is missing or invalid."""
+    try:
+        return parse_date(value or "")
+    except ValueError:
+        return None
+
+
+def queue_verification_email(request, user, token):
+    """Queue the email verification message for ``user`` in the outbox."""
+    verification_url = request.build_absolute_uri(f'/verify-email/{token}/')
+    html_message = render_to_string('emails/verify_email.html', {
+        'user': user,
+        'verification_url': verification_url,
+    })
+    return outbox.enqueue(
+        'Verify Your Email - AdminEdge Staff Attendance',
+        strip_tags(html_message),
+        [user.email],
+        html_body=html_message,
+    )
+
+
 def register(request):
     """
     Handle user registration with the custom user model and email verification.
+
+    The verification email is queued in the same transaction as the user and
+    delivered by ``run_email_worker``, so sign-ups never wait on the mail
+    server.
     """
     from .models import Staff
-    from django.core.mail import send_mail
-    from django.template.loader import render_to_string
-    from django.utils.html import strip_tags
-    
+
     if request.user.is_authenticated:
         messages.info(request, _("You are already logged in."))
         return redirect("dashboard")
@@ -59,65 +176,37 @@ def register(request):
         form = StaffRegistrationForm(request.POST, request.FILES)
         if form.is_valid():
             try:
-                # Save the user with the form data
-                user = form.save(commit=False)
-                user.set_password(form.cleaned_data["password1"])
-                user.email_verified = False  # User needs to verify email
-                user.save()
+                with transaction.atomic():
+                    # Save the user with the form data
+                    user = form.save(commit=False)
+                    user.set_password(form.cleaned_data["password1"])
+                    user.email_verified = False  # User needs to verify email
+                    user.save()
+
+                    # Generate verification token
+                    token = user.generate_verification_token()
+
+                    # Create Staff profile for the user (if not already created by signal)
+                    staff, created = Staff.objects.get_or_create(
+                        user=user,
+                        defaults={
+                            'department': user.department if hasattr(user, 'department') else None,
+                            'phone': user.phone if hasattr(user, 'phone') else '',
+                            'position': user.position if hasattr(user, 'position') else '',
+                            'bio': user.bio if hasattr(user, 'bio') else '',
+                            'is_active': True
+                        }
+                    )
 
-                # Generate verification token
-                token = user.generate_verification_token()
-
-                # Create Staff profile for the user (if not already created by signal)
-                staff, created = Staff.objects.get_or_create(
-                    user=user,
-                    defaults={
-                        'department': user.department if hasattr(user, 'department') else None,
-                        'phone': user.phone if hasattr(user, 'phone') else '',
-                        'position': user.position if hasattr(user, 'position') else '',
-                        'bio': user.bio if hasattr(user, 'bio') else '',
-                        'is_active': True
-                    }
-                )
+                    # Queue the verification email with the new user
+                    queue_verification_email(request, user, token)
 
                 # Log the successful registration
                 logger.info(f"New user registered: {user.username} ({user.email})")
-
-                # Send verification email
-                try:
-                    verification_url = request.build_absolute_uri(
-                        f'/verify-email/{token}/'
-                    )
-                    
-                    subject = 'Verify Your Email - AdminEdge Staff Attendance'
-                    html_message = render_to_string('emails/verify_email.html', {
-                        'user': user,
-                        'verification_url': verification_url,
-                    })
-                    plain_message = strip_tags(html_message)
-                    
-                    send_mail(
-                        subject,
-                        plain_message,
-                        settings.DEFAULT_FROM_EMAIL,
-                        [user.email],
-                        html_message=html_message,
-                        fail_silently=False,
-                    )
-                    
-                    messages.success(
-                        request,
-                        _("Registration successful! Please check your email to verify your account before logging in.")
-                    )
-                    logger.info(f"Verification email sent to {user.email}")
-                    
-                except Exception as email_error:
-                    logger.error(f"Error sending verification email: {str(email_error)}", exc_info=True)
-                    messages.warning(
-                        request,
-                        _("Registration successful, but we couldn't send the verification email. Please contact support.")
-                    )
-                
+                messages.success(
+                    request,
+                    _("Registration successful! Please check your email to verify your account before logging in.")
+                )
                 return redirect("login")
 
             except Exception as e:
@@ -138,12 +227,10 @@ def sign_in_out(request):
     Handle staff sign in/out functionality.
     """
     user = request.user
-    today = timezone.now().date()
+    today = timezone.localdate()
 
-    # Get or create attendance record for today
-    attendance, created = Attendance.objects.get_or_create(
-        user=user, date=today
-    )
+    # Today's record, if any; it is created by the first sign-in
+    attendance = scans.load_day(user.pk, today)
 
     status_message = None
     show_form = True
@@ -156,36 +243,61 @@ def sign_in_out(request):
         if form.is_valid():
             action = form.cleaned_data["action"]
             location = request.POST.get("location", "")  # Get location from form
-            
-            if action == "sign_in" and not attendance.sign_in:
-                attendance.sign_in = timezone.now()
-                if location:
-                    attendance.location = location
-                attendance.save()
+            coordinates = geocoding.parse_coordinates(
+                request.POST.get("lat"),
+                request.POST.get("lon"),
+                request.POST.get("accuracy"),
+            )
+            # A resubmitted form carries the same request id and gets the
+            # original outcome back instead of being applied twice
+            request_id = form.cleaned_data.get("request_id")
+            key = f"web:{user.pk}:{request_id}" if request_id else None
+            now = timezone.now()
+
+            def apply():
+                with transaction.atomic():
+                    if action == "sign_in":
+                        signed_in = scans.write_sign_in(
+                            user.pk,
+                            today,
+                            now,
+                            shifts.for_department(user.department_id),
+                            location,
+                            attendance,
+                            coordinates,
+                        )
+                        if signed_in:
+                            rollups.record_sign_in(signed_in, user.department_id)
+                            return {"action": "sign_in", "time": str(now)}
+                    elif attendance and scans.write_sign_out(attendance, now):
+                        rollups.record_sign_out(attendance, user.department_id)
+                        return {
+                            "action": "sign_out",
+                            "time": str(now),
+                            "attendance_id": attendance.pk,
+                        }
+                return {"action": None}
+
+            result = scans.run_once(key, user.pk, now, apply)
+            if result["action"] == "sign_in":
                 request.session["status_message"] = (
                     "You signed in successfully today. Welcome! we wish you a productive day ahead."
                 )
-                request.session["sign_time"] = str(attendance.sign_in)
-                return redirect("sign_in_out")
-            elif (
-                action == "sign_out" and attendance.sign_in and not attendance.sign_out
-            ):
-                attendance.sign_out = timezone.now()
-                attendance.save()
+                request.session["sign_time"] = result["time"]
+            elif result["action"] == "sign_out":
                 request.session["status_message"] = (
                     "You signed out successfully. Goodbye!"
                 )
                 # Ask user to leave a note after signing out
-                request.session["prompt_attendance_note"] = attendance.id
-                request.session["sign_time"] = str(attendance.sign_out)
-                return redirect("sign_in_out")
+                request.session["prompt_attendance_note"] = result["attendance_id"]
+                request.session["sign_time"] = result["time"]
             else:
                 request.session["status_message"] = (
                     "Invalid action or already signed in/out."
                 )
-                return redirect("sign_in_out")
+            return redirect("sign_in_out")
     else:
-        form = SignInOutForm()
+        form = SignInOutForm(initial={"request_id": uuid.uuid4().hex})
 
     # Get status message from session if available
     if "status_message" in request.session:
@@ -195,7 +307,7 @@ def sign_in_out(request):
     prompt_attendance_note = request.session.pop("prompt_attendance_note", None)
 
     # Control which button/form to show
-    if not attendance.sign_in:
+    if not attendance or not attendance.sign_in:
         show_sign_in = True
     elif attendance.sign_in and not attendance.sign_out:
         show_sign_out = True
@@ -218,18 +330,45 @@ def sign_in_out(request):
     )
 
 
+ATTENDANCE_LIST_ORDERING = ("-date", "-sign_in", "-id")
+
+
 @login_required
 def attendance_list(request):
+    """
+    Admin list of attendance records, newest first, 50 per page.
+
+    Filters: ``start``/``end`` dates, ``department`` id, ``user`` username,
+    ``late``, ``open`` and ``site`` (see ``exports.filter_attendance``). Pages are
+    keyset-paginated on ``(date, sign_in, id)`` via the ``after`` cursor, so
+    older pages cost the same as the first one.
+    """
     if not request.user.is_staff:
         return redirect("sign_in_out")
 
-    attendances = Attendance.objects.all()
-    if request.GET.get("user"):
-        attendances = attendances.filter(user__username=request.GET["user"])
-    if request.GET.get("date"):
-        attendances = attendances.filter(date=request.GET["date"])
+    try:
+        attendances = exports.filter_attendance(
+            Attendance.objects.select_related("user", "location"), request.GET
+        )
+        page = pagination.paginate(
+            attendances,
+            ATTENDANCE_LIST_ORDERING,
+            cursor=request.GET.get("after"),
+        )
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
 
-    return render(request, "attendance_list.html", {"attendances": attendances})
+    filter_params = request.GET.copy()
+    filter_params.pop("after", None)
+    context = {
+        "page": page,
+        "attendances": page.object_list,
+        "filters": request.GET,
+        "filter_query": filter_params.urlencode(),
+        "departments": Department.objects.only("id", "name"),
+        "sites": OfficeSite.objects.only("id", "name"),
+    }
+    return render(request, "attendance_list.html", context)
 
 
 @login_required
@@ -256,57 +395,130 @@ def save_attendance_note(request):
 
 @login_required
 def export_attendance(request, format_type):
+    """
+    Export attendance records as CSV, Excel or PDF (admin only).
+
+    Accepts the filters understood by ``exports.filter_attendance``:
+    ``start``/``end`` dates, ``department`` id and ``user`` username.
+    CSV output is streamed so memory stays flat for any table size; PDF
+    reports are rendered into a spooled temporary file and served from it,
+    and are refused (400) above ``PDF_EXPORT_MAX_ROWS`` records.
+    """
     if not request.user.is_staff:
         return redirect("sign_in_out")
 
-    attendances = Attendance.objects.all()
-    data = [
-        {
-            "User": str(att.user),
-            "Date": att.date,
-            "Sign In": att.sign_in,
-            "Sign Out": att.sign_out,
-            "Location": att.location or "-",
-            "Notes": att.notes,
-        }
-        for att in attendances
-    ]
+    try:
+        attendances = exports.filter_attendance(Attendance.objects.all(), request.GET)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
 
     if format_type == "csv":
-        df = pd.DataFrame(data)
-        response = HttpResponse(content_type="text/csv")
+        response = StreamingHttpResponse(
+            exports.stream_csv(attendances), content_type="text/csv"
+        )
         response["Content-Disposition"] = 'attachment; filename="attendance.csv"'
-        df.to_csv(response, index=False)
         return response
-    elif format_type == "excel":
-        df = pd.DataFrame(data)
-        response = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+    if format_type == "excel":
+        excel_file = exports.spooled_file()
+        exports.write_excel(attendances, excel_file)
+        excel_file.seek(0)
+        return FileResponse(
+            excel_file,
+            as_attachment=True,
+            filename="attendance.xlsx",
+            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         )
-        response["Content-Disposition"] = 'attachment; filename="attendance.xlsx"'
-        df.to_excel(response, index=False)
-        return response
-    elif format_type == "pdf":
-        response = HttpResponse(content_type="application/pdf")
-        response["Content-Disposition"] = 'attachment; filename="attendance.pdf"'
-        buffer = io.BytesIO()
-        p = canvas.Canvas(buffer, pagesize=letter)
-        y = 750
-        for item in data:
-            p.drawString(
-                50,
-                y,
-                f"User: {item['User']}, Date: {item['Date']}, Sign In: {item['Sign In']}, Sign Out: {item['Sign Out']}, Location: {item['Location'][:30]}",
-            )
-            y -= 20
-            if y < 50:
-                p.showPage()
-                y = 750
-        p.save()
-        buffer.seek(0)
-        response.write(buffer.getvalue())
-        buffer.close()
-        return response
+
+    if format_type == "pdf":
+        pdf_file = exports.spooled_file()
+        try:
+            exports.AttendancePDFReport(
+                attendances, subtitle=exports.describe_filters(request.GET)
+            ).write(pdf_file)
+        except ValueError as e:
+            pdf_file.close()
+            return HttpResponseBadRequest(str(e))
+        pdf_file.seek(0)
+        return FileResponse(
+            pdf_file,
+            as_attachment=True,
+            filename="attendance.pdf",
+            content_type="application/pdf",
+        )
+    raise Http404("Unknown export format")
+
+
+def _export_job_payload(job):
+    return {
+        "id": str(job.pk),
+        "format": job.format,
+        "status": job.status,
+        "rows_processed": job.rows_processed,
+        "total_rows": job.total_rows,
+        "percent": job.percent_complete,
+        "error": job.error,
+        "status_url": reverse("export_job_status", args=[job.pk]),
+        "download_url": (
+            reverse("download_export_job", args=[job.pk])
+            if job.status == "Completed"
+            else None
+        ),
+    }
+
+
+def _get_export_job(request, job_id):
+    """Return the job if ``request.user`` may see it, else raise Http404."""
+    jobs = ExportJob.objects.all()
+    if not request.user.is_superuser:
+        jobs = jobs.filter(requested_by=request.user)
+    try:
+        return jobs.get(pk=job_id)
+    except ExportJob.DoesNotExist:
+        raise Http404("Export not found")
+
+
+@login_required
+@require_POST
+def create_export_job(request):
+    """
+    Queue an attendance export to be built by ``run_export_worker`` (admin only).
+
+    Takes ``format`` plus the filters accepted by ``export_attendance`` and
+    answers 202 with the job's status URL.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({"error": "forbidden"}, status=403)
+    try:
+        job = export_jobs.enqueue(
+            request.user, request.POST.get("format", ""), request.POST
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(_export_job_payload(job), status=202)
+
+
+@login_required
+def export_job_status(request, job_id):
+    """Report the progress of an export job as JSON."""
+    if not request.user.is_staff:
+        return JsonResponse({"error": "forbidden"}, status=403)
+    return JsonResponse(_export_job_payload(_get_export_job(request, job_id)))
+
+
+@login_required
+def download_export_job(request, job_id):
+    """Serve the file of a completed export job."""
+    if not request.user.is_staff:
+        return redirect("sign_in_out")
+    job = _get_export_job(request, job_id)
+    if job.status != "Completed" or not job.file:
+        raise Http404("Export is not ready")
+    return FileResponse(
+        job.file.open("rb"),
+        as_attachment=True,
+        filename=f"attendance{export_jobs.EXTENSIONS[job.format]}",
+    )
 
 
 @login_required
@@ -316,7 +528,7 @@ def leave_request(request):
         if form.is_valid():
             leave = form.save(commit=False)
             leave.user = request.user
-            leave.save()
+            leave_balances.submit(leave)
             
             # Determine request type for better message
             request_type = leave.get_type_display() if hasattr(leave, 'get_type_display') else leave.type
@@ -341,137 +553,179 @@ def dashboard(request):
             f"Dashboard accessed by {request.user.username} (staff: {request.user.is_staff})"
         )
 
-        staff_profile = getattr(request.user, "staff", None)
-        today = timezone.now().date()
-        now = timezone.now()
+        user = request.user
+        is_admin = user.is_staff
+        today = timezone.localdate()
         month_start = today.replace(day=1)
-        late_threshold = now.replace(hour=9, minute=0, second=0, microsecond=0).time()
+        upcoming_statuses = ["Approved", "Pending"]
 
-        # Days worked this month (distinct days with sign_in)
-        days_worked = Attendance.objects.filter(
-            user=request.user,
+        # 1. The user's row with profile, department and every per-user
+        #    counter (plus the admin-wide ones) as scalar subqueries
+        this_month = Attendance.objects.filter(
+            user=OuterRef("pk"),
             sign_in__isnull=False,
             date__gte=month_start,
             date__lte=today,
-        ).count()
+        )
+        leave_balance = LeaveBalance.objects.filter(user=OuterRef("pk"), year=today.year)
+        todays_record = Attendance.objects.filter(user=OuterRef("pk"), date=today)
+        stats = {
+            "days_worked": reports.SubqueryCount(this_month.values("pk")),
+            "late_arrivals": reports.SubqueryCount(
+                this_month.filter(reports.late_q()).values("pk")
+            ),
+            "leave_taken": Subquery(leave_balance.values("taken")[:1]),
+            "leave_allowance": Subquery(leave_balance.values("allowance")[:1]),
+            "today_sign_in": Subquery(todays_record.values("sign_in")[:1]),
+            "today_sign_out": Subquery(todays_record.values("sign_out")[:1]),
+        }
+        if is_admin:
+            stats["pending_leaves"] = reports.SubqueryCount(
+                LeaveRequest.objects.filter(status="Pending").values("pk")
+            )
+            # Active employees (users with attendance in last 30 days)
+            stats["active_employees"] = reports.SubqueryCount(
+                Attendance.objects.filter(date__gte=today - timedelta(days=30))
+                .values("user")
+                .distinct()
+            )
+        profile_user = (
+            get_user_model()
+            .objects.select_related("department", "staff_profile")
+            .annotate(**stats)
+            .get(pk=user.pk)
+        )
+        # The context processor reads today's status from the cache
+        status_cache.prime(
+            user.pk, today, profile_user.today_sign_in, profile_user.today_sign_out
+        )
+        staff_profile = getattr(profile_user, "staff_profile", None)
 
+        days_worked = profile_user.days_worked
         # Calculate percentage of days worked (assuming 22 working days per month)
         days_worked_percent = (
             min(int((days_worked / 22) * 100), 100) if days_worked else 0
         )
+        late_arrivals = profile_user.late_arrivals
 
-        # Late arrivals this month
-        late_arrivals = Attendance.objects.filter(
-            user=request.user,
-            sign_in__isnull=False,
-            sign_in__time__gt=late_threshold,
-            date__gte=month_start,
-            date__lte=today,
-        ).count()
-
-        # Recent attendance/activity (last 5 records)
-        recent_attendance_qs = Attendance.objects.filter(user=request.user).order_by(
-            "-date", "-sign_in"
-        )[:5]
-        recent_attendance = []
-        for att in recent_attendance_qs:
-            duration_str = "--:--"
-            if att.sign_in and att.sign_out:
-                delta = att.sign_out - att.sign_in
-                total_seconds = int(delta.total_seconds())
-                hours = total_seconds // 3600
-                minutes = (total_seconds % 3600) // 60
-                duration_str = f"{hours}:{minutes:02d}"
-            # Attach as a template-safe attribute (no underscore)
-            att.duration_str = duration_str
-            recent_attendance.append(att)
-
-        # Recent leave requests
-        if request.user.is_staff:
-            # Admin sees all recent leave/remote work requests (last 10)
-            recent_leaves = LeaveRequest.objects.all().order_by("-created_at")[:10]
-        else:
-            # User sees their own recent leave/remote work requests (last 5)
-            recent_leaves = LeaveRequest.objects.filter(user=request.user).order_by(
-                "-created_at"
-            )[:5]
+        # Remaining vacation days from this year's leave balance
+        vacation_days_total = profile_user.leave_allowance
+        if vacation_days_total is None:
+            vacation_days_total = leave_balances.allowance()
+        vacation_days_left = max(vacation_days_total - (profile_user.leave_taken or 0), 0)
 
+        # 2. Recent attendance/activity (last 5 records)
+        recent_attendance = list(
+            Attendance.objects.filter(user=user).order_by("-date", "-sign_in")[:5]
+        )
+        for att in recent_attendance:
+            # Own records: reuse the loaded user instead of a query per row
+            att.user = profile_user
+
+        # 3. Recent leave requests (admins: everyone's last 10, users: their
+        #    own last 5) and the user's upcoming time off, in one query
+        recent_ids = (
+            LeaveRequest.objects.order_by("-created_at").values("pk")[:10]
+            if is_admin
+            else LeaveRequest.objects.filter(user=user)
+            .order_by("-created_at")
+            .values("pk")[:5]
+        )
+        upcoming_q = Q(user=user, end_date__gte=today, status__in=upcoming_statuses)
+        leaves = list(
+            LeaveRequest.objects.select_related("user")
+            .filter(Q(pk__in=recent_ids) | upcoming_q)
+            .annotate(
+                is_recent=ExpressionWrapper(
+                    Q(pk__in=recent_ids), output_field=BooleanField()
+                )
+            )
+            .order_by("-created_at")
+        )
+        recent_leaves = [leave for leave in leaves if leave.is_recent]
         # Upcoming time off (future leave requests, approved or pending)
-        upcoming_time_off = LeaveRequest.objects.filter(
-            user=request.user, end_date__gte=today, status__in=["Approved", "Pending"]
-        ).order_by("start_date")
-
+        upcoming_time_off = sorted(
+            (
+                leave
+                for leave in leaves
+                if leave.user_id == user.pk
+                and leave.end_date
+                and leave.end_date >= today
+                and leave.status in upcoming_statuses
+            ),
+            key=lambda leave: (leave.start_date is None, leave.start_date),
+        )
         # Add days attribute to each leave object for template access
         for leave in upcoming_time_off:
             leave.days = leave.duration
 
-        # Remaining vacation days (example: assume 20 per year minus approved leaves)
-        approved_leaves = LeaveRequest.objects.filter(
-            user=request.user, status="Approved", start_date__year=today.year
+        # 4. Delegated duties: the user's own and, for admins, everyone's
+        from .models import DelegatedDuty
+        duty_order = ("status", "due_date", "-created_at")
+        my_duty_ids = (
+            DelegatedDuty.objects.filter(assigned_to=user)
+            .order_by(*duty_order)
+            .values("pk")[:10]
         )
-        days_taken = sum(
-            [(leave.end_date - leave.start_date).days + 1 for leave in approved_leaves]
+        duties = DelegatedDuty.objects.select_related("assigned_to", "assigned_by")
+        if is_admin:
+            admin_duty_ids = DelegatedDuty.objects.order_by(*duty_order).values("pk")[:10]
+            duties = duties.filter(Q(pk__in=my_duty_ids) | Q(pk__in=admin_duty_ids))
+        else:
+            duties = duties.filter(pk__in=my_duty_ids)
+        duties = list(
+            duties.annotate(
+                is_mine=ExpressionWrapper(
+                    Q(assigned_to=user), output_field=BooleanField()
+                )
+            ).order_by(*duty_order)
         )
-        vacation_days_total = 10
-        vacation_days_left = max(vacation_days_total - days_taken, 0)
+        my_duties = [duty for duty in duties if duty.is_mine][:10]
+        delegated_duties_admin = duties[:10] if is_admin else []
 
         # Staff-specific data
-        late_attendances = []
+        late_count = 0
         date_strs = []
         late_counts = []
         pending_leaves = 0
         active_employees = 0
         on_time_percent = 0
-        if request.user.is_staff:
-            # Today's late attendances (all users)
-            late_attendances = Attendance.objects.filter(
-                date=today, sign_in__time__gt=late_threshold
-            )
-            # Chart: late sign-ins per day for last 7 days
+        if is_admin:
+            # 5. Organisation-wide daily counters for the last 7 days
             end_date = today
             start_date = end_date - timedelta(days=6)
-            date_range = [start_date + timedelta(days=x) for x in range(7)]
-            for date in date_range:
-                count = Attendance.objects.filter(
-                    date=date, sign_in__time__gt=late_threshold
-                ).count()
+            summaries = {
+                summary.date: summary
+                for summary in DailyAttendanceSummary.objects.filter(
+                    department__isnull=True, date__gte=start_date, date__lte=end_date
+                )
+            }
+            today_summary = summaries.get(today)
+            # Today's late attendances (all users)
+            late_count = today_summary.late if today_summary else 0
+            # Chart: late sign-ins per day for last 7 days
+            for x in range(7):
+                date = start_date + timedelta(days=x)
                 date_strs.append(date.strftime("%Y-%m-%d"))
-                late_counts.append(count)
-            # Pending leave requests
-            pending_leaves = LeaveRequest.objects.filter(status="Pending").count()
-            # Active employees (users with attendance in last 30 days)
-            active_employees = (
-                Attendance.objects.filter(date__gte=today - timedelta(days=30))
-                .values("user")
-                .distinct()
-                .count()
-            )
+                late_counts.append(summaries[date].late if date in summaries else 0)
+            pending_leaves = profile_user.pending_leaves
+            active_employees = profile_user.active_employees
             # On-time attendance percent (today)
-            total_today = Attendance.objects.filter(date=today).count()
-            on_time_today = Attendance.objects.filter(
-                date=today, sign_in__isnull=False, sign_in__time__lte=late_threshold
-            ).count()
-            on_time_percent = (
-                int((on_time_today / total_today) * 100) if total_today else 0
-            )
+            if today_summary and today_summary.signed_in:
+                on_time_percent = int(
+                    (today_summary.on_time / today_summary.signed_in) * 100
+                )
 
         # Prefer position from CustomUser, fallback to staff_profile if needed
-        user_role = getattr(request.user, "position", None)
+        user_role = getattr(profile_user, "position", None)
         if not user_role:
             user_role = getattr(staff_profile, "position", "") if staff_profile else ""
         user_role = user_role.strip() if user_role else ""
 
         # Get the user's department
         department = None
-        if hasattr(request.user, "department") and request.user.department:
-            department = request.user.department.name
-
-        # Delegated duties
-        from .models import DelegatedDuty
-        my_duties = DelegatedDuty.objects.filter(assigned_to=request.user).order_by("status", "due_date", "-created_at")[:10]
-        delegated_duties_admin = []
-        if request.user.is_staff:
-            delegated_duties_admin = DelegatedDuty.objects.select_related("assigned_to", "assigned_by").order_by("status", "due_date", "-created_at")[:10]
+        if getattr(profile_user, "department", None):
+            department = profile_user.department.name
 
         context = {
             "user": request.user,
@@ -493,7 +747,7 @@ def dashboard(request):
         if request.user.is_staff:
             context.update(
                 {
-                    "late_count": len(late_attendances),
+                    "late_count": late_count,
                     "chart_labels": json.dumps(date_strs),
                     "chart_data": json.dumps(late_counts),
                     "pending_leaves": pending_leaves,
@@ -509,80 +763,70 @@ def dashboard(request):
         return redirect("home")
 
 
+def _report_range(request):
+    """
+    Read the ``range`` or ``start``/``end`` parameters of a report request.
+
+    Returns ``(range, start, end, error)`` where ``error`` is a 400 response
+    to send back, or None.
+    """
+    time_range = request.GET.get("range", "this_week")
+    today = timezone.localdate()
+
+    if request.GET.get("start") or request.GET.get("end"):
+        start_date = _parse_date_param(request.GET.get("start"))
+        end_date = _parse_date_param(request.GET.get("end")) if request.GET.get("end") else today
+        if start_date is None or end_date is None:
+            error = {"error": "invalid date, expected YYYY-MM-DD"}
+            return time_range, None, None, JsonResponse(error, status=400)
+        time_range = "custom"
+    else:
+        start_date, end_date = reports.preset_range(time_range, today)
+
+    if start_date > end_date:
+        error = {"error": "start must be on or before end"}
+    elif (end_date - start_date).days + 1 > reports.MAX_CHART_DAYS:
+        error = {"error": "range too long"}
+    else:
+        return time_range, start_date, end_date, None
+    return time_range, start_date, end_date, JsonResponse(error, status=400)
+
+
 @login_required
 def attendance_chart_data(request):
-    """Return JSON with labels and data for attendance based on time range (admin only)."""
+    """
+    Return JSON with labels and data for attendance based on time range (admin only).
+
+    Accepts either a named ``range`` (this_week, last_week, this_month,
+    last_month, this_quarter, last_quarter, this_year, last_year) or explicit
+    ``start``/``end`` dates (YYYY-MM-DD). ``bucket`` may be day, week or month;
+    when omitted it is picked from the length of the range. ``department``
+    (an id) restricts the counts to one department.
+    """
     if not request.user.is_staff:
         return JsonResponse({"error": "forbidden"}, status=403)
 
+    time_range, start_date, end_date, error = _report_range(request)
+    if error is not None:
+        return error
+
+    bucket = request.GET.get("bucket") or None
+    if bucket is not None and bucket not in reports.BUCKETS:
+        return JsonResponse({"error": "invalid bucket"}, status=400)
+
+    department = request.GET.get("department") or None
+    if department is not None and not department.isdigit():
+        return JsonResponse({"error": "invalid department"}, status=400)
+
     try:
-        time_range = request.GET.get('range', 'this_week')
-        today = timezone.now().date()
-        late_threshold = timezone.now().replace(hour=9, minute=0, second=0, microsecond=0).time()
-        
-        # Calculate date range based on selection
-        if time_range == 'this_week':
-            # Current week (last 7 days)
-            end_date = today
-            start_date = end_date - timedelta(days=6)
-            date_range = [start_date + timedelta(days=x) for x in range(7)]
-            labels = [d.strftime("%a, %b %d") for d in date_range]
-            
-        elif time_range == 'last_week':
-            # Previous 7 days
-            end_date = today - timedelta(days=7)
-            start_date = end_date - timedelta(days=6)
-            date_range = [start_date + timedelta(days=x) for x in range(7)]
-            labels = [d.strftime("%a, %b %d") for d in date_range]
-            
-        elif time_range == 'this_month':
-            # Current month
-            start_date = today.replace(day=1)
-            end_date = today
-            days_in_range = (end_date - start_date).days + 1
-            date_range = [start_date + timedelta(days=x) for x in range(days_in_range)]
-            labels = [d.strftime("%b %d") for d in date_range]
-            
-        elif time_range == 'last_month':
-            # Previous month
-            first_day_this_month = today.replace(day=1)
-            last_day_last_month = first_day_this_month - timedelta(days=1)
-            start_date = last_day_last_month.replace(day=1)
-            end_date = last_day_last_month
-            days_in_range = (end_date - start_date).days + 1
-            date_range = [start_date + timedelta(days=x) for x in range(days_in_range)]
-            labels = [d.strftime("%b %d") for d in date_range]
-        else:
-            # Default to this week
-            end_date = today
-            start_date = end_date - timedelta(days=6)
-            date_range = [start_date + timedelta(days=x) for x in range(7)]
-            labels = [d.strftime("%a, %b %d") for d in date_range]
-        
-        # Get late arrivals count for each date
-        late_data = [
-            Attendance.objects.filter(date=d, sign_in__time__gt=late_threshold).count()
-            for d in date_range
-        ]
-        
-        # Get total attendance count for each date
-        total_data = [
-            Attendance.objects.filter(date=d, sign_in__isnull=False).count()
-            for d in date_range
-        ]
-        
-        # Get on-time arrivals count for each date
-        on_time_data = [
-            Attendance.objects.filter(date=d, sign_in__isnull=False, sign_in__time__lte=late_threshold).count()
-            for d in date_range
-        ]
-        
+        series = reports.attendance_chart_series(
+            start_date, end_date, bucket=bucket, department=department
+        )
         return JsonResponse({
-            "labels": labels,
-            "late_data": late_data,
-            "total_data": total_data,
-            "on_time_data": on_time_data,
-            "range": time_range
+            **series,
+            "range": time_range,
+            "start": start_date.isoformat(),
+            "end": end_date.isoformat(),
         })
     except Exception as e:
         logger.error(f"Error generating chart data: {e}", exc_info=True)
@@ -590,25 +834,77 @@ def attendance_chart_data(request):
 
 
 @login_required
+def worked_hours_data(request):
+    """
+    Return JSON totals of the hours worked in a date range (admin only).
+
+    Takes the same ``range`` or ``start``/``end`` parameters as
+    ``attendance_chart_data``. ``group`` may be user or department and
+    ``period`` week, month or year; each combination is one grouped query
+    (see ``reports.worked_totals``). Rows carry the ``user`` or
+    ``department`` id, the ``period`` start date, ``days``, ``total_hours``
+    and ``average_hours``.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({"error": "forbidden"}, status=403)
+
+    time_range, start_date, end_date, error = _report_range(request)
+    if error is not None:
+        return error
+
+    group = request.GET.get("group") or None
+    if group is not None and group not in reports.GROUPS:
+        return JsonResponse({"error": "invalid group"}, status=400)
+    period = request.GET.get("period") or None
+    if period is not None and period not in reports.PERIODS:
+        return JsonResponse({"error": "invalid period"}, status=400)
+
+    totals = reports.worked_totals(
+        Attendance.objects.filter(date__gte=start_date, date__lte=end_date),
+        group=reports.GROUPS.get(group),
+        period=period,
+    )
+    rows = []
+    for row in [totals] if isinstance(totals, dict) else totals:
+        entry = {"days": row["days"]}
+        if group:
+            entry[group] = row[reports.GROUPS[group]]
+        if period:
+            entry["period"] = row["period"].isoformat()
+        entry["total_hours"] = round((row["total_seconds"] or 0) / 3600, 2)
+        entry["average_hours"] = round((row["average_seconds"] or 0) / 3600, 2)
+        rows.append(entry)
+    return JsonResponse({
+        "rows": rows,
+        "range": time_range,
+        "start": start_date.isoformat(),
+        "end": end_date.isoformat(),
+    })
+
+
+def _directory_etag(name):
+    """ETag function for the cached user lists; admins only, so others get no 304."""
+    return lambda request: (
+        user_directory.etag(name) if request.user.is_staff else None
+    )
+
+
+def _directory_response(name):
+    response = HttpResponse(user_directory.get(name), content_type="application/json")
+    # Let the browser keep the list but revalidate it (ETag) on every use
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@login_required
+@condition(etag_func=_directory_etag(user_directory.STAFF_MEMBERS))
 def get_staff_members(request):
     """Return JSON list of active staff members (admin only)."""
     if not request.user.is_staff:
         return JsonResponse({"success": False, "message": "forbidden"}, status=403)
 
     try:
-        from .models import Staff
-
-        staff_qs = Staff.objects.select_related("user").filter(is_active=True).order_by(
-            "user__first_name", "user__last_name"
-        )
-        members = [
-            {
-                "id": s.user.id,
-                "name": (s.user.get_full_name() or s.user.username),
-            }
-            for s in staff_qs
-        ]
-        return JsonResponse({"success": True, "members": members})
+        return _directory_response(user_directory.STAFF_MEMBERS)
     except Exception as e:
         logger.error(f"Error fetching staff members: {e}", exc_info=True)
         return JsonResponse({"success": False, "message": "internal"}, status=500)
@@ -619,33 +915,95 @@ def get_staff_members(request):
 @login_required
 @require_POST
 def approve_leave_request(request, leave_id):
+    return _review_leave_request(request, leave_id, "Approved")
+
+
+@login_required
+@require_POST
+def reject_leave_request(request, leave_id):
+    return _review_leave_request(request, leave_id, "Rejected")
+
+
+def _review_leave_request(request, leave_id, status):
+    """Set ``status`` on one leave request; say so only if it changed."""
     if not request.user.is_staff:
         return redirect("dashboard")
-    leave = LeaveRequest.objects.get(id=leave_id)
-    leave.status = "Approved"
-    leave.reviewed_by = request.user
-    leave.save()
-    messages.success(
-        request,
-        f"Leave request for {leave.user.get_full_name() or leave.user.username} approved.",
+    leave = get_object_or_404(LeaveRequest.objects.select_related("user"), id=leave_id)
+    name = leave.user.get_full_name() or leave.user.username
+    changed = leave_balances.review(
+        LeaveRequest.objects.filter(pk=leave.pk), status, request.user
     )
+    if changed:
+        messages.success(request, f"Leave request for {name} {status.lower()}.")
+    else:
+        messages.info(request, f"Leave request for {name} was already {status.lower()}.")
     return redirect("dashboard")
 
 
+# Most leave requests accepted by one bulk review.
+MAX_REVIEW_BATCH = 200
+
+REVIEW_DECISIONS = {"approve": "Approved", "reject": "Rejected"}
+
+
 @login_required
 @require_POST
-def reject_leave_request(request, leave_id):
+def review_leave_requests(request):
+    """
+    Approve or reject several pending leave requests at once.
+
+    Expects ``{"ids": [...], "decision": "approve" | "reject"}``. Only
+    requests that are still pending change, in a single UPDATE; the answer
+    holds one result per id (``updated``, ``not_pending`` or ``not_found``)
+    with the request's current status.
+    """
     if not request.user.is_staff:
-        return redirect("dashboard")
-    leave = LeaveRequest.objects.get(id=leave_id)
-    leave.status = "Rejected"
-    leave.reviewed_by = request.user
-    leave.save()
-    messages.success(
-        request,
-        f"Leave request for {leave.user.get_full_name() or leave.user.username} rejected.",
+        return JsonResponse({"success": False, "message": "forbidden"}, status=403)
+    try:
+        data = json.loads(request.body)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return JsonResponse({"success": False, "message": "Invalid request data"}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({"success": False, "message": "Invalid request data"}, status=400)
+    status = REVIEW_DECISIONS.get(data.get("decision"))
+    if status is None:
+        return JsonResponse(
+            {"success": False, "message": "decision must be approve or reject"}, status=400
+        )
+    ids = data.get("ids")
+    if (
+        not isinstance(ids, list)
+        or not ids
+        or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids)
+    ):
+        return JsonResponse(
+            {"success": False, "message": "ids must be a non-empty list of integers"},
+            status=400,
+        )
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > MAX_REVIEW_BATCH:
+        return JsonResponse(
+            {"success": False, "message": f"At most {MAX_REVIEW_BATCH} requests per review"},
+            status=413,
+        )
+
+    changed = leave_balances.review(
+        LeaveRequest.objects.filter(pk__in=ids), status, request.user, from_status="Pending"
     )
-    return redirect("dashboard")
+    changed_ids = {leave.pk for leave in changed}
+    # Why the others did not change: already reviewed, or no such request
+    current = dict(
+        LeaveRequest.objects.filter(pk__in=set(ids) - changed_ids).values_list("pk", "status")
+    )
+    results = []
+    for pk in ids:
+        if pk in changed_ids:
+            results.append({"id": pk, "result": "updated", "status": status})
+        elif pk in current:
+            results.append({"id": pk, "result": "not_pending", "status": current[pk]})
+        else:
+            results.append({"id": pk, "result": "not_found", "status": None})
+    return JsonResponse({"success": True, "updated": len(changed_ids), "results": results})
 
 
 # Barcode/QR Code Views
@@ -669,62 +1027,40 @@ def barcode_scan_page(request):
 @require_POST
 def barcode_authenticate(request):
     """Authenticate user via barcode and perform sign in/out"""
-    from .models import Staff
-    
     try:
         data = json.loads(request.body)
         barcode = data.get("barcode", "").strip()
         location = data.get("location", "").strip()
+        # Raw coordinates are resolved to an address on the server
+        coordinates = geocoding.parse_coordinates(
+            data.get("lat"), data.get("lon"), data.get("accuracy")
+        )
         
         if not barcode:
             return JsonResponse({"success": False, "message": "No barcode provided"}, status=400)
         
-        # Find staff by barcode
-        try:
-            staff = Staff.objects.get(barcode=barcode)
-            user = staff.user
-        except Staff.DoesNotExist:
-            return JsonResponse({"success": False, "message": "Invalid barcode"}, status=404)
-        
-        # Check if user is active
-        if not staff.is_active:
-            return JsonResponse({"success": False, "message": "Staff account is inactive"}, status=403)
-        
-        # Get or create attendance for today
-        today = timezone.now().date()
-        attendance, created = Attendance.objects.get_or_create(
-            user=user, date=today
+        # Kiosks send a per-scan id (or an Idempotency-Key header) so that a
+        # retried request returns the original outcome
+        client_id = str(data.get("id") or request.headers.get("Idempotency-Key") or "")
+        client_id = client_id[: scans.MAX_KEY_LENGTH]
+
+        # Resolve the badge (served from the process-local cache when known)
+        badge = barcode_cache.cache.resolve(barcode)
+        rejection = scans.check_badge(badge)
+        if rejection is not None:
+            status = 404 if badge is None else 403
+            return JsonResponse(rejection, status=status)
+
+        now = timezone.now()
+        return JsonResponse(
+            scans.run_once(
+                scans.receipt_key(badge.user_id, client_id) if client_id else "",
+                badge.user_id,
+                now,
+                lambda: scans.apply_scan(badge, now, location, coordinates=coordinates),
+            )
         )
-        
-        # Determine action: sign in or sign out
-        if not attendance.sign_in:
-            attendance.sign_in = timezone.now()
-            if location:
-                attendance.location = location
-            attendance.save()
-            return JsonResponse({
-                "success": True,
-                "action": "sign_in",
-                "message": f"Welcome {user.get_full_name() or user.username}! You signed in successfully.",
-                "time": timezone.localtime(attendance.sign_in).strftime("%H:%M:%S"),
-                "user": user.get_full_name() or user.username
-            })
-        elif attendance.sign_in and not attendance.sign_out:
-            attendance.sign_out = timezone.now()
-            attendance.save()
-            return JsonResponse({
-                "success": True,
-                "action": "sign_out",
-                "message": f"Goodbye {user.get_full_name() or user.username}! You signed out successfully.",
-                "time": timezone.localtime(attendance.sign_out).strftime("%H:%M:%S"),
-                "user": user.get_full_name() or user.username
-            })
-        else:
-            return JsonResponse({
-                "success": False,
-                "message": "You have already completed sign in/out for today."
-            })
-            
+
     except json.JSONDecodeError:
         return JsonResponse({"success": False, "message": "Invalid request data"}, status=400)
     except Exception as e:
@@ -732,37 +1068,93 @@ def barcode_authenticate(request):
         return JsonResponse({"success": False, "message": "An error occurred"}, status=500)
 
 
+@login_required
+def barcode_cache_stats(request):
+    """Hit/miss counters of this process's barcode cache (admin only)."""
+    if not request.user.is_staff:
+        return JsonResponse({"error": "forbidden"}, status=403)
+    return JsonResponse(barcode_cache.cache.stats())
+
+
+@require_POST
+def barcode_authenticate_batch(request):
+    """
+    Apply a batch of scans queued by a kiosk (see ``scans.apply_batch``).
+
+    Expects ``{"scans": [{"id", "barcode", "scanned_at", "lat", "lon",
+    "accuracy"}, ...]}``
+    and answers with one result per scan, in the order submitted. The scans
+    carry their own capture times, so only an authenticated kiosk may send
+    them (see ``attendance.kiosks``).
+    """
+    device = kiosks.device(request)
+    if device is None:
+        return JsonResponse(
+            {"success": False, "message": "This device is not registered as a kiosk"},
+            status=401,
+        )
+    try:
+        data = json.loads(request.body)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return JsonResponse({"success": False, "message": "Invalid request data"}, status=400)
+    batch = data.get("scans") if isinstance(data, dict) else None
+    if not isinstance(batch, list):
+        return JsonResponse({"success": False, "message": "scans must be a list"}, status=400)
+    if len(batch) > scans.MAX_BATCH_SIZE:
+        return JsonResponse(
+            {"success": False, "message": f"At most {scans.MAX_BATCH_SIZE} scans per batch"},
+            status=413,
+        )
+
+    try:
+        results = scans.apply_batch(batch, device)
+    except IntegrityError:
+        # The same scans are being applied by a concurrent request; the
+        # kiosk retries and then receives the stored outcomes.
+        return JsonResponse({"success": False, "message": "Batch conflict, retry"}, status=409)
+    except Exception:
+        logger.exception("Error applying kiosk scan batch")
+        return JsonResponse({"success": False, "message": "An error occurred"}, status=500)
+    return JsonResponse({"success": True, "results": results})
+
+
 # Todo List Views
 @login_required
+@condition(etag_func=todos.etag)
 def get_todos(request):
-    """Get all todo items for the current user, grouped by status"""
-    from .models import TodoItem
-    
+    """
+    The current user's todo items (see ``attendance.todos``).
+
+    Without parameters returns a snapshot grouped by status. ``since`` (a
+    previous response's ``cursor``) returns only the changes after it, or a
+    new snapshot with ``reset`` set if it is too old. ``done_after`` (a
+    ``done_cursor``) returns the next page of done items; ``done_limit``
+    sets how many are returned.
+    """
     try:
-        todos = TodoItem.objects.filter(user=request.user).order_by('-created_at')
-        
-        todo_list = {
-            'TODO': [],
-            'ONGOING': [],
-            'DONE': []
-        }
-        
-        for todo in todos:
-            todo_data = {
-                'id': todo.id,
-                'title': todo.title,
-                'description': todo.description,
-                'status': todo.status,
-                'created_at': todo.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                'started_at': todo.started_at.strftime('%Y-%m-%d %H:%M:%S') if todo.started_at else None,
-                'completed_at': todo.completed_at.strftime('%Y-%m-%d %H:%M:%S') if todo.completed_at else None,
-            }
-            todo_list[todo.status].append(todo_data)
-        
-        return JsonResponse({'success': True, 'todos': todo_list})
+        limit = request.GET.get("done_limit")
+        if limit is not None and not limit.isdigit():
+            raise ValueError("done_limit must be a number")
+        limit = int(limit) if limit else None
+
+        if request.GET.get("done_after"):
+            body = todos.done_page(request.user.pk, request.GET["done_after"], limit)
+        elif request.GET.get("since"):
+            body = todos.delta(request.user.pk, todos.parse_cursor(request.GET["since"]))
+            if body is None:
+                body = {"reset": True, **todos.snapshot(request.user.pk, limit)}
+        else:
+            body = todos.snapshot(request.user.pk, limit)
+    except ValueError as e:
+        return JsonResponse({"success": False, "message": str(e)}, status=400)
     except Exception as e:
         logger.error(f"Error fetching todos: {str(e)}", exc_info=True)
-        return JsonResponse({'success': False, 'message': 'Failed to fetch todos'}, status=500)
+        return JsonResponse({"success": False, "message": "Failed to fetch todos"}, status=500)
+
+    response = JsonResponse({"success": True, **body})
+    # Let the browser keep the list but revalidate it (ETag) on every use
+    response["Cache-Control"] = "private, no-cache"
+    return response
 
 
 @login_required
@@ -783,21 +1175,14 @@ def create_todo(request):
             user=request.user,
             title=title,
             description=description,
-            status='TODO'
+            status='TODO',
+            position=todos.top_position(request.user.pk, 'TODO'),
         )
         
         return JsonResponse({
             'success': True,
             'message': 'Todo item created successfully',
-            'todo': {
-                'id': todo.id,
-                'title': todo.title,
-                'description': todo.description,
-                'status': todo.status,
-                'created_at': todo.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                'started_at': None,
-                'completed_at': None,
-            }
+            'todo': todos.serialize(todo),
         })
     except json.JSONDecodeError:
         return JsonResponse({'success': False, 'message': 'Invalid request data'}, status=400)
@@ -820,32 +1205,17 @@ def update_todo_status(request, todo_id):
             return JsonResponse({'success': False, 'message': 'Invalid status'}, status=400)
         
         todo = TodoItem.objects.get(id=todo_id, user=request.user)
-        old_status = todo.status
         
-        # Update status and timestamps
-        todo.status = new_status
-        
-        if new_status == 'ONGOING' and old_status == 'TODO':
-            todo.started_at = timezone.now()
-        elif new_status == 'DONE':
-            todo.completed_at = timezone.now()
-            if not todo.started_at:
-                todo.started_at = timezone.now()
-        
-        todo.save()
+        # Update status and timestamps; a new column takes the item on top
+        if new_status != todo.status:
+            todo.position = todos.top_position(request.user.pk, new_status)
+        todos.set_status(todo, new_status, timezone.now())
+        todo.save(update_fields=['status', 'position', 'started_at', 'completed_at', 'updated_at'])
         
         return JsonResponse({
             'success': True,
             'message': 'Todo status updated successfully',
-            'todo': {
-                'id': todo.id,
-                'title': todo.title,
-                'description': todo.description,
-                'status': todo.status,
-                'created_at': todo.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                'started_at': todo.started_at.strftime('%Y-%m-%d %H:%M:%S') if todo.started_at else None,
-                'completed_at': todo.completed_at.strftime('%Y-%m-%d %H:%M:%S') if todo.completed_at else None,
-            }
+            'todo': todos.serialize(todo),
         })
     except TodoItem.DoesNotExist:
         return JsonResponse({'success': False, 'message': 'Todo item not found'}, status=404)
@@ -863,8 +1233,9 @@ def delete_todo(request, todo_id):
     from .models import TodoItem
     
     try:
-        todo = TodoItem.objects.get(id=todo_id, user=request.user)
-        todo.delete()
+        # Leaves a tombstone so other open dashboards drop the item
+        if not todos.delete(TodoItem.objects.filter(id=todo_id, user=request.user)):
+            raise TodoItem.DoesNotExist
         
         return JsonResponse({
             'success': True,
@@ -877,6 +1248,34 @@ def delete_todo(request, todo_id):
         return JsonResponse({'success': False, 'message': 'Failed to delete todo'}, status=500)
 
 
+@login_required
+@require_POST
+def batch_todos(request):
+    """
+    Apply several todo operations in one transaction (see ``todos.apply_batch``).
+
+    The body is ``{"operations": [...]}``; either every operation is applied
+    or, if one is invalid, none is and the response names it.
+    """
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise ValueError("Invalid request data")
+        results = todos.apply_batch(request.user.pk, data.get("operations"))
+    except json.JSONDecodeError:
+        return JsonResponse({"success": False, "message": "Invalid request data"}, status=400)
+    except todos.InvalidOperation as e:
+        return JsonResponse(
+            {"success": False, "message": str(e), "operation": e.index}, status=400
+        )
+    except ValueError as e:
+        return JsonResponse({"success": False, "message": str(e)}, status=400)
+    except Exception as e:
+        logger.error(f"Error applying todo batch: {str(e)}", exc_info=True)
+        return JsonResponse({"success": False, "message": "Failed to update todos"}, status=500)
+    return JsonResponse({"success": True, "results": results})
+
+
 # Delegated Duty Views
 @login_required
 @require_POST
@@ -991,7 +1390,7 @@ def profile(request):
         staff_form = StaffUpdateForm(instance=staff)
     
     # Get user's attendance statistics
-    today = timezone.now().date()
+    today = timezone.localdate()
     month_start = today.replace(day=1)
     
     # Attendance this month
@@ -1001,24 +1400,20 @@ def profile(request):
         date__lte=today
     )
     
-    days_worked = month_attendance.filter(sign_in__isnull=False).count()
-    late_arrivals = month_attendance.filter(sign_in__time__gt=timezone.datetime.strptime('09:00:00', '%H:%M:%S').time()).count()
-    
-    # Calculate total hours worked this month
-    total_hours = 0
-    for att in month_attendance:
-        if att.sign_in and att.sign_out:
-            duration = att.sign_out - att.sign_in
-            total_hours += duration.total_seconds() / 3600
-    
-    # Get leave requests
-    approved_leaves = LeaveRequest.objects.filter(
-        user=request.user,
-        status='Approved'
+    # Days worked, late arrivals and hours worked this month in one query
+    month_stats = month_attendance.aggregate(
+        days_worked=Count('id', filter=Q(sign_in__isnull=False)),
+        late_arrivals=Count('id', filter=reports.late_q()),
+        worked_seconds=Sum('worked_seconds'),
     )
-    days_taken = sum([(leave.end_date - leave.start_date).days + 1 for leave in approved_leaves])
-    vacation_days_total = 10
-    vacation_days_left = max(vacation_days_total - days_taken, 0)
+    days_worked = month_stats['days_worked']
+    late_arrivals = month_stats['late_arrivals']
+    total_hours = (month_stats['worked_seconds'] or 0) / 3600
+    
+    # This year's leave balance
+    balance = leave_balances.get_balance(request.user.pk, today.year)
+    vacation_days_total = balance.allowance
+    vacation_days_left = balance.remaining
     
     # Recent attendance records
     recent_attendance = Attendance.objects.filter(user=request.user).order_by('-date')[:10]
@@ -1080,10 +1475,6 @@ def resend_verification(request):
     """
     Resend verification email to user.
     """
-    from django.core.mail import send_mail
-    from django.template.loader import render_to_string
-    from django.utils.html import strip_tags
-    
     if request.method == 'POST':
         email = request.POST.get('email', '').strip()
         
@@ -1095,32 +1486,13 @@ def resend_verification(request):
                 messages.info(request, _("This email is already verified. You can log in."))
                 return redirect('login')
             
-            # Generate new token
-            token = user.generate_verification_token()
-            
-            # Send verification email
-            verification_url = request.build_absolute_uri(
-                f'/verify-email/{token}/'
-            )
-            
-            subject = 'Verify Your Email - AdminEdge Staff Attendance'
-            html_message = render_to_string('emails/verify_email.html', {
-                'user': user,
-                'verification_url': verification_url,
-            })
-            plain_message = strip_tags(html_message)
-            
-            send_mail(
-                subject,
-                plain_message,
-                settings.DEFAULT_FROM_EMAIL,
-                [user.email],
-                html_message=html_message,
-                fail_silently=False,
-            )
+            # New token and the email carrying it, committed together
+            with transaction.atomic():
+                token = user.generate_verification_token()
+                queue_verification_email(request, user, token)
             
             messages.success(request, _("✓ Verification email sent! Please check your inbox."))
-            logger.info(f"Verification email resent to {user.email}")
+            logger.info(f"Verification email queued for {user.email}")
             return redirect('login')
             
         except User.DoesNotExist:
@@ -1194,6 +1566,7 @@ def promote_to_admin(request):
 
 
 @login_required
+@condition(etag_func=_directory_etag(user_directory.NON_ADMIN_USERS))
 def get_non_admin_users(request):
     """
     Get list of all non-admin users. Only accessible by admins.
@@ -1205,25 +1578,7 @@ def get_non_admin_users(request):
         }, status=403)
     
     try:
-        User = get_user_model()
-        non_admin_users = User.objects.filter(is_staff=False, is_active=True).order_by('first_name', 'last_name', 'username')
-        
-        users_list = [
-            {
-                'id': user.id,
-                'username': user.username,
-                'full_name': user.get_full_name() or user.username,
-                'email': user.email,
-                'department': user.department.name if hasattr(user, 'department') and user.department else None
-            }
-            for user in non_admin_users
-        ]
-        
-        return JsonResponse({
-            'success': True,
-            'users': users_list
-        })
-        
+        return _directory_response(user_directory.NON_ADMIN_USERS)
     except Exception as e:
         logger.error(f"Error fetching non-admin users: {str(e)}", exc_info=True)
         return JsonResponse({
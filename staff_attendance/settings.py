@@ -11,8 +11,11 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import json
 import os
 
+from .db import database_config, sqlite_pragmas
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -53,9 +56,10 @@ AUTH_USER_MODEL = "accounts.CustomUser"
 # AUTH_USER_MODEL = "auth.User"
 
 # Authentication backends
+# The custom backend also handles plain usernames, so it is the only one:
+# a failed login is then one lookup and one password hash
 AUTHENTICATION_BACKENDS = [
     'accounts.backends.EmailOrUsernameModelBackend',  # Custom backend for email/username login
-    'django.contrib.auth.backends.ModelBackend',  # Fallback to default backend
 ]
 
 MIDDLEWARE = [
@@ -94,13 +98,12 @@ WSGI_APPLICATION = "staff_attendance.wsgi.application"
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
+# Configured from DATABASE_URL and related variables; see staff_attendance/db.py.
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
-    }
-}
+DATABASES = {"default": database_config(BASE_DIR)}
+
+# Run on every new SQLite connection (ignored for PostgreSQL)
+SQLITE_PRAGMAS = sqlite_pragmas()
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -148,6 +151,81 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Set REDIS_URL (requires the redis package) to share the cache between
+# worker processes. The in-process default is only coherent within one
+# process, so entries that other processes may invalidate expire quickly.
+
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "staff-attendance",
+        }
+    }
+
+# Seconds a user's cached sign-in status for the day stays valid
+ATTENDANCE_STATUS_CACHE_TIMEOUT = int(
+    os.environ.get(
+        "ATTENDANCE_STATUS_CACHE_TIMEOUT", 60 * 60 if os.environ.get("REDIS_URL") else 60
+    )
+)
+
+# Seconds the cached user lists behind the dashboard pickers stay valid; with
+# a shared cache they are rebuilt only when users, staff or departments change
+# and browsers revalidate them with ETags
+USER_DIRECTORY_CACHE_TIMEOUT = int(
+    os.environ.get(
+        "USER_DIRECTORY_CACHE_TIMEOUT", 60 * 60 if os.environ.get("REDIS_URL") else 60
+    )
+)
+
+# Reverse geocoding of sign-in coordinates (attendance.geocoding). Addresses
+# are cached per cell of a grid this many degrees wide; resolvers are tried
+# in order. The gazetteer is a JSON list of office sites:
+# [{"name": "Head office", "lat": 7.62, "lon": 5.22, "radius_m": 150}, ...]
+# Add "attendance.geocoding.NominatimResolver" to GEOCODE_RESOLVERS to fall
+# back to OpenStreetMap for places outside the gazetteer.
+GEOCODE_GRID_DEGREES = float(os.environ.get("GEOCODE_GRID_DEGREES", 0.0005))
+GEOCODE_RESOLVERS = os.environ.get(
+    "GEOCODE_RESOLVERS",
+    "attendance.geofences.SiteResolver,attendance.geocoding.GazetteerResolver",
+).split(",")
+GEOCODE_GAZETTEER = json.loads(os.environ.get("GEOCODE_GAZETTEER", "[]"))
+# Resolve addresses on background threads after the sign-in commits
+GEOCODE_ASYNC = os.environ.get("GEOCODE_ASYNC", "True") == "True"
+
+# Office site geofences (attendance.geofences): seconds each process keeps
+# its index of sites, and the worst reported accuracy still counted on site
+GEOFENCE_CACHE_TTL = int(os.environ.get("GEOFENCE_CACHE_TTL", 300))
+GEOFENCE_MAX_ACCURACY_M = int(os.environ.get("GEOFENCE_MAX_ACCURACY_M", 200))
+
+# Most records drawn into one PDF report; reportlab keeps a document's pages
+# in memory until it is saved, so larger exports must use CSV or Excel
+PDF_EXPORT_MAX_ROWS = int(os.environ.get("PDF_EXPORT_MAX_ROWS", 50000))
+
+# Kiosks allowed to submit queued scans with their capture times, as a JSON
+# object of device name to token: {"front-desk": "<long random token>"}.
+# Browsers with a staff session are accepted without a token.
+KIOSK_TOKENS = json.loads(os.environ.get("KIOSK_TOKENS", "{}"))
+
+# Days of leave each user may take per calendar year, unless their yearly
+# LeaveBalance says otherwise
+LEAVE_ALLOWANCE_DAYS = int(os.environ.get("LEAVE_ALLOWANCE_DAYS", 10))
+
+# Dashboard todo lists (attendance.todos): done items sent before the user
+# asks for older ones, and days deletions are remembered for delta syncs
+TODO_DONE_LIMIT = int(os.environ.get("TODO_DONE_LIMIT", 50))
+TODO_TOMBSTONE_DAYS = int(os.environ.get("TODO_TOMBSTONE_DAYS", 30))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -163,17 +241,25 @@ LOGOUT_REDIRECT_URL = "/accounts/login/"
 # ]
 
 # Email Configuration
-# For development, use console backend (prints emails to console)
-if DEBUG:
-    EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
-else:
-    # For production, configure your email service
-    EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-    EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.gmail.com')
-    EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 587))
-    EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'True') == 'True'
-    EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
-    EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+# Outgoing email is queued in the database and sent by the run_email_worker
+# command. EMAIL_BACKEND may be smtp, console, locmem, file or a dotted path;
+# by default the console backend (prints emails) is used in development.
+EMAIL_BACKENDS = {
+    'smtp': 'django.core.mail.backends.smtp.EmailBackend',
+    'console': 'django.core.mail.backends.console.EmailBackend',
+    'locmem': 'django.core.mail.backends.locmem.EmailBackend',
+    'file': 'django.core.mail.backends.filebased.EmailBackend',
+}
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'console' if DEBUG else 'smtp')
+EMAIL_BACKEND = EMAIL_BACKENDS.get(EMAIL_BACKEND, EMAIL_BACKEND)
+# Directory the file backend writes one file per message to
+EMAIL_FILE_PATH = os.environ.get('EMAIL_FILE_PATH', BASE_DIR / 'sent_emails')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.gmail.com')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 587))
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'True') == 'True'
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_TIMEOUT = int(os.environ.get('EMAIL_TIMEOUT', 30))
 
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'noreply@adminedge.com')
 SERVER_EMAIL = DEFAULT_FROM_EMAIL